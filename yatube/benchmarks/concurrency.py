@@ -0,0 +1,161 @@
+""" Пропускная способность чтения лент во время записи.
+
+Процессы-читатели выбирают страницу главной ленты и комментарии самого
+обсуждаемого поста, процессы-писатели по очереди создают комментарии
+и посты через core.writes (со всеми сигналами), как add_comment
+и post_create. Каждый работает в своем процессе: потоки одного
+интерпретатора делили бы GIL, и замер показывал бы его, а не SQLite.
+
+Прогон повторяется с PRAGMA SQLite по умолчанию и с SQLITE_PRAGMAS.
+journal_mode хранится в файле базы и сменяется только без других
+соединений, поэтому он ставится один раз до запуска процессов;
+остальные PRAGMA действуют на соединение и применяются при его
+открытии (core.db), тоже до начала замера.
+"""
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, connections
+from django.test.utils import override_settings
+
+from core import writes
+from posts.models import Comment, Post
+
+from .runner import percentile
+
+# PRAGMA по умолчанию: журнал отката, fsync на каждой транзакции
+DEFAULT_PRAGMAS = {'journal_mode': 'delete', 'synchronous': 'full'}
+# процессы копируют состояние Django родителя, а не импортируют его заново
+_context = multiprocessing.get_context('fork')
+
+
+def work(operation, ready, start, stop, results) -> None:
+    """ Тело процесса: повторяет operation() от start до stop
+    и отдает в results задержки и число ошибок блокировки.
+    """
+    timings = []
+    locked = 0
+    try:
+        # соединение и его PRAGMA — до начала замера
+        connection.ensure_connection()
+        ready.release()
+        start.wait()
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                operation()
+            except OperationalError:
+                # database is locked: писатель не дождался блокировки
+                locked += 1
+                continue
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        connection.close()
+        results.put((timings, locked))
+
+
+def read(fixtures):
+    def operation():
+        list(Post.objects.feed()[:settings.PER_PAGE_PAGINATOR])
+        list(
+            Comment.objects.filter(post=fixtures.post)
+            .select_related('author')[:settings.COMMENTS_PER_PAGE]
+        )
+    return operation
+
+
+def write(fixtures):
+    def operation():
+        number = next(fixtures.numbers)
+        if number % 2:
+            writes.submit(
+                Comment.objects.create,
+                post=fixtures.post,
+                author=fixtures.reader,
+                text=f'Комментарий нагрузки {number}',
+            )
+        else:
+            writes.submit(
+                Post.objects.create,
+                author=fixtures.reader,
+                text=f'Пост нагрузки {number}',
+            )
+    return operation
+
+
+def _summary(reports, duration) -> dict:
+    timings = [value for values, _ in reports for value in values]
+    return {
+        'per_second': round(len(timings) / duration, 1),
+        'p50_ms': round(percentile(timings, 50), 3) if timings else None,
+        'p95_ms': round(percentile(timings, 95), 3) if timings else None,
+        'locked': sum(locked for _, locked in reports),
+    }
+
+
+def set_journal_mode(mode) -> None:
+    """ journal_mode базы, пока у нее нет других соединений. """
+    connections.close_all()
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA journal_mode = {mode}')
+    connection.close()
+
+
+def measure(fixtures, pragmas, duration=5.0, readers=4, writers=2) -> dict:
+    """ Чтения и записи в секунду, задержки и ошибки блокировки. """
+    pragmas = dict(pragmas)
+    set_journal_mode(pragmas.pop('journal_mode'))
+    # процессы откроют соединения с остальными PRAGMA
+    with override_settings(SQLITE_PRAGMAS=pragmas):
+        ready = _context.Semaphore(0)
+        start = _context.Event()
+        stop = _context.Event()
+        queues = {'reads': _context.Queue(), 'writes': _context.Queue()}
+        processes = [
+            _context.Process(
+                target=work,
+                args=(operation(fixtures), ready, start, stop, queues[kind]),
+                daemon=True,
+            )
+            for kind, operation, count in (
+                ('reads', read, readers), ('writes', write, writers)
+            )
+            for _ in range(count)
+        ]
+        for process in processes:
+            process.start()
+        for _ in processes:
+            ready.acquire()
+        start.set()
+        time.sleep(duration)
+        stop.set()
+        reports = {
+            'reads': [queues['reads'].get() for _ in range(readers)],
+            'writes': [queues['writes'].get() for _ in range(writers)],
+        }
+        for process in processes:
+            process.join()
+    return {
+        kind: _summary(reports[kind], duration) for kind in reports
+    }
+
+
+def run(fixtures, duration=5.0, readers=4, writers=2, progress=None):
+    """ Отчет {'profiles': {'default'|'tuned': результат}}. """
+    profiles = {}
+    for name, pragmas in (
+        ('default', DEFAULT_PRAGMAS),
+        ('tuned', settings.SQLITE_PRAGMAS),
+    ):
+        profiles[name] = measure(fixtures, pragmas, duration, readers, writers)
+        if progress is not None:
+            progress(name, profiles[name])
+    return {
+        'meta': {
+            'duration': duration,
+            'readers': readers,
+            'writers': writers,
+        },
+        'profiles': profiles,
+    }
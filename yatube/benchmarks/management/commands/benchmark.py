@@ -0,0 +1,196 @@
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from benchmarks import concurrency, rendering, runner
+from benchmarks.scenarios import Fixtures, get_scenarios
+from posts import load_data, transfer
+from posts.models import Post
+
+DEFAULT_BASELINE = os.path.join(
+    settings.BASE_DIR, 'benchmarks', 'baseline.json'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержки, число SQL-запросов, размер ответа и пик памяти '
+        'публичных вью на сгенерированных данных и сравнивает их '
+        'с базовой линией'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios', nargs='*', help='Сценарии, по умолчанию все'
+        )
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help='Не удалять базу бенчмарка и не генерировать данные заново',
+        )
+        parser.add_argument(
+            '--templates',
+            action='store_true',
+            help=(
+                'Замерить рендеринг шаблонов вью без кэша загрузчика '
+                'и с cached.Loader вместо замера вью'
+            ),
+        )
+        parser.add_argument(
+            '--concurrency',
+            action='store_true',
+            help=(
+                'Замерить чтение лент во время записи с PRAGMA SQLite '
+                'по умолчанию и с SQLITE_PRAGMAS вместо замера вью'
+            ),
+        )
+        parser.add_argument('--duration', type=float, default=5.0)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--output', help='Куда записать отчет JSON')
+        parser.add_argument(
+            '--baseline',
+            default=DEFAULT_BASELINE,
+            help='Базовая линия для сравнения',
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='Записать отчет как новую базовую линию',
+        )
+        parser.add_argument(
+            '--threshold',
+            action='append',
+            default=[],
+            metavar='METRIC=RATIO',
+            help='Допустимый рост метрики, например p95_ms=0.5',
+        )
+
+    def get_thresholds(self, values):
+        thresholds = {}
+        for value in values:
+            metric, _, ratio = value.partition('=')
+            if metric not in runner.DEFAULT_THRESHOLDS:
+                raise CommandError(f'Неизвестная метрика: {metric}')
+            thresholds[metric] = float(ratio)
+        return thresholds
+
+    def prepare_data(self, options):
+        if Post.objects.exists():
+            return
+        self.stdout.write(f'Генерация {options["posts"]} постов...')
+        load_data.generate(
+            users=options['users'],
+            posts=options['posts'],
+            comments=options['posts'],
+            seed=options['seed'],
+        )
+        transfer.refresh_derived()
+
+    def progress(self, name, result):
+        self.stdout.write(
+            f'{name:<20} p50 {result["p50_ms"]:>8.2f} мс  '
+            f'p95 {result["p95_ms"]:>8.2f} мс  '
+            f'запросов {result["queries"]:>3}  '
+            f'{result["bytes"]:>7} байт  '
+            f'{result["peak_memory_kb"]:>8.1f} КБ'
+        )
+
+    def template_progress(self, name, result):
+        self.stdout.write(
+            f'{name:<28} без кэша {result["uncached_ms"]:>8.2f} мс  '
+            f'с кэшем {result["cached_ms"]:>8.2f} мс  '
+            f'x{result["speedup"]:.1f}'
+        )
+
+    def concurrency_progress(self, name, result):
+        reads, writes = result['reads'], result['writes']
+        self.stdout.write(
+            f'{name:<8} чтений/с {reads["per_second"]:>8.1f}  '
+            f'p95 {reads["p95_ms"] or 0:>7.2f} мс  '
+            f'записей/с {writes["per_second"]:>7.1f}  '
+            f'p95 {writes["p95_ms"] or 0:>7.2f} мс  '
+            f'блокировок {reads["locked"] + writes["locked"]}'
+        )
+
+    def measure(self, scenarios, options) -> dict:
+        self.prepare_data(options)
+        cache.clear()
+        if options['concurrency']:
+            return concurrency.run(
+                Fixtures(),
+                duration=options['duration'],
+                readers=options['readers'],
+                writers=options['writers'],
+                progress=self.concurrency_progress,
+            )
+        if options['templates']:
+            return rendering.run(
+                scenarios,
+                Fixtures(),
+                iterations=options['iterations'],
+                progress=self.template_progress,
+            )
+        return runner.run(
+            scenarios,
+            Fixtures(),
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            progress=self.progress,
+        )
+
+    def handle(self, *args, **options):
+        try:
+            scenarios = get_scenarios(options['scenarios'])
+        except ValueError as error:
+            raise CommandError(error)
+        thresholds = self.get_thresholds(options['threshold'])
+        test_settings = connection.settings_dict['TEST']
+        if connection.vendor == 'sqlite' and not test_settings['NAME']:
+            # база в памяти не переживет --keepdb и не похожа на боевую
+            test_settings['NAME'] = os.path.join(
+                settings.BASE_DIR, 'benchmark.sqlite3'
+            )
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb']
+        )
+        try:
+            with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                THUMBNAIL_ASYNC=False,
+            ):
+                report = self.measure(scenarios, options)
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb']
+            )
+        report['meta']['posts'] = options['posts']
+        if options['output']:
+            runner.save(report, options['output'])
+        if options['templates'] or options['concurrency']:
+            return
+        if options['save_baseline']:
+            runner.save(report, options['baseline'])
+            self.stdout.write(f'Базовая линия: {options["baseline"]}')
+            return
+        if not os.path.exists(options['baseline']):
+            return
+        regressions = runner.compare(
+            report, runner.load(options['baseline']), thresholds
+        )
+        if regressions:
+            raise CommandError(
+                'Регрессии относительно базовой линии:\n'
+                + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
@@ -0,0 +1,100 @@
+""" Время рендеринга шаблонов вью без кэша загрузчика и с cached.Loader.
+
+Контексты берутся из настоящих запросов сценариев: на время прохода
+сценариев render() шаблонов подменяется и запоминает контекст и запрос
+первого рендеринга каждого шаблона. Затем каждый шаблон загружается
+и рендерится с этим контекстом движками с обычными загрузчиками
+и с cached.Loader; без кэша на каждый рендеринг заново читаются
+и разбираются сам шаблон и все его {% extends %}/{% include %}.
+"""
+import copy
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+
+from .runner import _client, percentile
+
+LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+def make_backend(cached: bool) -> DjangoTemplates:
+    """ Движок из TEMPLATES с обычными загрузчиками или с кэшем. """
+    params = copy.deepcopy(settings.TEMPLATES[0])
+    del params['BACKEND']
+    params['NAME'] = 'cached' if cached else 'uncached'
+    params['APP_DIRS'] = False
+    options = params.setdefault('OPTIONS', {})
+    options['debug'] = False
+    options['loaders'] = (
+        [('django.template.loaders.cached.Loader', LOADERS)]
+        if cached else LOADERS
+    )
+    return DjangoTemplates(params)
+
+
+@contextmanager
+def captured_contexts():
+    """ {имя шаблона: (контекст, запрос)} рендерингов внутри блока. """
+    captured = {}
+    render = Template.render
+
+    def capture(self, context=None, request=None):
+        captured.setdefault(self.template.name, (context, request))
+        return render(self, context, request)
+
+    Template.render = capture
+    try:
+        yield captured
+    finally:
+        Template.render = render
+
+
+def capture(scenarios, fixtures) -> dict:
+    """ Контексты шаблонов GET-сценариев. """
+    with captured_contexts() as captured:
+        for scenario in scenarios:
+            if scenario.method == 'get':
+                scenario.request(_client(scenario, fixtures), fixtures)
+    return captured
+
+
+def measure(backend, name, context, request, iterations) -> float:
+    """ Медиана загрузки и рендеринга шаблона, мс. """
+    # первый рендеринг заполняет кэш загрузчика и кэш фрагментов
+    backend.get_template(name).render(context, request)
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        backend.get_template(name).render(context, request)
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(percentile(timings, 50), 3)
+
+
+def run(scenarios, fixtures, iterations=50, progress=None) -> dict:
+    """ Отчет {'templates': {имя: {'uncached_ms', 'cached_ms',
+    'speedup'}}}; progress(имя, результат).
+    """
+    backends = {
+        'uncached_ms': make_backend(cached=False),
+        'cached_ms': make_backend(cached=True),
+    }
+    templates = {}
+    for name, (context, request) in sorted(
+        capture(scenarios, fixtures).items()
+    ):
+        result = {
+            metric: measure(backend, name, context, request, iterations)
+            for metric, backend in backends.items()
+        }
+        result['speedup'] = round(
+            result['uncached_ms'] / max(result['cached_ms'], 0.001), 2
+        )
+        templates[name] = result
+        if progress is not None:
+            progress(name, result)
+    return {'meta': {'iterations': iterations}, 'templates': templates}
@@ -0,0 +1,131 @@
+""" Замеры вью через тестовый клиент и сравнение с базовой линией. """
+import json
+import platform
+import time
+import tracemalloc
+
+import django
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+PERCENTILES = (50, 90, 95, 99)
+
+# допустимый рост метрики относительно базовой линии
+DEFAULT_THRESHOLDS = {
+    'p50_ms': 0.25,
+    'p95_ms': 0.25,
+    'queries': 0,
+    'bytes': 0.10,
+    'peak_memory_kb': 0.25,
+}
+# разница во времени меньше этой считается шумом
+MIN_LATENCY_DELTA_MS = 1.0
+
+
+def percentile(values, rank) -> float:
+    """ Перцентиль с линейной интерполяцией между соседними замерами. """
+    values = sorted(values)
+    position = (len(values) - 1) * rank / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (
+        position - lower
+    )
+
+
+def _client(scenario, fixtures) -> Client:
+    client = Client()
+    if scenario.login:
+        client.force_login(fixtures.reader)
+    return client
+
+
+def measure(scenario, fixtures, iterations=50, warmup=5) -> dict:
+    """ Задержки, число запросов к базе, размер ответа и пик памяти. """
+    client = _client(scenario, fixtures)
+    for _ in range(warmup):
+        scenario.prepare()
+        scenario.request(client, fixtures)
+    timings = []
+    for _ in range(iterations):
+        scenario.prepare()
+        started = time.perf_counter()
+        response = scenario.request(client, fixtures)
+        timings.append((time.perf_counter() - started) * 1000)
+    # tracemalloc и перехват SQL замедляют запрос, поэтому память
+    # и запросы меряются отдельным проходом вне замеров времени
+    scenario.prepare()
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            response = scenario.request(client, fixtures)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    result = {
+        f'p{rank}_ms': round(percentile(timings, rank), 3)
+        for rank in PERCENTILES
+    }
+    result.update({
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': len(queries),
+        'bytes': len(response.content),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'status': response.status_code,
+    })
+    return result
+
+
+def run(scenarios, fixtures, iterations=50, warmup=5, progress=None):
+    """ Отчет по всем сценариям; progress(имя, результат). """
+    views = {}
+    for scenario in scenarios:
+        views[scenario.name] = measure(
+            scenario, fixtures, iterations, warmup
+        )
+        if progress is not None:
+            progress(scenario.name, views[scenario.name])
+    return {
+        'meta': {
+            'created': timezone.now().isoformat(),
+            'iterations': iterations,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+        },
+        'views': views,
+    }
+
+
+def compare(report, baseline, thresholds=None) -> list:
+    """ Регрессии report относительно baseline: список сообщений. """
+    thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    regressions = []
+    for name, result in report['views'].items():
+        base = baseline.get('views', {}).get(name)
+        if base is None:
+            continue
+        for metric, allowed in thresholds.items():
+            if metric not in base or metric not in result:
+                continue
+            old, new = base[metric], result[metric]
+            if new <= old * (1 + allowed):
+                continue
+            if metric.endswith('_ms') and new - old < MIN_LATENCY_DELTA_MS:
+                continue
+            regressions.append(f'{name}: {metric} {old} -> {new}')
+    return regressions
+
+
+def load(path) -> dict:
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save(report, path) -> None:
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+        file.write('\n')
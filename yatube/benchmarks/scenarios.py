@@ -0,0 +1,110 @@
+""" Сценарии бенчмарка: по одному на каждую публичную вью.
+
+После прогрева анонимные ленты отдаются из кэша страниц без запросов
+к базе, и их замер ловит только регрессии самого кэша. Поэтому у лент
+есть и сценарии *_uncached: перед каждым их запросом кэш очищается,
+и лента каждый раз читается из базы и рендерится заново.
+"""
+from itertools import count
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+
+
+class Fixtures:
+    """ Самые тяжелые объекты сгенерированной базы: самый активный
+    автор, самая большая группа, самый обсуждаемый пост и читатель
+    с наибольшим числом подписок.
+    """
+
+    def __init__(self):
+        self.author = User.objects.order_by(
+            '-stats__posts_count', 'pk'
+        ).first()
+        group = (
+            Post.objects.order_by().exclude(group=None).values('group')
+            .annotate(total=Count('pk')).order_by('-total').first()
+        )
+        self.group = Group.objects.get(pk=group['group']) if group else None
+        self.post = Post.objects.order_by('-comments_count', 'pk').first()
+        self.reader = User.objects.order_by(
+            '-stats__following_count', 'pk'
+        ).first()
+        self.numbers = count()
+
+
+class Scenario:
+    """ Запрос к вью; url и data вычисляются по Fixtures. """
+
+    def __init__(
+        self, name, url, method='get', data=None, login=False, cold=False
+    ):
+        self.name = name
+        self.url = url
+        self.method = method
+        self.data = data
+        self.login = login
+        self.cold = cold
+
+    def prepare(self):
+        """ Вызывается перед каждым запросом, вне замера времени. """
+        if self.cold:
+            cache.clear()
+
+    def request(self, client, fixtures):
+        data = self.data(fixtures) if self.data else None
+        return getattr(client, self.method)(self.url(fixtures), data)
+
+
+FEEDS = (
+    ('index', lambda f: reverse('posts:index')),
+    (
+        'group_posts',
+        lambda f: reverse('posts:group_list', args=[f.group.slug]),
+    ),
+    (
+        'profile',
+        lambda f: reverse('posts:profile', args=[f.author.username]),
+    ),
+)
+
+SCENARIOS = (
+    *(Scenario(name, url) for name, url in FEEDS),
+    *(Scenario(f'{name}_uncached', url, cold=True) for name, url in FEEDS),
+    Scenario(
+        'post_detail',
+        lambda f: reverse('posts:post_detail', args=[f.post.pk]),
+    ),
+    Scenario(
+        'follow_index', lambda f: reverse('posts:follow_index'), login=True
+    ),
+    Scenario(
+        'add_comment',
+        lambda f: reverse('posts:add_comment', args=[f.post.pk]),
+        method='post',
+        data=lambda f: {'text': f'Комментарий {next(f.numbers)}'},
+        login=True,
+    ),
+    Scenario(
+        'post_create',
+        lambda f: reverse('posts:post_create'),
+        method='post',
+        data=lambda f: {
+            'text': f'Пост {next(f.numbers)}', 'group': f.group.pk,
+        },
+        login=True,
+    ),
+)
+
+
+def get_scenarios(names=None) -> list:
+    if not names:
+        return list(SCENARIOS)
+    known = {scenario.name: scenario for scenario in SCENARIOS}
+    unknown = set(names) - set(known)
+    if unknown:
+        raise ValueError(f'Неизвестные сценарии: {", ".join(sorted(unknown))}')
+    return [known[name] for name in names]
@@ -0,0 +1,105 @@
+from django.test import TestCase, override_settings
+
+from posts import load_data, transfer
+
+from .. import rendering, runner
+from ..scenarios import SCENARIOS, Fixtures, get_scenarios
+
+ANONYMOUS_CACHED = ('index', 'group_posts', 'profile')
+
+
+class PercentileTests(TestCase):
+    def test_percentile(self):
+        """Перцентиль интерполируется между соседними замерами."""
+        values = [4, 1, 3, 2]
+        self.assertEqual(runner.percentile(values, 0), 1)
+        self.assertEqual(runner.percentile(values, 50), 2.5)
+        self.assertEqual(runner.percentile(values, 100), 4)
+        self.assertEqual(runner.percentile([7], 99), 7)
+
+
+class CompareTests(TestCase):
+    baseline = {'views': {'index': {
+        'p50_ms': 10.0, 'p95_ms': 20.0, 'queries': 1, 'bytes': 1000,
+        'peak_memory_kb': 100.0,
+    }}}
+
+    def report(self, **changes):
+        return {'views': {
+            'index': {**self.baseline['views']['index'], **changes},
+            'new_view': {'p50_ms': 1.0},
+        }}
+
+    def test_no_regressions(self):
+        """Шум в пределах порогов и новые вью не считаются регрессией."""
+        report = self.report(p50_ms=12.0, p95_ms=20.9, bytes=1050)
+        self.assertEqual(runner.compare(report, self.baseline), [])
+
+    def test_regressions(self):
+        """Рост запросов, задержки и размера ответа — регрессии."""
+        report = self.report(queries=2, p95_ms=30.0, bytes=2000)
+        self.assertEqual(runner.compare(report, self.baseline), [
+            'index: p95_ms 20.0 -> 30.0',
+            'index: queries 1 -> 2',
+            'index: bytes 1000 -> 2000',
+        ])
+
+    def test_custom_threshold(self):
+        """Порог метрики задается при сравнении."""
+        report = self.report(p95_ms=30.0)
+        self.assertEqual(
+            runner.compare(report, self.baseline, {'p95_ms': 1.0}), []
+        )
+
+    def test_small_latency_delta_ignored(self):
+        """Разница меньше миллисекунды — шум даже при большом росте."""
+        baseline = {'views': {'index': {'p50_ms': 0.5}}}
+        report = {'views': {'index': {'p50_ms': 1.2}}}
+        self.assertEqual(runner.compare(report, baseline), [])
+
+
+@override_settings(THUMBNAIL_ASYNC=False)
+class RunTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        load_data.generate(users=10, groups=2, posts=50, comments=20)
+        transfer.refresh_derived()
+
+    def test_run_all_scenarios(self):
+        """Каждая вью замеряется и отвечает без ошибок."""
+        report = runner.run(SCENARIOS, Fixtures(), iterations=2, warmup=1)
+        self.assertEqual(
+            list(report['views']), [scenario.name for scenario in SCENARIOS]
+        )
+        for scenario in SCENARIOS:
+            result = report['views'][scenario.name]
+            with self.subTest(view=scenario.name):
+                self.assertIn(result['status'], (200, 302))
+                if scenario.name in ANONYMOUS_CACHED:
+                    # после прогрева лента берется из кэша страниц
+                    self.assertEqual(result['queries'], 0)
+                else:
+                    # *_uncached каждый раз читают ленту из базы
+                    self.assertGreater(result['queries'], 0)
+                self.assertGreaterEqual(result['p95_ms'], result['p50_ms'])
+
+    def test_unknown_scenario(self):
+        with self.assertRaises(ValueError):
+            get_scenarios(['index', 'missing'])
+
+
+@override_settings(THUMBNAIL_ASYNC=False)
+class RenderingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        load_data.generate(users=5, groups=1, posts=20, comments=10)
+        transfer.refresh_derived()
+
+    def test_templates_measured(self):
+        """Шаблоны вью рендерятся с контекстами настоящих запросов."""
+        report = rendering.run(SCENARIOS, Fixtures(), iterations=2)
+        for name in ('posts/index.html', 'posts/post_detail.html'):
+            with self.subTest(name=name):
+                result = report['templates'][name]
+                self.assertGreater(result['uncached_ms'], 0)
+                self.assertGreater(result['cached_ms'], 0)
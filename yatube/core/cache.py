@@ -0,0 +1,283 @@
+""" Кэш в файле SQLite, общий для всех процессов сервера.
+
+Не требует внешних сервисов: все воркеры открывают один файл в режиме
+WAL, читатели не блокируют писателя. У записей есть срок жизни, при
+переполнении сначала удаляются просроченные, затем давно не читанные
+(LRU). Настройки:
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': '/var/cache/yatube/cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 10000, 'CULL_FREQUENCY': 3},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+'''
+
+# время последнего чтения обновляется не чаще раза в секунду:
+# иначе каждое попадание было бы записью
+ACCESS_GRANULARITY = 1.0
+
+
+class SQLiteCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.busy_timeout = options.get('BUSY_TIMEOUT', 5.0)
+        # COUNT(*) при каждой записи дорог: размер проверяется раз
+        # в CULL_CHECK_INTERVAL записей процесса
+        self.cull_check_interval = options.get('CULL_CHECK_INTERVAL', 20)
+        self._writes = 0
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # соединение на поток и процесс: после fork() старое не годится
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    @staticmethod
+    def _alive(expires, now) -> bool:
+        return expires is None or expires > now
+
+    def _touch_accessed(self, keys, now) -> None:
+        self.connection.executemany(
+            'UPDATE cache SET accessed = ? WHERE key = ? AND accessed < ?',
+            [(now, key, now - ACCESS_GRANULARITY) for key in keys],
+        )
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        row = self.connection.execute(
+            'SELECT value, expires FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return default
+        value, expires = row
+        if not self._alive(expires, now):
+            self.connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, now),
+            )
+            return default
+        self._touch_accessed([key], now)
+        return pickle.loads(value)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        now = time.time()
+        placeholders = ', '.join('?' * len(keys))
+        rows = self.connection.execute(
+            f'SELECT key, value, expires FROM cache '
+            f'WHERE key IN ({placeholders})',
+            list(keys),
+        ).fetchall()
+        found = {
+            key: value for key, value, expires in rows
+            if self._alive(expires, now)
+        }
+        self._touch_accessed(found, now)
+        return {keys[key]: pickle.loads(value) for key, value in found.items()}
+
+    def _write(self, sql, rows):
+        with self._transaction() as connection:
+            connection.executemany(sql, rows)
+        self._maybe_cull()
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?)',
+            [(
+                self._key(key, version),
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                self._expires(timeout),
+                time.time(),
+            )],
+        )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expires(timeout)
+        now = time.time()
+        self._write(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?)',
+            [
+                (
+                    self._key(key, version),
+                    pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                    expires,
+                    now,
+                )
+                for key, value in data.items()
+            ],
+        )
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?', (key, now)
+            )
+            added = connection.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?)',
+                (
+                    key,
+                    pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                    self._expires(timeout),
+                    now,
+                ),
+            ).rowcount
+        self._maybe_cull()
+        return bool(added)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        return bool(self.connection.execute(
+            'UPDATE cache SET expires = ?, accessed = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self._expires(timeout), now, key, now),
+        ).rowcount)
+
+    def incr(self, key, delta=1, version=None):
+        """ Атомарно для всех процессов: чтение и запись в одной
+        транзакции BEGIN IMMEDIATE.
+        """
+        key = self._key(key, version)
+        now = time.time()
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or not self._alive(row[1], now):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ?, accessed = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now, key),
+            )
+        return value
+
+    def delete(self, key, version=None):
+        self.connection.execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),)
+        )
+
+    def delete_many(self, keys, version=None):
+        self.connection.executemany(
+            'DELETE FROM cache WHERE key = ?',
+            [(self._key(key, version),) for key in keys],
+        )
+
+    def has_key(self, key, version=None):
+        row = self.connection.execute(
+            'SELECT expires FROM cache WHERE key = ?',
+            (self._key(key, version),),
+        ).fetchone()
+        return row is not None and self._alive(row[0], time.time())
+
+    def clear(self):
+        self.connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # соединение живет весь поток: Django вызывает close() после
+        # каждого запроса, а переоткрывать файл на каждый запрос дорого
+        pass
+
+    def _transaction(self):
+        return _Transaction(self.connection)
+
+    def _maybe_cull(self) -> None:
+        self._writes += 1
+        if self._writes % self.cull_check_interval:
+            return
+        self.cull()
+
+    def cull(self) -> None:
+        """ Удаляет просроченные записи, а при переполнении — долю
+        1 / CULL_FREQUENCY давно не читанных.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute(
+                'DELETE FROM cache WHERE expires <= ?', (now,)
+            )
+            count = connection.execute(
+                'SELECT COUNT(*) FROM cache'
+            ).fetchone()[0]
+            if count <= self._max_entries:
+                return
+            if self._cull_frequency == 0:
+                connection.execute('DELETE FROM cache')
+                return
+            connection.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (max(count // self._cull_frequency,
+                     count - self._max_entries),),
+            )
+
+
+class _Transaction:
+    """ BEGIN IMMEDIATE ... COMMIT: запись сразу берет блокировку базы,
+    и два процесса не перезапишут изменения друг друга.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.connection.execute('ROLLBACK' if exc_type else 'COMMIT')
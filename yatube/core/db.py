@@ -0,0 +1,18 @@
+""" Настройка соединений с SQLite.
+
+Каждое новое соединение получает PRAGMA из SQLITE_PRAGMAS: журнал WAL
+(читатели не ждут писателя и наоборот), synchronous=NORMAL (в режиме
+WAL база остается целостной, fsync только на контрольных точках),
+отображение файла в память, кэш страниц и ожидание блокировки вместо
+немедленной ошибки «database is locked».
+"""
+from django.conf import settings
+
+
+def configure_sqlite(sender, connection, **kwargs) -> None:
+    """ Обработчик сигнала connection_created. """
+    if connection.vendor != 'sqlite':
+        return
+    # напрямую через sqlite3: PRAGMA не нужны ни в логах, ни в метриках
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,265 @@
+""" Метрики запросов: SQL, рендеринг шаблонов, кэш и общее время.
+
+Метрики текущего запроса собираются в RequestMetrics, доступный через
+contextvar, и после ответа складываются в гистограммы по имени вью
+(resolver_match.view_name). Шаблоны и кэш инструментируются один раз
+при старте приложения core (install()).
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+# границы корзин гистограмм: миллисекунды или штуки
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+SPACES = re.compile(r'\s+')
+
+
+def sql_shape(sql: str) -> str:
+    """ Форма запроса: одинакова у запросов, отличающихся параметрами
+    и длиной списка в IN (...).
+    """
+    return SPACES.sub(' ', IN_LIST.sub('(%s...)', sql)).strip()
+
+
+class RequestMetrics:
+    """ Метрики одного HTTP-запроса. """
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.total_ms = 0.0
+        self.shapes = Counter()
+        self._template_depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        """ Обертка connection.execute_wrapper(). """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_ms += (time.perf_counter() - started) * 1000
+            self.sql_count += 1
+            self.shapes[sql_shape(sql)] += 1
+
+    def repeated_queries(self, threshold) -> list:
+        """ Формы запросов, повторенные не меньше threshold раз (N+1). """
+        return [
+            (shape, count) for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+    def server_timing(self) -> str:
+        """ Значение заголовка Server-Timing. """
+        return ', '.join([
+            f'sql;dur={self.sql_ms:.1f};desc="{self.sql_count} queries"',
+            f'tpl;dur={self.template_ms:.1f}',
+            f'cache;desc="{self.cache_hits} hits, '
+            f'{self.cache_misses} misses"',
+            f'total;dur={self.total_ms:.1f}',
+        ])
+
+
+def current() -> RequestMetrics:
+    return _current.get()
+
+
+def activate(metrics: RequestMetrics):
+    return _current.set(metrics)
+
+
+def deactivate(token) -> None:
+    _current.reset(token)
+
+
+class Histogram:
+    """ Гистограмма с фиксированными корзинами BUCKETS. """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value) -> None:
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                break
+        else:
+            index = len(BUCKETS)
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, rank):
+        """ Оценка квантиля: верхняя граница корзины, куда он попал;
+        None — если он за последней границей.
+        """
+        if not self.count:
+            return 0
+        needed = rank * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= needed:
+                return bound
+        return None
+
+    def as_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 3),
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'buckets': {
+                **{
+                    str(bound): count
+                    for bound, count in zip(BUCKETS, self.counts)
+                },
+                '+Inf': self.counts[-1],
+            },
+        }
+
+
+class Registry:
+    """ Гистограммы метрик по вью внутри процесса. """
+
+    metrics = ('total_ms', 'sql_count', 'sql_ms', 'template_ms')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view_name: str, metrics: RequestMetrics) -> None:
+        with self._lock:
+            view = self._views.get(view_name)
+            if view is None:
+                view = self._views[view_name] = {
+                    'histograms': {
+                        name: Histogram() for name in self.metrics
+                    },
+                    'cache_hits': 0,
+                    'cache_misses': 0,
+                }
+            for name, histogram in view['histograms'].items():
+                histogram.observe(getattr(metrics, name))
+            view['cache_hits'] += metrics.cache_hits
+            view['cache_misses'] += metrics.cache_misses
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                view_name: {
+                    **{
+                        name: histogram.as_dict()
+                        for name, histogram in view['histograms'].items()
+                    },
+                    'cache_hits': view['cache_hits'],
+                    'cache_misses': view['cache_misses'],
+                }
+                for view_name, view in sorted(self._views.items())
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._views.clear()
+
+
+registry = Registry()
+
+
+def log_repeated_queries(view_name: str, metrics: RequestMetrics) -> None:
+    threshold = settings.INSTRUMENTATION_N_PLUS_ONE_THRESHOLD
+    for shape, count in metrics.repeated_queries(threshold):
+        logger.warning(
+            'Возможный N+1 в %s: %s одинаковых запросов: %s',
+            view_name, count, shape,
+        )
+
+
+def _timed_render(render):
+    @wraps(render)
+    def wrapper(self, *args, **kwargs):
+        metrics = current()
+        if metrics is None:
+            return render(self, *args, **kwargs)
+        # вложенные render() (например, из тега) не считаем дважды
+        metrics._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            metrics._template_depth -= 1
+            if not metrics._template_depth:
+                metrics.template_ms += (time.perf_counter() - started) * 1000
+    wrapper.instrumented = True
+    return wrapper
+
+
+_MISSING = object()
+
+
+def _counted_get(get):
+    @wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        value = get(self, key, _MISSING, version)
+        metrics = current()
+        if metrics is not None:
+            if value is _MISSING:
+                metrics.cache_misses += 1
+            else:
+                metrics.cache_hits += 1
+        return default if value is _MISSING else value
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    @wraps(get_many)
+    def wrapper(self, keys, version=None):
+        keys = list(keys)
+        metrics = current()
+        if metrics is None:
+            return get_many(self, keys, version=version)
+        # базовый get_many вызывает get() на каждый ключ: не считаем дважды
+        token = _current.set(None)
+        try:
+            found = get_many(self, keys, version=version)
+        finally:
+            _current.reset(token)
+        metrics.cache_hits += len(found)
+        metrics.cache_misses += len(keys) - len(found)
+        return found
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _patch(cls, name, decorator) -> None:
+    method = getattr(cls, name)
+    if not getattr(method, 'instrumented', False):
+        setattr(cls, name, decorator(method))
+
+
+def install() -> None:
+    """ Подключает замер шаблонов и подсчет обращений к кэшам. """
+    from django.template.backends.django import Template
+
+    _patch(Template, 'render', _timed_render)
+    for alias in settings.CACHES:
+        cache_class = type(caches[alias])
+        _patch(cache_class, 'get', _counted_get)
+        _patch(cache_class, 'get_many', _counted_get_many)
@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.replication import replicate
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу в реплики DATABASE_REPLICAS: один раз '
+        'или раз в --interval секунд'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Повторять копирование с таким интервалом, секунд',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError(
+                'Реплики не настроены: задайте DATABASE_REPLICA_PATHS'
+            )
+        while True:
+            for alias, elapsed in replicate().items():
+                self.stdout.write(f'{alias}: {elapsed * 1000:.1f} мс')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
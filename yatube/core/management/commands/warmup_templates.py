@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.warmup import warmup
+
+
+class Command(BaseCommand):
+    help = (
+        'Разбирает все шаблоны проекта: проверяет их синтаксис и показывает '
+        'время разбора'
+    )
+
+    def handle(self, *args, **options):
+        timings, errors = warmup()
+        if options['verbosity'] > 1:
+            for name, elapsed in sorted(
+                timings.items(), key=lambda item: item[1], reverse=True
+            ):
+                self.stdout.write(f'{elapsed:>8.2f} мс  {name}')
+        self.stdout.write(
+            f'Разобрано шаблонов: {len(timings)} '
+            f'за {sum(timings.values()):.1f} мс'
+        )
+        if errors:
+            raise CommandError('\n'.join(
+                f'{name}: {error}' for name, error in errors.items()
+            ))
@@ -0,0 +1,43 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import instrumentation, prometheus
+
+
+class InstrumentationMiddleware:
+    """ Замеряет каждый запрос и складывает метрики в гистограммы по вью.
+
+    Стоит первым в MIDDLEWARE, чтобы в общее время попали и остальные
+    middleware. При INSTRUMENTATION_SERVER_TIMING метрики запроса
+    отдаются в заголовке Server-Timing; счетчики и гистограммы для
+    Prometheus пополняются всегда.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = instrumentation.RequestMetrics()
+        token = instrumentation.activate(metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(metrics.execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            instrumentation.deactivate(token)
+        metrics.total_ms = (time.perf_counter() - started) * 1000
+        match = request.resolver_match
+        view_name = match.view_name if match else '<unresolved>'
+        instrumentation.registry.record(view_name, metrics)
+        instrumentation.log_repeated_queries(view_name, metrics)
+        prometheus.observe_request(view_name, request, response, metrics)
+        if settings.INSTRUMENTATION_SERVER_TIMING:
+            response['Server-Timing'] = metrics.server_timing()
+        return response
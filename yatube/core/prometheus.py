@@ -0,0 +1,310 @@
+""" Метрики приложения в текстовом формате Prometheus.
+
+Значения копятся в словаре своего потока, поэтому запись метрики
+не берет блокировок; при выдаче /metrics словари всех потоков
+складываются. Словари завершившихся потоков сливаются в общий
+и не растут вместе с числом потоков.
+
+Несколько процессов WSGI-сервера видят только свои значения. Если
+задан METRICS_MULTIPROCESS_DIR, процесс не чаще раза в
+METRICS_FLUSH_INTERVAL секунд сбрасывает свои значения в файл этого
+каталога, а /metrics складывает файлы всех процессов.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+
+_local = threading.local()
+_stores = []
+_retired = {}
+_lock = threading.Lock()
+_last_flush = 0.0
+
+registry = []
+
+
+def _store() -> dict:
+    try:
+        return _local.values
+    except AttributeError:
+        values = _local.values = {}
+        with _lock:
+            _stores.append((threading.current_thread(), values))
+        return values
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        registry.append(self)
+
+
+class Counter(Metric):
+    type = COUNTER
+
+    def inc(self, *labels, amount=1) -> None:
+        store = _store()
+        key = (self.name, labels)
+        store[key] = store.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    type = HISTOGRAM
+
+    def __init__(self, name, documentation, labels=(), buckets=()):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels) -> None:
+        store = _store()
+        key = (self.name, labels)
+        values = store.get(key)
+        if values is None:
+            # счетчики корзин, +Inf, сумма и число наблюдений
+            values = store[key] = [0] * (len(self.buckets) + 3)
+        values[bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+
+def _add(total: dict, values: dict) -> None:
+    for key, value in values.items():
+        if isinstance(value, list):
+            current = total.get(key)
+            if current is None:
+                total[key] = list(value)
+            else:
+                for index, item in enumerate(value):
+                    current[index] += item
+        else:
+            total[key] = total.get(key, 0) + value
+
+
+def collect() -> dict:
+    """ Значения всех потоков этого процесса: {(метрика, метки): ...}. """
+    total = {}
+    with _lock:
+        alive = []
+        for thread, values in _stores:
+            if thread.is_alive():
+                alive.append((thread, values))
+                # copy() словаря атомарна под GIL, поток может писать в него
+                _add(total, values.copy())
+            else:
+                _add(_retired, values)
+        _stores[:] = alive
+        _add(total, _retired)
+    return total
+
+
+def _path(directory, pid) -> str:
+    return os.path.join(directory, f'metrics-{pid}.json')
+
+
+def flush(force=False) -> None:
+    """ Сбрасывает значения процесса в файл METRICS_MULTIPROCESS_DIR. """
+    global _last_flush
+    directory = settings.METRICS_MULTIPROCESS_DIR
+    if not directory:
+        return
+    now = time.monotonic()
+    if not force and now - _last_flush < settings.METRICS_FLUSH_INTERVAL:
+        return
+    _last_flush = now
+    rows = [
+        [name, list(labels), value]
+        for (name, labels), value in collect().items()
+    ]
+    # запись через временный файл: читатель не увидит его наполовину
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(handle, 'w') as file:
+        json.dump(rows, file)
+    os.replace(temporary, _path(directory, os.getpid()))
+
+
+def collect_all() -> dict:
+    """ Значения всех процессов или только этого, если каталог не задан. """
+    directory = settings.METRICS_MULTIPROCESS_DIR
+    if not directory:
+        return collect()
+    flush(force=True)
+    total = {}
+    for name in os.listdir(directory):
+        if not (name.startswith('metrics-') and name.endswith('.json')):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as file:
+                rows = json.load(file)
+        except (OSError, ValueError):
+            continue
+        _add(total, {
+            (metric, tuple(labels)): value for metric, labels, value in rows
+        })
+    return total
+
+
+def _escape(value) -> str:
+    return (
+        str(value).replace('\\', r'\\').replace('"', r'\"')
+        .replace('\n', r'\n')
+    )
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{_escape(value)}"' for name, value in pairs
+    ) + '}'
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _histogram_lines(metric, labels, values) -> list:
+    lines = []
+    cumulative = 0
+    bounds = [*map(_number, metric.buckets), '+Inf']
+    for bound, count in zip(bounds, values):
+        cumulative += count
+        lines.append(
+            f'{metric.name}_bucket'
+            f'{_labels(metric.labels, labels, [("le", bound)])} {cumulative}'
+        )
+    suffix = _labels(metric.labels, labels)
+    lines.append(f'{metric.name}_sum{suffix} {_number(values[-2])}')
+    lines.append(f'{metric.name}_count{suffix} {values[-1]}')
+    return lines
+
+
+def exposition() -> str:
+    """ Текст для /metrics в формате Prometheus 0.0.4. """
+    values = collect_all()
+    by_metric = {}
+    for (name, labels), value in sorted(values.items()):
+        by_metric.setdefault(name, []).append((labels, value))
+    lines = []
+    for metric in registry:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for labels, value in by_metric.get(metric.name, []):
+            if metric.type == HISTOGRAM:
+                lines.extend(_histogram_lines(metric, labels, value))
+            else:
+                lines.append(
+                    f'{metric.name}{_labels(metric.labels, labels)} '
+                    f'{_number(value)}'
+                )
+    hits = values.get((CACHE_GETS.name, ('hit',)), 0)
+    misses = values.get((CACHE_GETS.name, ('miss',)), 0)
+    lines.append(
+        '# HELP yatube_cache_hit_ratio Доля попаданий в кэш '
+        'CACHES["default"]'
+    )
+    lines.append('# TYPE yatube_cache_hit_ratio gauge')
+    ratio = hits / (hits + misses) if hits + misses else 0.0
+    lines.append(f'yatube_cache_hit_ratio {_number(ratio)}')
+    return '\n'.join(lines) + '\n'
+
+
+REQUESTS = Counter(
+    'yatube_http_requests_total',
+    'HTTP-запросы по вью',
+    ('view', 'method', 'status'),
+)
+REQUEST_SECONDS = Histogram(
+    'yatube_http_request_duration_seconds',
+    'Время ответа',
+    ('view',),
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+RESPONSE_BYTES = Histogram(
+    'yatube_http_response_size_bytes',
+    'Размер ответа',
+    ('view',),
+    (1000, 5000, 10000, 25000, 50000, 100000, 250000, 1000000),
+)
+DB_QUERIES = Histogram(
+    'yatube_db_queries',
+    'SQL-запросов на один HTTP-запрос',
+    ('view',),
+    (1, 2, 3, 5, 10, 20, 50, 100),
+)
+CACHE_GETS = Counter(
+    'yatube_cache_gets_total',
+    'Чтения из кэша во время запросов',
+    ('result',),
+)
+THUMBNAIL_SECONDS = Histogram(
+    'yatube_thumbnail_generation_seconds',
+    'Время генерации миниатюр поста',
+    (),
+    (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+POSTS_CREATED = Counter('yatube_posts_created_total', 'Созданные посты')
+COMMENTS_CREATED = Counter(
+    'yatube_comments_created_total', 'Созданные комментарии'
+)
+WRITE_QUEUE_DEPTH = Histogram(
+    'yatube_write_queue_depth',
+    'Операций в очереди писателя на момент постановки новой',
+    (),
+    (0, 1, 2, 5, 10, 20, 50, 100),
+)
+WRITE_BATCH_SIZE = Histogram(
+    'yatube_write_batch_size',
+    'Операций в одной транзакции писателя',
+    (),
+    (1, 2, 5, 10, 20, 50),
+)
+WRITE_COMMIT_SECONDS = Histogram(
+    'yatube_write_commit_seconds',
+    'Время транзакции писателя вместе с повторами',
+    (),
+    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+WRITE_RETRIES = Counter(
+    'yatube_write_retries_total', 'Повторы транзакций из-за блокировки базы'
+)
+WRITE_ABANDONED = Counter(
+    'yatube_write_abandoned_total',
+    'Записи, результата которых вызвавший не дождался',
+    ('state',),
+)
+
+
+def observe_request(view_name, request, response, metrics) -> None:
+    """ Метрики HTTP-запроса из core.instrumentation.RequestMetrics. """
+    REQUESTS.inc(view_name, request.method, str(response.status_code))
+    REQUEST_SECONDS.observe(metrics.total_ms / 1000, view_name)
+    if not response.streaming:
+        RESPONSE_BYTES.observe(len(response.content), view_name)
+    DB_QUERIES.observe(metrics.sql_count, view_name)
+    if metrics.cache_hits:
+        CACHE_GETS.inc('hit', amount=metrics.cache_hits)
+    if metrics.cache_misses:
+        CACHE_GETS.inc('miss', amount=metrics.cache_misses)
+    flush()
@@ -0,0 +1,48 @@
+""" Замена репликации для локальной проверки чтения с реплик.
+
+Реплики DATABASE_REPLICAS — отдельные файлы SQLite; replicate()
+целиком копирует в них default через backup API SQLite: копия
+согласована на момент начала, а читатели реплики видят либо старую,
+либо новую копию. Между копиями реплика отстает так же, как отстала
+бы настоящая асинхронная реплика.
+"""
+import sqlite3
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.db import connections
+
+from . import routers
+
+
+def copy_database(source: str, target: str) -> None:
+    """ Копирует файл SQLite source в target вместе со временем начала
+    копирования в таблице routers.SYNC_TABLE.
+    """
+    with closing(sqlite3.connect(source)) as primary:
+        # время попадает в ту же согласованную копию, что и данные:
+        # в ней все, что записано до него
+        with primary:
+            primary.execute(
+                f'CREATE TABLE IF NOT EXISTS {routers.SYNC_TABLE} '
+                '(synced REAL)'
+            )
+            primary.execute(f'DELETE FROM {routers.SYNC_TABLE}')
+            primary.execute(
+                f'INSERT INTO {routers.SYNC_TABLE} VALUES (?)', [time.time()]
+            )
+        # ждет, пока читатели реплики отпустят ее файл
+        with closing(sqlite3.connect(target, timeout=30)) as replica:
+            primary.backup(replica)
+
+
+def replicate() -> dict:
+    """ Копирует default во все реплики; {алиас: секунд на копию}. """
+    source = connections[routers.PRIMARY].settings_dict['NAME']
+    timings = {}
+    for alias in settings.DATABASE_REPLICAS:
+        started = time.time()
+        copy_database(source, connections[alias].settings_dict['NAME'])
+        timings[alias] = time.time() - started
+    return timings
@@ -0,0 +1,120 @@
+""" Чтение лент с реплик базы, запись — в основную базу.
+
+Вью лент, обернутые в use_replica, читают с одной из реплик
+DATABASE_REPLICAS, выбранной на весь запрос; остальные вью и любая
+запись идут в default. Пользователь, только что написавший пост,
+комментарий или подписку (stick()), еще REPLICA_STICKY_SECONDS читает
+из default: реплика могла не успеть получить его запись.
+
+Реплика, скопированная раньше последнего изменения ленты, отдает ее
+без этого изменения; lagging() сообщает об этом feed_cache, чтобы
+такая страница не попала в кэш под новой версией ленты. Время копии
+реплика хранит в себе, в таблице SYNC_TABLE (ее пишет core.replication);
+у реплик без такой таблицы отставание не учитывается.
+"""
+import contextvars
+import random
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+PRIMARY = 'default'
+STICKY_KEY = 'replica-sticky:{}'
+SYNC_TABLE = 'replication_status'
+
+_replica = contextvars.ContextVar('replica', default=None)
+
+
+class PrimaryReplicaRouter:
+    """ DATABASE_ROUTERS: чтения внутри use_replica — с реплики. """
+
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db not in (
+            None, PRIMARY, *settings.DATABASE_REPLICAS
+        ):
+            # объект другой базы, не реплики, пишется в нее же
+            return None
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики — копии default, объекты из них связываются свободно
+        aliases = {PRIMARY, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # схема приходит на реплику вместе с данными
+        return db not in settings.DATABASE_REPLICAS
+
+
+def current() -> str:
+    """ Реплика, с которой читает текущий запрос, или None. """
+    return _replica.get()
+
+
+def stick(user_id) -> None:
+    """ Направляет чтения пользователя в default на время,
+    пока реплики догоняют его запись.
+    """
+    if settings.DATABASE_REPLICAS and user_id is not None:
+        cache.set(
+            STICKY_KEY.format(user_id), True,
+            settings.REPLICA_STICKY_SECONDS,
+        )
+
+
+def is_sticky(user_id) -> bool:
+    return user_id is not None and bool(
+        cache.get(STICKY_KEY.format(user_id))
+    )
+
+
+def synced_at(alias: str) -> float:
+    """ Время, до которого реплика alias содержит все записи, или None. """
+    with connections[alias].cursor() as cursor:
+        try:
+            cursor.execute(f'SELECT synced FROM {SYNC_TABLE}')
+        except DatabaseError:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def lagging(modified) -> bool:
+    """ Текущая реплика скопирована не позже изменения modified
+    (секунды, как в версиях feed_cache).
+    """
+    alias = _replica.get()
+    if alias is None or modified is None:
+        return False
+    synced = synced_at(alias)
+    # версии лент хранят время с точностью до секунды
+    return synced is not None and int(synced) <= modified
+
+
+def use_replica(view):
+    """ Чтения вью — с реплики, если пользователь не «прилип» к default.
+
+    Сессия и пользователь загружаются из default до переключения:
+    на реплике может еще не быть только что созданной сессии.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not settings.DATABASE_REPLICAS:
+            return view(request, *args, **kwargs)
+        user = getattr(request, 'user', None)
+        if user is not None and is_sticky(user.pk):
+            return view(request, *args, **kwargs)
+        token = _replica.set(random.choice(settings.DATABASE_REPLICAS))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica.reset(token)
+    return wrapper
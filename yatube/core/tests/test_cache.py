@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ..cache import SQLiteCache
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {'TIMEOUT': 60, 'OPTIONS': options})
+
+    def test_shared_between_instances(self):
+        """Запись одного процесса видна другому: общий файл."""
+        other = self.make_cache()
+        self.cache.set('fragment', {'html': '<p>пост</p>'})
+        self.assertEqual(other.get('fragment'), {'html': '<p>пост</p>'})
+        other.delete('fragment')
+        self.assertIsNone(self.cache.get('fragment'))
+
+    def test_expiry(self):
+        self.cache.set('key', 'value', timeout=10)
+        self.cache.set('forever', 'value', timeout=None)
+        now = self.cache.connection.execute(
+            'SELECT expires FROM cache WHERE key = ?',
+            (self.cache.make_key('key'),),
+        ).fetchone()[0]
+        with mock.patch('core.cache.time.time', return_value=now + 1):
+            self.assertIsNone(self.cache.get('key'))
+            self.assertFalse(self.cache.has_key('key'))
+            self.assertTrue(self.cache.add('key', 'new'))
+            self.assertEqual(self.cache.get('forever'), 'value')
+        self.assertFalse(self.cache.add('forever', 'other'))
+
+    def test_many(self):
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'missing']), {'a': 1, 'b': 2}
+        )
+        self.cache.delete_many(['a', 'b'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+    def test_incr_atomic(self):
+        """Счетчик не теряет приращений из разных потоков."""
+        self.cache.set('counter', 0)
+
+        def work():
+            for _ in range(20):
+                self.cache.incr('counter')
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get('counter'), 80)
+        self.assertEqual(self.cache.decr('counter', 5), 75)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_lru_cull(self):
+        """При переполнении удаляются давно не читанные записи."""
+        cache = self.make_cache(
+            MAX_ENTRIES=3, CULL_FREQUENCY=3, CULL_CHECK_INTERVAL=1
+        )
+        for key in 'abc':
+            cache.set(key, key)
+        cache.connection.executemany(
+            'UPDATE cache SET accessed = ? WHERE key = ?',
+            [(second, cache.make_key(key))
+             for second, key in enumerate('abc')],
+        )
+        cache.get('a')
+        cache.set('d', 'd')
+        self.assertEqual(
+            cache.get_many('abcd'), {'a': 'a', 'c': 'c', 'd': 'd'}
+        )
@@ -0,0 +1,25 @@
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+
+from ..db import configure_sqlite
+
+
+class SQLitePragmasTests(SimpleTestCase):
+    databases = {'default'}
+
+    def pragma(self, name):
+        return connection.connection.execute(f'PRAGMA {name}').fetchone()[0]
+
+    def test_applied_on_connect(self):
+        """Новое соединение получает PRAGMA из SQLITE_PRAGMAS."""
+        connection.ensure_connection()
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+        self.assertEqual(self.pragma('synchronous'), 1)
+
+    @override_settings(SQLITE_PRAGMAS={'cache_size': -1024})
+    def test_settings_read_per_connection(self):
+        connection.ensure_connection()
+        configure_sqlite(None, connection)
+        self.addCleanup(configure_sqlite, None, connection)
+        self.assertEqual(self.pragma('cache_size'), -1024)
@@ -0,0 +1,80 @@
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from .. import instrumentation
+
+INDEX_URL = reverse('posts:index')
+METRICS_URL = reverse('request_metrics')
+
+
+@override_settings(INSTRUMENTATION_SERVER_TIMING=True)
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.admin = User.objects.create_user(username='admin', is_staff=True)
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        instrumentation.registry.reset()
+        self.guest_client = Client()
+
+    def test_server_timing(self):
+        """Метрики запроса отдаются в заголовке Server-Timing."""
+        response = self.guest_client.get(INDEX_URL)
+        header = response['Server-Timing']
+        for metric in ('sql;dur=', 'tpl;dur=', 'cache;desc=', 'total;dur='):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, header)
+
+    @override_settings(INSTRUMENTATION_SERVER_TIMING=False)
+    def test_server_timing_disabled(self):
+        response = self.guest_client.get(INDEX_URL)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_histograms_by_view(self):
+        """Гистограммы собираются по имени вью."""
+        self.guest_client.get(INDEX_URL)
+        self.guest_client.get(INDEX_URL)
+        view = instrumentation.registry.snapshot()['posts:index']
+        self.assertEqual(view['total_ms']['count'], 2)
+        self.assertGreater(view['sql_count']['sum'], 0)
+        self.assertGreater(view['template_ms']['sum'], 0)
+        # первая страница кладется в кэш, вторая берется из него
+        self.assertGreater(view['cache_misses'], 0)
+        self.assertGreater(view['cache_hits'], 0)
+
+    def test_metrics_endpoint_for_staff(self):
+        """Гистограммы доступны персоналу и закрыты от остальных."""
+        self.guest_client.get(INDEX_URL)
+        response = self.guest_client.get(METRICS_URL)
+        self.assertEqual(response.status_code, 302)
+        self.guest_client.force_login(self.admin)
+        response = self.guest_client.get(METRICS_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('posts:index', response.json())
+
+    @override_settings(INSTRUMENTATION_N_PLUS_ONE_THRESHOLD=2)
+    def test_repeated_queries_logged(self):
+        """Повторы одного SQL-запроса записываются в лог как N+1."""
+        metrics = instrumentation.RequestMetrics()
+        for _ in range(3):
+            metrics.shapes[instrumentation.sql_shape(
+                'SELECT * FROM post WHERE id IN (%s, %s)'
+            )] += 1
+        with self.assertLogs('core.instrumentation', 'WARNING') as logs:
+            instrumentation.log_repeated_queries('posts:index', metrics)
+        self.assertIn('posts:index', logs.output[0])
+        self.assertIn('IN (%s...)', logs.output[0])
+
+    def test_histogram_quantile(self):
+        histogram = instrumentation.Histogram()
+        for value in (0.5, 3, 3, 40, 10000):
+            histogram.observe(value)
+        self.assertEqual(histogram.quantile(0.5), 5)
+        self.assertIsNone(histogram.quantile(1))
@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+from posts.tests.utils import run_on_commit
+
+from .. import prometheus
+
+INDEX_URL = reverse('posts:index')
+METRICS_URL = reverse('metrics')
+
+
+class PrometheusTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def sample(self, name, labels=()):
+        return prometheus.collect().get((name, tuple(labels)), 0)
+
+    def test_request_metrics(self):
+        """Запросы, размер ответа и число SQL-запросов считаются по вью."""
+        before = self.sample(
+            prometheus.REQUESTS.name, ('posts:index', 'GET', '200')
+        )
+        self.guest_client.get(INDEX_URL)
+        response = self.guest_client.get(METRICS_URL)
+        self.assertEqual(
+            self.sample(
+                prometheus.REQUESTS.name, ('posts:index', 'GET', '200')
+            ),
+            before + 1,
+        )
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        text = response.content.decode()
+        for line in (
+            '# TYPE yatube_http_requests_total counter',
+            'yatube_http_requests_total{view="posts:index",method="GET",'
+            'status="200"}',
+            'yatube_http_response_size_bytes_bucket{view="posts:index",'
+            'le="+Inf"}',
+            'yatube_db_queries_count{view="posts:index"}',
+            'yatube_cache_hit_ratio ',
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line, text)
+
+    def test_metrics_restricted(self):
+        """Метрики видны разрешенным адресам и персоналу."""
+        outside = {'REMOTE_ADDR': '203.0.113.5'}
+        response = self.guest_client.get(METRICS_URL, **outside)
+        self.assertEqual(response.status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=['203.0.113.0/24']):
+            response = self.guest_client.get(METRICS_URL, **outside)
+        self.assertEqual(response.status_code, 200)
+        staff = User.objects.create_user(username='admin', is_staff=True)
+        self.guest_client.force_login(staff)
+        response = self.guest_client.get(METRICS_URL, **outside)
+        self.assertEqual(response.status_code, 200)
+
+    def test_created_counters(self):
+        """Считаются созданные посты, но не повторные сохранения."""
+        before = self.sample(prometheus.POSTS_CREATED.name)
+        with run_on_commit():
+            post = Post.objects.create(author=self.user, text='Тестовый пост')
+            post.save()
+        self.assertEqual(
+            self.sample(prometheus.POSTS_CREATED.name), before + 1
+        )
+
+    def test_histogram_buckets_cumulative(self):
+        histogram = prometheus.Histogram(
+            'test_histogram_seconds', 'Тест', ('view',), (1, 5)
+        )
+        try:
+            for value in (0.5, 1, 3, 10):
+                histogram.observe(value, 'test')
+            text = prometheus.exposition()
+        finally:
+            prometheus.registry.remove(histogram)
+        for line in (
+            'test_histogram_seconds_bucket{view="test",le="1"} 2',
+            'test_histogram_seconds_bucket{view="test",le="5"} 3',
+            'test_histogram_seconds_bucket{view="test",le="+Inf"} 4',
+            'test_histogram_seconds_sum{view="test"} 14.5',
+            'test_histogram_seconds_count{view="test"} 4',
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line, text)
+
+    def test_finished_threads_kept(self):
+        """Значения завершившихся потоков не теряются."""
+        counter = prometheus.Counter('test_threads_total', 'Тест')
+        try:
+            threads = [
+                threading.Thread(target=counter.inc) for _ in range(3)
+            ]
+            for thread in threads:
+                thread.start()
+                thread.join()
+            self.assertEqual(self.sample('test_threads_total'), 3)
+            self.assertEqual(self.sample('test_threads_total'), 3)
+        finally:
+            prometheus.registry.remove(counter)
+
+    def test_multiprocess(self):
+        """В многопроцессном режиме складываются файлы всех процессов."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with open(os.path.join(directory, 'metrics-1.json'), 'w') as file:
+            json.dump([[prometheus.COMMENTS_CREATED.name, [], 1000]], file)
+        local = self.sample(prometheus.COMMENTS_CREATED.name)
+        with override_settings(METRICS_MULTIPROCESS_DIR=directory):
+            total = prometheus.collect_all()
+        self.assertEqual(
+            total[(prometheus.COMMENTS_CREATED.name, ())], local + 1000
+        )
+        self.assertIn(f'metrics-{os.getpid()}.json', os.listdir(directory))
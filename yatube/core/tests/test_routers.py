@@ -0,0 +1,95 @@
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, override_settings,
+)
+
+from posts.models import Comment, Follow, Post, User
+
+from .. import routers
+from ..replication import copy_database
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class PrimaryReplicaRouterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = routers.PrimaryReplicaRouter()
+        self.user = User.objects.create_user(username='HasNoName')
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+
+    def routed(self):
+        """ Куда вью отправит чтение и запись поста. """
+        view = routers.use_replica(lambda request: (
+            self.router.db_for_read(Post), self.router.db_for_write(Post)
+        ))
+        return view(self.request)
+
+    def test_feed_reads_from_replica(self):
+        self.assertEqual(self.routed(), ('replica_1', 'default'))
+        # вне вью лент — основная база
+        self.assertIsNone(self.router.db_for_read(Post))
+
+    def test_anonymous_reads_from_replica(self):
+        self.request.user = AnonymousUser()
+        self.assertEqual(self.routed(), ('replica_1', 'default'))
+
+    def test_author_sticks_to_primary(self):
+        """После своей записи пользователь какое-то время читает
+        из основной базы.
+        """
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        self.assertEqual(self.routed(), (None, 'default'))
+        cache.clear()
+        Comment.objects.create(post=post, author=self.user, text='Ответ')
+        self.assertEqual(self.routed(), (None, 'default'))
+
+    def test_follower_sticks_to_primary(self):
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=self.user, author=author)
+        self.assertEqual(self.routed(), (None, 'default'))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        Post.objects.create(author=self.user, text='Тестовый пост')
+        self.assertFalse(routers.is_sticky(self.user.pk))
+        self.assertEqual(self.routed(), (None, 'default'))
+
+    def test_migrations_only_on_primary(self):
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+        self.assertFalse(self.router.allow_migrate('replica_1', 'posts'))
+
+
+class CopyDatabaseTests(SimpleTestCase):
+    def test_copy(self):
+        """Копия содержит данные основной базы и заменяет старые."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        source = os.path.join(directory.name, 'primary.sqlite3')
+        target = os.path.join(directory.name, 'replica.sqlite3')
+        with closing(sqlite3.connect(source)) as primary:
+            primary.execute('CREATE TABLE post (text TEXT)')
+            primary.execute("INSERT INTO post VALUES ('первый')")
+            primary.commit()
+            copy_database(source, target)
+            primary.execute("INSERT INTO post VALUES ('второй')")
+            primary.commit()
+        with closing(sqlite3.connect(target)) as replica:
+            self.assertEqual(
+                replica.execute('SELECT COUNT(*) FROM post').fetchone(), (1,)
+            )
+            copy_database(source, target)
+            self.assertEqual(
+                replica.execute('SELECT COUNT(*) FROM post').fetchone(), (2,)
+            )
+            (synced,), = replica.execute(
+                f'SELECT synced FROM {routers.SYNC_TABLE}'
+            )
+            self.assertAlmostEqual(synced, time.time(), delta=5)
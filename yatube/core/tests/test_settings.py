@@ -0,0 +1,39 @@
+import importlib
+import os
+import sys
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+PROD = 'yatube.settings.prod'
+
+
+class ProdSettingsTests(SimpleTestCase):
+    def load(self, **environ):
+        sys.modules.pop(PROD, None)
+        self.addCleanup(sys.modules.pop, PROD, None)
+        with mock.patch.dict(os.environ, environ, clear=True):
+            return importlib.import_module(PROD)
+
+    def test_required_environment(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.load(ALLOWED_HOSTS='yatube.example')
+
+    def test_prod_profile(self):
+        """В prod включены кэш шаблонов, общий кэш и прогрев."""
+        prod = self.load(
+            SECRET_KEY='secret', ALLOWED_HOSTS='yatube.example,localhost'
+        )
+        self.assertFalse(prod.DEBUG)
+        self.assertEqual(prod.ALLOWED_HOSTS, ['yatube.example', 'localhost'])
+        self.assertFalse(prod.TEMPLATES[0]['APP_DIRS'])
+        loader, _ = prod.TEMPLATES[0]['OPTIONS']['loaders'][0]
+        self.assertEqual(loader, 'django.template.loaders.cached.Loader')
+        self.assertEqual(
+            prod.CACHES['default']['BACKEND'], 'core.cache.SQLiteCache'
+        )
+        self.assertTrue(prod.TEMPLATE_WARMUP)
+        # профиль dev не затронут
+        base = importlib.import_module('yatube.settings.base')
+        self.assertNotIn('loaders', base.TEMPLATES[0]['OPTIONS'])
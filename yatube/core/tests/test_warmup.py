@@ -0,0 +1,21 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from ..warmup import warmup
+
+
+class WarmupTests(SimpleTestCase):
+    def test_all_templates_parsed(self):
+        """Разбираются все шаблоны проекта, включая вложенные каталоги."""
+        timings, errors = warmup()
+        self.assertEqual(errors, {})
+        for name in ('base.html', 'posts/index.html', 'includes/header.html'):
+            with self.subTest(name=name):
+                self.assertIn(name, timings)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('warmup_templates', stdout=out)
+        self.assertIn('Разобрано шаблонов', out.getvalue())
@@ -0,0 +1,143 @@
+import threading
+import time
+from functools import partial
+from unittest import mock
+
+from django.db import OperationalError
+from django.test import TransactionTestCase, override_settings
+
+from posts.models import User
+
+from .. import prometheus, writes
+
+
+def sample(metric, *labels):
+    return prometheus.collect().get((metric.name, labels), 0)
+
+
+@override_settings(WRITE_QUEUE_ASYNC=True, WRITE_RETRY_BACKOFF=0)
+class WriteQueueTests(TransactionTestCase):
+    def test_result_returned(self):
+        """Операция выполняется писателем и возвращает результат."""
+        user = writes.submit(User.objects.create, username='HasNoName')
+        self.assertTrue(User.objects.filter(pk=user.pk).exists())
+
+    def submit_together(self, *operations):
+        """ Ставит операции в очередь, пока писатель занят, чтобы они
+        попали в одну пачку; возвращает [(результат, ошибка)].
+        """
+        started = threading.Event()
+        release = threading.Event()
+
+        def busy():
+            started.set()
+            release.wait(5)
+
+        results = [None] * len(operations)
+
+        def submit(index, operation):
+            try:
+                results[index] = (writes.submit(operation), None)
+            except Exception as error:
+                results[index] = (None, error)
+
+        first = threading.Thread(target=writes.submit, args=(busy,))
+        first.start()
+        started.wait(5)
+        threads = [
+            threading.Thread(target=submit, args=(index, operation))
+            for index, operation in enumerate(operations)
+        ]
+        for thread in threads:
+            thread.start()
+        while writes._queue.qsize() < len(threads):
+            time.sleep(0.01)
+        release.set()
+        for thread in [first, *threads]:
+            thread.join(5)
+        return results
+
+    def test_group_commit(self):
+        """Операции, накопившиеся за время транзакции, пишутся одной."""
+        before = sample(prometheus.WRITE_BATCH_SIZE) or [0] * 9
+        self.submit_together(*(
+            partial(User.objects.create, username=f'user_{i}')
+            for i in range(5)
+        ))
+        after = sample(prometheus.WRITE_BATCH_SIZE)
+        # [корзины..., сумма, число пачек]: занятая пачка и общая
+        self.assertEqual(after[-1] - before[-1], 2)
+        self.assertEqual(after[-2] - before[-2], 6)
+        self.assertEqual(User.objects.count(), 5)
+
+    def test_failed_operation_isolated(self):
+        """Ошибка одной операции не отменяет остальные в пачке."""
+        failed, created = self.submit_together(
+            partial(int, 'не число'),
+            partial(User.objects.create, username='HasNoName'),
+        )
+        self.assertIsInstance(failed[1], ValueError)
+        self.assertIsNone(created[1])
+        self.assertTrue(User.objects.filter(username='HasNoName').exists())
+
+    @override_settings(WRITE_QUEUE_TIMEOUT=0.05)
+    def test_timed_out_operation_cancelled(self):
+        """Не дождавшаяся писателя операция снимается с очереди."""
+        started = threading.Event()
+        release = threading.Event()
+
+        timed_out = []
+
+        def busy():
+            started.set()
+            release.wait(5)
+
+        def submit_busy():
+            # busy тоже не укладывается в таймаут, но уже выполняется
+            try:
+                writes.submit(busy)
+            except TimeoutError:
+                timed_out.append(busy)
+
+        first = threading.Thread(target=submit_busy)
+        first.start()
+        started.wait(5)
+        cancelled = sample(prometheus.WRITE_ABANDONED, 'cancelled')
+        operation = mock.Mock()
+        with self.assertRaises(TimeoutError):
+            writes.submit(operation)
+        release.set()
+        first.join(5)
+        self.assertEqual(timed_out, [busy])
+        # следующая пачка писателя уже прошла мимо снятой операции
+        writes.submit(User.objects.create, username='HasNoName')
+        operation.assert_not_called()
+        self.assertEqual(
+            sample(prometheus.WRITE_ABANDONED, 'cancelled'), cancelled + 1
+        )
+
+    def test_side_effects_after_commit(self):
+        """Повтор транзакции не повторяет то, что ждет ее фиксации."""
+        effect = mock.Mock()
+
+        def operation():
+            User.objects.create(username=f'user_{effect.call_count}')
+            writes.after_commit(effect, 'готово')
+            if not operation.failed:
+                operation.failed = True
+                raise OperationalError('database is locked')
+
+        operation.failed = False
+        writes.with_retry(operation)
+        effect.assert_called_once_with('готово')
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_retry_on_locked_database(self):
+        """При блокировке базы транзакция повторяется."""
+        operation = mock.Mock(
+            side_effect=[OperationalError('database is locked'), 'готово']
+        )
+        retries = sample(prometheus.WRITE_RETRIES)
+        self.assertEqual(writes.with_retry(operation), 'готово')
+        self.assertEqual(operation.call_count, 2)
+        self.assertEqual(sample(prometheus.WRITE_RETRIES), retries + 1)
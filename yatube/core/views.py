@@ -1,5 +1,13 @@
+import ipaddress
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
 
+from . import instrumentation, prometheus
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -11,3 +19,36 @@ def server_error(request, *args, **argv):
 
 def permission_denied_view(request, exception):
     return render(request, 'core/403.html', {'path': request.path}, status=403)
+
+
+@staff_member_required
+def request_metrics(request):
+    """ Гистограммы метрик запросов этого процесса по вью. """
+    return JsonResponse(
+        instrumentation.registry.snapshot(),
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+def metrics_allowed(request) -> bool:
+    """ Персонал или адрес из METRICS_ALLOWED_IPS. """
+    if request.user.is_active and request.user.is_staff:
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network, strict=False)
+        for network in settings.METRICS_ALLOWED_IPS
+    )
+
+
+def metrics(request):
+    """ Метрики приложения для Prometheus. """
+    if not metrics_allowed(request):
+        raise PermissionDenied
+    return HttpResponse(
+        prometheus.exposition(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,49 @@
+""" Разбор шаблонов заранее, при старте процесса.
+
+С cached.Loader разобранный шаблон хранится в памяти процесса, и первый
+запрос к каждой странице платит за чтение и разбор ее шаблона и всех
+{% extends %}/{% include %}. warmup() разбирает все шаблоны из каталогов
+DIRS, чтобы за это не платили посетители.
+"""
+import logging
+import os
+import time
+
+from django.template import TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+
+def template_names(engine) -> list:
+    """ Имена всех шаблонов из каталогов DIRS движка. """
+    names = []
+    for directory in engine.dirs:
+        for root, _, files in os.walk(directory):
+            names.extend(
+                os.path.relpath(os.path.join(root, name), directory)
+                for name in files
+                if name.endswith(('.html', '.txt'))
+            )
+    return sorted(set(names))
+
+
+def warmup() -> tuple:
+    """ Разбирает шаблоны; возвращает время разбора каждого в мс
+    и ошибки разбора {имя: текст ошибки}.
+    """
+    timings = {}
+    errors = {}
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        for name in template_names(backend.engine):
+            started = time.perf_counter()
+            try:
+                backend.engine.get_template(name)
+            except TemplateSyntaxError as error:
+                errors[name] = str(error)
+                logger.warning('Шаблон %s не разобран: %s', name, error)
+                continue
+            timings[name] = (time.perf_counter() - started) * 1000
+    return timings, errors
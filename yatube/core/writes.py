@@ -0,0 +1,195 @@
+""" Запись в базу через единственный поток-писатель процесса.
+
+SQLite допускает одного писателя, и одновременные add_comment,
+post_create и profile_follow из разных потоков мешают друг другу.
+submit() ставит операцию в очередь и ждет ее результат; поток-писатель
+забирает из очереди все накопившиеся операции и выполняет их в одной
+транзакции (group commit), каждую — в своей точке сохранения, чтобы
+ошибка одной не отменяла остальные. Если базу держит другой процесс,
+транзакция повторяется с экспоненциальной паузой и случайным разбросом.
+Поэтому все, что не откатывается вместе с транзакцией (кэш, метрики,
+файлы), операции регистрируют через after_commit().
+
+Операция, не дождавшаяся писателя за WRITE_QUEUE_TIMEOUT секунд,
+снимается с очереди; если писатель уже взял ее в работу, она
+дописывается, но ее результат никому не нужен (WRITE_ABANDONED).
+
+При WRITE_QUEUE_ASYNC = False, внутри открытой транзакции и в самом
+потоке-писателе операция выполняется сразу, в вызывающем потоке.
+"""
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from functools import partial
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+from . import prometheus
+
+logger = logging.getLogger(__name__)
+
+_queue = queue.Queue()
+_lock = threading.Lock()
+_writer = None
+_writer_pid = None
+
+
+def is_locked(error: OperationalError) -> bool:
+    """ Ошибка из-за блокировки базы другим соединением. """
+    message = str(error)
+    return 'locked' in message or 'busy' in message
+
+
+def after_commit(function, *args, using=None) -> None:
+    """ function(*args) после фиксации транзакции базы using;
+    откат или повтор транзакции его отменяет.
+    """
+    transaction.on_commit(partial(function, *args), using=using)
+
+
+def with_retry(function):
+    """ function() в транзакции; при блокировке базы — повтор
+    с паузой WRITE_RETRY_BACKOFF * 2**попытка, до WRITE_RETRY_ATTEMPTS раз.
+    """
+    # внутри чужой транзакции повтор точки сохранения не поможет
+    attempts = (
+        1 if connection.in_atomic_block else settings.WRITE_RETRY_ATTEMPTS
+    )
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                return function()
+        except OperationalError as error:
+            if not is_locked(error) or attempt == attempts - 1:
+                raise
+            prometheus.WRITE_RETRIES.inc()
+            time.sleep(
+                settings.WRITE_RETRY_BACKOFF * 2 ** attempt
+                * random.uniform(0.5, 1.5)
+            )
+
+
+def _apply(batch) -> list:
+    """ Операции пачки по точкам сохранения: [(future, результат, ошибка)].
+    Блокировка базы прерывает всю транзакцию, чтобы ее повторить.
+    """
+    results = []
+    for operation, args, kwargs, future in batch:
+        try:
+            with transaction.atomic():
+                result = operation(*args, **kwargs)
+        except OperationalError as error:
+            if is_locked(error):
+                raise
+            results.append((future, None, error))
+        except Exception as error:
+            results.append((future, None, error))
+        else:
+            results.append((future, result, None))
+    return results
+
+
+def _commit(batch) -> None:
+    # снятые по таймауту операции не выполняются, остальные
+    # уже нельзя снять: их ждут до конца транзакции
+    batch = [
+        item for item in batch if item[-1].set_running_or_notify_cancel()
+    ]
+    if not batch:
+        return
+    started = time.perf_counter()
+    try:
+        results = with_retry(lambda: _apply(batch))
+    except Exception as error:
+        logger.exception('Пачка из %s записей не записана', len(batch))
+        results = [(future, None, error) for *_, future in batch]
+    finally:
+        prometheus.WRITE_COMMIT_SECONDS.observe(
+            time.perf_counter() - started
+        )
+        prometheus.WRITE_BATCH_SIZE.observe(len(batch))
+    # результаты отдаются только после фиксации транзакции
+    for future, result, error in results:
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+
+def _next_batch() -> list:
+    """ Первая операция и все, что успело накопиться за нее
+    и еще WRITE_QUEUE_LINGER секунд, но не больше WRITE_QUEUE_BATCH_SIZE.
+    """
+    batch = [_queue.get()]
+    deadline = time.monotonic() + settings.WRITE_QUEUE_LINGER
+    while len(batch) < settings.WRITE_QUEUE_BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        try:
+            if remaining > 0:
+                batch.append(_queue.get(timeout=remaining))
+            else:
+                batch.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _run() -> None:
+    while True:
+        batch = _next_batch()
+        try:
+            _commit(batch)
+        finally:
+            connection.close_if_unusable_or_obsolete()
+
+
+def _ensure_writer() -> None:
+    global _writer, _writer_pid
+    with _lock:
+        # после fork() поток родителя в дочернем процессе не работает
+        if (
+            _writer is None
+            or not _writer.is_alive()
+            or _writer_pid != os.getpid()
+        ):
+            _writer = threading.Thread(
+                target=_run, name='writer', daemon=True
+            )
+            _writer_pid = os.getpid()
+            _writer.start()
+
+
+def submit(operation, *args, **kwargs):
+    """ Выполняет operation(*args, **kwargs) в транзакции писателя
+    и возвращает ее результат; ошибка операции поднимается здесь.
+    """
+    if (
+        not settings.WRITE_QUEUE_ASYNC
+        or connection.in_atomic_block
+        or threading.current_thread() is _writer
+    ):
+        return with_retry(lambda: operation(*args, **kwargs))
+    _ensure_writer()
+    future = Future()
+    prometheus.WRITE_QUEUE_DEPTH.observe(_queue.qsize())
+    _queue.put((operation, args, kwargs, future))
+    try:
+        return future.result(timeout=settings.WRITE_QUEUE_TIMEOUT)
+    except TimeoutError:
+        if future.cancel():
+            prometheus.WRITE_ABANDONED.inc('cancelled')
+            raise
+        if future.done():
+            # писатель успел между таймаутом и отменой
+            return future.result()
+        prometheus.WRITE_ABANDONED.inc('running')
+        logger.warning(
+            'Запись %r выполняется после таймаута, ее результат отброшен',
+            operation,
+        )
+        raise
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 # Из модуля models импортируем модель Post
 from .models import Group, Post, Comment, Follow
 
@@ -20,6 +21,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск идет по тому же индексу, что и /search/, а не LIKE '%...%'
+        if not search_term:
+            return queryset, False
+        return search.get_backend().filter(queryset, search_term), False
+
 
 # При регистрации модели Post источником конфигурации для неё назначаем
 # класс PostAdmin
@@ -0,0 +1,277 @@
+""" JSON API лент и постов: /api/v1/.
+
+Ленты листаются тем же курсором, что и HTML (?cursor=...), а параметр
+?fields=id,text,... выбирает поля ответа и заодно колонки запроса:
+он превращается в only() и select_related() только нужных связей.
+Ключи постов и комментариев отдаются строками: ключи сегментов
+(posts.sharding) больше 2**53 и теряют точность в JavaScript.
+
+ETag лент собирается из версий feed_cache, поэтому условный запрос
+клиента, опрашивающего ленту, получает 304 без запросов постов.
+У поста, комментариев и пакета ETag — хэш ответа.
+"""
+import hashlib
+import json
+from functools import partial, wraps
+
+from django.conf import settings
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_safe
+
+from core import routers
+
+from . import feed_cache, timeline
+from .models import Comment, Group, Post, User
+from .paginators import CURSOR_PARAM, CursorPaginator, InvalidCursor
+
+FIELDS_PARAM = 'fields'
+IDS_PARAM = 'ids'
+
+# поле ответа: (колонки для only(), связь для select_related, значение)
+POST_FIELDS = {
+    'id': ((), None, lambda post: str(post.pk)),
+    'text': (('text',), None, lambda post: post.text),
+    'pub_date': (('pub_date',), None, lambda post: post.pub_date),
+    'author': (
+        ('author__username',), 'author', lambda post: post.author.username
+    ),
+    'group': (
+        ('group__slug',),
+        'group',
+        lambda post: post.group.slug if post.group_id else None,
+    ),
+    'image': (
+        ('image',), None, lambda post: post.image.url if post.image else None
+    ),
+    'thumbnails': (('thumbnails',), None, lambda post: post.get_thumbnails()),
+    'comments_count': (
+        ('comments_count',), None, lambda post: post.comments_count
+    ),
+}
+COMMENT_FIELDS = {
+    'id': ((), None, lambda comment: str(comment.pk)),
+    'post': (('post',), None, lambda comment: str(comment.post_id)),
+    'text': (('text',), None, lambda comment: comment.text),
+    'created': (('created',), None, lambda comment: comment.created),
+    'author': (
+        ('author__username',),
+        'author',
+        lambda comment: comment.author.username,
+    ),
+}
+# ключ сортировки курсора читается у каждой строки страницы
+POST_KEY = ('pub_date',)
+COMMENT_KEY = ('created',)
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _error(status: int, message: str) -> JsonResponse:
+    return JsonResponse(
+        {'error': message},
+        status=status,
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+def api_view(view):
+    """ GET и HEAD; ошибки отдаются JSON, а не HTML-страницами. """
+    @require_safe
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as error:
+            return _error(400, str(error))
+        except Http404:
+            return _error(404, 'Не найдено')
+    return wrapper
+
+
+def selected_fields(request: HttpRequest, spec: dict) -> list:
+    """ Поля ?fields= в порядке запроса; без параметра — все. """
+    raw = request.GET.get(FIELDS_PARAM)
+    if not raw:
+        return list(spec)
+    names = list(dict.fromkeys(
+        name.strip() for name in raw.split(',') if name.strip()
+    ))
+    unknown = [name for name in names if name not in spec]
+    if unknown or not names:
+        raise BadRequest(
+            f'Неизвестные поля: {", ".join(unknown)}; '
+            f'доступны: {", ".join(spec)}'
+        )
+    return names
+
+
+def restrict(queryset, spec: dict, names: list, key=()):
+    """ Запрос только колонок и связей полей names. """
+    columns = list(key)
+    related = []
+    for name in names:
+        fields, relation, _ = spec[name]
+        columns.extend(fields)
+        if relation:
+            related.append(relation)
+    queryset = queryset.select_related(None)
+    if related:
+        queryset = queryset.select_related(*related)
+    # only() без колонок загрузил бы все; первичный ключ грузится всегда
+    return queryset.only(*columns or ('pk',))
+
+
+def serialize(obj, spec: dict, names: list) -> dict:
+    return {name: spec[name][2](obj) for name in names}
+
+
+def _conditional(request: HttpRequest, response, etag) -> HttpResponse:
+    """ response с ETag или 304, если etag совпал с If-None-Match. """
+    response['ETag'] = etag
+    patch_vary_headers(response, ('Cookie',))
+    return get_conditional_response(request, etag=etag, response=response)
+
+
+def _respond(request: HttpRequest, data, etag=None) -> HttpResponse:
+    """ JSON-ответ; без etag ETag — хэш содержимого. """
+    response = JsonResponse(data, json_dumps_params={'ensure_ascii': False})
+    if etag is None:
+        etag = quote_etag(hashlib.sha1(response.content).hexdigest())
+    return _conditional(request, response, etag)
+
+
+def _feed_etag(request: HttpRequest, versions) -> str:
+    """ ETag ленты по версиям feed_cache или None, если реплика отстает
+    от лент: ответ с нее не должен получить ETag новой версии.
+    """
+    if routers.lagging(feed_cache.modified(versions)):
+        return None
+    raw = json.dumps([request.get_full_path(), versions])
+    return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+
+def _page(
+    request: HttpRequest, queryset, spec: dict, key,
+    paginator_class=CursorPaginator,
+) -> dict:
+    """ Страница по курсору: {'results': [...], 'next': ..., ...}. """
+    names = selected_fields(request, spec)
+    paginator = paginator_class(
+        restrict(queryset, spec, names, key), settings.API_PER_PAGE
+    )
+    try:
+        page = paginator.page(request.GET.get(CURSOR_PARAM))
+    except InvalidCursor as error:
+        raise BadRequest(str(error))
+    return {
+        'results': [serialize(obj, spec, names) for obj in page],
+        'next': paginator.next_cursor,
+        'previous': paginator.previous_cursor,
+    }
+
+
+def feed(
+    request: HttpRequest, posts, *scopes, paginator_class=CursorPaginator
+) -> HttpResponse:
+    """ Ответ ленты scopes; если версии не менялись, посты не читаются. """
+    etag = _feed_etag(request, feed_cache.versions(*scopes))
+    if etag is not None:
+        # для 304 нужны только заголовки, тело не строится
+        response = _conditional(request, HttpResponse(), etag)
+        if response.status_code == 304:
+            return response
+    data = _page(request, posts, POST_FIELDS, POST_KEY, paginator_class)
+    return _respond(request, data, etag)
+
+
+@api_view
+@routers.use_replica
+def index(request: HttpRequest) -> HttpResponse:
+    return feed(request, Post.objects.all(), 'index')
+
+
+@api_view
+@routers.use_replica
+def group_posts(request: HttpRequest, slug: str) -> HttpResponse:
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    # не через group.groups_posts: связанный менеджер дочитывал бы
+    # отложенный only() group_id у каждой строки
+    posts = Post.objects.filter(group=group)
+    return feed(request, posts, f'group:{group.pk}')
+
+
+@api_view
+@routers.use_replica
+def profile(request: HttpRequest, username: str) -> HttpResponse:
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    posts = Post.objects.filter(author=author)
+    return feed(request, posts, f'author:{author.pk}')
+
+
+@api_view
+@routers.use_replica
+def follow_index(request: HttpRequest) -> HttpResponse:
+    if not request.user.is_authenticated:
+        return _error(401, 'Нужна авторизация')
+    return feed(
+        request,
+        timeline.follow_feed(request.user),
+        'index',
+        f'follow:{request.user.pk}',
+        paginator_class=partial(timeline.get_paginator, request.user),
+    )
+
+
+@api_view
+def post_detail(request: HttpRequest, post_id: int) -> HttpResponse:
+    names = selected_fields(request, POST_FIELDS)
+    post = get_object_or_404(
+        restrict(Post.objects.for_pk(post_id), POST_FIELDS, names),
+        pk=post_id,
+    )
+    return _respond(request, serialize(post, POST_FIELDS, names))
+
+
+@api_view
+def comments(request: HttpRequest, post_id: int) -> HttpResponse:
+    post = get_object_or_404(
+        Post.objects.for_pk(post_id).only('pk'), pk=post_id
+    )
+    queryset = Comment.objects.near(post).filter(post=post).order_by(
+        'created', 'pk'
+    )
+    return _respond(
+        request, _page(request, queryset, COMMENT_FIELDS, COMMENT_KEY)
+    )
+
+
+@api_view
+def batch(request: HttpRequest) -> HttpResponse:
+    """ Посты по списку ключей ?ids=1,2,3 за один запрос клиента.
+
+    Результаты идут в порядке ids; ненайденные ключи — в missing.
+    """
+    try:
+        ids = list(dict.fromkeys(
+            int(pk) for pk in request.GET.get(IDS_PARAM, '').split(',') if pk
+        ))
+    except ValueError:
+        raise BadRequest('ids — список целых чисел через запятую')
+    if not ids:
+        raise BadRequest('Не передан ids')
+    if len(ids) > settings.API_BATCH_LIMIT:
+        raise BadRequest(f'Не больше {settings.API_BATCH_LIMIT} ключей')
+    names = selected_fields(request, POST_FIELDS)
+    found = restrict(Post.objects.all(), POST_FIELDS, names).in_bulk(ids)
+    return _respond(request, {
+        'results': [
+            serialize(found[pk], POST_FIELDS, names)
+            for pk in ids if pk in found
+        ],
+        'missing': [str(pk) for pk in ids if pk not in found],
+    })
@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import sharding, signals, timeline  # noqa: F401
+
+        connection_created.connect(sharding.configure_connection)
+        # несовместимые настройки fan-out и сегментов — ошибка при старте
+        timeline.is_enabled()
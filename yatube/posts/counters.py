@@ -0,0 +1,124 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from . import sharding
+from .models import Comment, Follow, Post, User, UserStats
+
+# счетчик UserStats -> (модель, поле со ссылкой на пользователя)
+USER_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'comments_count': (Comment, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def _count(model, field):
+    # Коррелированный подзапрос, чтобы соседние JOIN не умножали строки
+    rows = (
+        model.objects
+        .filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+def _sharded_counts(user_ids, names) -> dict:
+    """ {user_id: {счетчик: число}} для счетчиков names по моделям
+    в сегментах: подзапрос _count видел бы только строки default,
+    поэтому каждый сегмент считает свои строки, а суммы складываются.
+    """
+    totals = {}
+    for name in names:
+        model, field = USER_COUNTERS[name]
+        rows = (
+            model.objects
+            .filter(**{f'{field}__in': user_ids})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+        )
+        for row in rows:
+            counts = totals.setdefault(row[field], dict.fromkeys(names, 0))
+            counts[name] += row['total']
+    return totals
+
+
+def _user_stats(rows, sharded_names) -> list:
+    """ UserStats по строкам recount_users с досчитанными
+    по сегментам счетчиками sharded_names.
+    """
+    totals = {}
+    if sharded_names and rows:
+        totals = _sharded_counts([row['pk'] for row in rows], sharded_names)
+    stats = []
+    for row in rows:
+        user_id = row.pop('pk')
+        row.update(totals.get(user_id, dict.fromkeys(sharded_names, 0)))
+        stats.append(UserStats(user_id=user_id, **row))
+    return stats
+
+
+def change_user(user_id, **deltas) -> None:
+    """ Сдвигает счетчики пользователя: change_user(1, posts_count=1).
+
+    Вызывается в транзакции записи, которую учитывает
+    (models.CountedModel), и не открывает своей.
+    """
+    with transaction.atomic(savepoint=False):
+        updated = UserStats.objects.filter(user_id=user_id).update(
+            **{
+                name: Greatest(F(name) + delta, 0)
+                for name, delta in deltas.items()
+            }
+        )
+        if not updated and all(delta > 0 for delta in deltas.values()):
+            # строки еще нет: считаем с нуля, новая запись уже учтена.
+            # При удалении строку не создаем: пользователь может
+            # удаляться сам, а пересчет потом сделает recount.
+            recount_users(User.objects.filter(pk=user_id))
+
+
+def change_post(post_id, delta) -> None:
+    Post.objects.for_pk(post_id).filter(pk=post_id).update(
+        comments_count=Greatest(F('comments_count') + delta, 0)
+    )
+
+
+def recount_users(users=None, batch_size=1000) -> int:
+    """ Пересчитывает UserStats; возвращает число пользователей. """
+    users = User.objects.all() if users is None else users
+    sharded_names = [
+        name for name, (model, _) in USER_COUNTERS.items()
+        if sharding.enabled() and sharding.is_sharded(model)
+    ]
+    local = {
+        name: _count(model, field)
+        for name, (model, field) in USER_COUNTERS.items()
+        if name not in sharded_names
+    }
+    annotated = users.annotate(**local).values('pk', *local)
+    total = 0
+    with transaction.atomic():
+        UserStats.objects.filter(user__in=users).delete()
+        batch = []
+        for row in annotated.iterator():
+            batch.append(row)
+            if len(batch) >= batch_size:
+                UserStats.objects.bulk_create(
+                    _user_stats(batch, sharded_names)
+                )
+                total += len(batch)
+                batch = []
+        UserStats.objects.bulk_create(_user_stats(batch, sharded_names))
+        total += len(batch)
+    return total
+
+
+def recount_posts() -> int:
+    """ Пересчитывает Post.comments_count одним UPDATE. """
+    return Post.objects.update(comments_count=_count(Comment, 'post'))
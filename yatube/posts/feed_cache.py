@@ -0,0 +1,157 @@
+import math
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpRequest
+
+from core import routers, writes
+
+from .paginators import CURSOR_PARAM, PAGE_PARAM
+
+VERSION_KEY = 'feed-version:{}'
+FRAGMENT_KEY = 'feed-fragment:{}'
+LEASE_KEY = 'feed-lease:{}'
+
+
+def _new_version(modified=0) -> str:
+    return f'{uuid.uuid4().hex}-{modified}'
+
+
+def versions(*scopes) -> list:
+    """ Текущие версии лент; отсутствующие версии создаются. """
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    result = []
+    for key in keys:
+        if key not in found:
+            # время изменения такой ленты неизвестно
+            cache.add(key, _new_version(), None)
+            found[key] = cache.get(key)
+        result.append(found[key])
+    return result
+
+
+def modified(versions) -> int:
+    """ Время последнего изменения лент по их версиям или None,
+    если версия какой-то ленты создана без изменения (холодный кэш).
+    """
+    times = [int(version.rsplit('-', 1)[-1]) for version in versions]
+    if not times or not all(times):
+        return None
+    return max(times)
+
+
+def bump(*scopes) -> None:
+    """ Инвалидирует все закэшированные страницы перечисленных лент.
+
+    Версия — случайный токен, а не счетчик: после вытеснения ключа
+    из кэша новая версия не совпадет ни с одной из старых.
+    """
+    now = int(time.time())
+    cache.set_many(
+        {VERSION_KEY.format(scope): _new_version(now) for scope in scopes},
+        None,
+    )
+
+
+def invalidate(*scopes, using=None) -> None:
+    """ bump() для записи в базу using: сразу и, если транзакция
+    открыта, еще раз после ее фиксации.
+
+    Сразу — чтобы в этой же транзакции не отдавались страницы,
+    закэшированные до записи. После фиксации — потому что другой процесс
+    мог до нее отрисовать ленту по старым данным с уже новой версией.
+    """
+    bump(*scopes)
+    if transaction.get_connection(using).in_atomic_block:
+        writes.after_commit(bump, *scopes, using=using)
+
+
+def post_scopes(post) -> list:
+    """ Ленты, в которых показывается пост. """
+    scopes = ['index', f'author:{post.author_id}']
+    if post.group_id:
+        scopes.append(f'group:{post.group_id}')
+    return scopes
+
+
+def fragment(request: HttpRequest, *scopes) -> dict:
+    """ Параметры тега {% feedcache %} для списка постов ленты.
+
+    Ключ зависит от вью, лент scopes и курсора (номера) страницы,
+    поэтому разные страницы не подменяют друг друга. Версии лент
+    хранятся в самой записи: сигналы моделей делают ее устаревшей
+    сразу, не дожидаясь таймаута. Ленты и версии запоминаются
+    в запросе для кэша страниц (page_cache). Страница с реплики,
+    отстающей от лент, не кэшируется ни фрагментом, ни целиком.
+    """
+    page = request.GET.get(CURSOR_PARAM) or ''
+    if PAGE_PARAM in request.GET:
+        page = f'{PAGE_PARAM}={request.GET[PAGE_PARAM]}'
+    request.feed_scopes = list(scopes)
+    request.feed_versions = versions(*scopes)
+    lagging = routers.lagging(modified(request.feed_versions))
+    request.feed_stale = lagging
+    return {
+        'key': ':'.join([request.resolver_match.view_name, *scopes, page]),
+        'versions': request.feed_versions,
+        'timeout': settings.FEED_CACHE_TIMEOUT,
+        'lagging': lagging,
+    }
+
+
+def _fresh(entry, versions) -> bool:
+    """ Вероятностное досрочное истечение (XFetch): чем ближе срок
+    и чем дольше рендеринг, тем вероятнее запись сочтут устаревшей
+    раньше срока, и пересчеты разных ключей не совпадут во времени.
+    """
+    if entry['versions'] != versions:
+        return False
+    early = (
+        entry['delta'] * settings.FEED_CACHE_EARLY_BETA
+        * -math.log(1 - random.random())
+    )
+    return time.time() + early < entry['expires']
+
+
+def get_or_render(request: HttpRequest, fragment: dict, render) -> str:
+    """ Фрагмент ленты из кэша; устаревший пересчитывается render().
+
+    Пересчитывает один процесс — тот, что взял аренду (ключ LEASE_KEY
+    с таймаутом FEED_CACHE_LEASE); остальные тем временем отдают
+    устаревший фрагмент. Без записи в кэше рендерят все.
+    """
+    key = FRAGMENT_KEY.format(fragment['key'])
+    entry = cache.get(key)
+    if entry is not None and _fresh(entry, fragment['versions']):
+        return entry['html']
+    if fragment.get('lagging'):
+        return render()
+    lease = LEASE_KEY.format(fragment['key'])
+    leased = cache.add(lease, True, settings.FEED_CACHE_LEASE)
+    if entry is not None and not leased:
+        # кэш страниц не должен сохранить устаревший фрагмент
+        request.feed_stale = True
+        return entry['html']
+    try:
+        started = time.monotonic()
+        html = render()
+        cache.set(
+            key,
+            {
+                'html': html,
+                'versions': fragment['versions'],
+                'delta': time.monotonic() - started,
+                'expires': time.time() + fragment['timeout'],
+            },
+            # устаревшая запись живет дольше, чтобы ее было что отдать
+            fragment['timeout'] + settings.FEED_CACHE_STALE_TIMEOUT,
+        )
+    finally:
+        if leased:
+            cache.delete(lease)
+    return html
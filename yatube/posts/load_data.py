@@ -0,0 +1,176 @@
+""" Синтетические данные для нагрузочного тестирования.
+
+Активность распределена по степенному закону (закон Ципфа): немногие
+авторы пишут большую часть постов и собирают большую часть подписчиков,
+как в настоящих соцсетях. Генерация детерминирована зерном seed,
+строки пишутся пачками через bulk_create с явными первичными ключами.
+"""
+import itertools
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import transfer
+from .models import Comment, Follow, Group, Post, User
+
+WORDS = (
+    'война мир жизнь человек время дело день рука глаз слово место лицо '
+    'друг дом вопрос сторона голова сила отец мысль земля душа любовь '
+    'город правда работа ночь дорога утро письмо книга сердце история '
+    'старый новый большой русский молодой последний хороший главный '
+    'думать говорить знать видеть писать читать жить любить понимать '
+    'идти стоять сидеть ждать помнить чувствовать хотеть начинать '
+    'сегодня вчера всегда никогда долго тихо очень снова вдруг опять'
+).split()
+
+DEFAULT_PASSWORD = 'load-test-password'
+
+
+def zipf_weights(count: int, exponent: float, rng: random.Random) -> list:
+    """ Накопленные веса Ципфа для count объектов в случайном порядке:
+    популярность не связана с порядком первичных ключей.
+    """
+    ranks = list(range(1, count + 1))
+    rng.shuffle(ranks)
+    return list(itertools.accumulate(1 / rank ** exponent for rank in ranks))
+
+
+def sentence(rng: random.Random, low=5, high=40) -> str:
+    words = rng.choices(WORDS, k=rng.randint(low, high))
+    return ' '.join(words).capitalize() + '.'
+
+
+def _new_ids(model, count) -> range:
+    """ Первичные ключи после уже существующих строк. """
+    first = (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+    return range(first, first + count)
+
+
+def _insert(model, objects, batch_size) -> int:
+    """ Пишет объекты пачками, каждую в своей транзакции. """
+    total = 0
+    objects = iter(objects)
+    while True:
+        batch = list(itertools.islice(objects, batch_size))
+        if not batch:
+            return total
+        with transaction.atomic():
+            model.objects.bulk_create(batch)
+        total += len(batch)
+
+
+def make_users(user_ids, password, joined):
+    # хэш пароля один на всех: make_password на каждого — это секунды
+    password_hash = make_password(password)
+    for pk in user_ids:
+        yield User(
+            pk=pk,
+            username=f'load{pk}',
+            password=password_hash,
+            date_joined=joined,
+        )
+
+
+def make_groups(group_ids, rng):
+    for pk in group_ids:
+        yield Group(
+            pk=pk,
+            title=f'Группа {pk}',
+            slug=f'load-group-{pk}',
+            description=sentence(rng),
+        )
+
+
+def make_posts(post_ids, date_of, user_ids, group_ids, exponent, rng):
+    author_weights = zipf_weights(len(user_ids), exponent, rng)
+    group_weights = zipf_weights(len(group_ids), exponent, rng)
+    for number, pk in enumerate(post_ids):
+        group_id = None
+        # примерно треть постов без группы
+        if group_ids and rng.random() > 0.3:
+            group_id = rng.choices(group_ids, cum_weights=group_weights)[0]
+        yield Post(
+            pk=pk,
+            author_id=rng.choices(user_ids, cum_weights=author_weights)[0],
+            group_id=group_id,
+            text=sentence(rng),
+            pub_date=date_of(number),
+        )
+
+
+def make_comments(count, post_ids, date_of, user_ids, exponent, rng):
+    if not post_ids:
+        return
+    # обсуждают тоже немногие популярные посты
+    post_weights = zipf_weights(len(post_ids), exponent, rng)
+    for _ in range(count):
+        number = rng.choices(
+            range(len(post_ids)), cum_weights=post_weights
+        )[0]
+        yield Comment(
+            post_id=post_ids[number],
+            author_id=rng.choice(user_ids),
+            text=sentence(rng, high=20),
+            created=date_of(number),
+        )
+
+
+def make_follows(user_ids, follows, exponent, rng):
+    # на популярных авторов подписываются чаще, как в настоящем графе
+    author_weights = zipf_weights(len(user_ids), exponent, rng)
+    for user_id in user_ids:
+        count = min(len(user_ids) - 1, int(rng.expovariate(1 / follows)))
+        authors = set(
+            rng.choices(user_ids, cum_weights=author_weights, k=count)
+        )
+        authors.discard(user_id)
+        for author_id in sorted(authors):
+            yield Follow(user_id=user_id, author_id=author_id)
+
+
+def generate(users=1000, groups=20, posts=100000, comments=100000,
+             follows=20, exponent=1.1, days=365, seed=0, batch_size=5000,
+             password=DEFAULT_PASSWORD, progress=None) -> dict:
+    """ Создает пользователей, группы, посты, комментарии и подписки.
+
+    follows — среднее число подписок пользователя. progress(модель,
+    строк, секунд) вызывается после каждой модели. Возвращает число
+    строк по моделям.
+    """
+    rng = random.Random(seed)
+    start_date = timezone.now() - timedelta(days=days)
+    user_ids = _new_ids(User, users)
+    group_ids = _new_ids(Group, groups)
+    post_ids = _new_ids(Post, posts)
+    # даты растут вместе с pk, как при обычной публикации
+    step = timedelta(days=days) / max(posts, 1)
+
+    def date_of(number):
+        return start_date + step * number
+
+    steps = (
+        (User, make_users(user_ids, password, start_date)),
+        (Group, make_groups(group_ids, rng)),
+        (Post, make_posts(
+            post_ids, date_of, user_ids, group_ids, exponent, rng
+        )),
+        (Comment, make_comments(
+            comments, post_ids, date_of, user_ids, exponent, rng
+        )),
+        (Follow, make_follows(user_ids, follows, exponent, rng)),
+    )
+    created = {}
+    with transfer.muted_signals(), transfer.kept_dates():
+        for model, objects in steps:
+            started = time.monotonic()
+            count = _insert(model, objects, batch_size)
+            created[model._meta.label_lower] = count
+            if progress is not None:
+                progress(model, count, time.monotonic() - started)
+    transfer.reset_sequences()
+    return created
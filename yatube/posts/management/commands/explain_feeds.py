@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts import timeline
+from posts.models import Comment, Follow, Post, User
+from posts.paginators import CursorPaginator, NEXT
+
+# шаг плана, которым SQLite сортирует строки, не найдя индекса с порядком
+SORT = 'USE TEMP B-TREE FOR'
+
+
+class Command(BaseCommand):
+    help = (
+        'Выводит EXPLAIN QUERY PLAN запросов всех лент и проверяет, '
+        'что они используют составные индексы'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Ошибка, если ожидаемый индекс не используется',
+        )
+
+    def get_queries(self):
+        """ (вью, запрос, ожидаемый индекс или None) """
+        user = User(pk=0)
+        anchor = Post(pk=0, pub_date=timezone.now())
+
+        def pages(queryset):
+            paginator = CursorPaginator(
+                queryset, settings.PER_PAGE_PAGINATOR
+            )
+            cursor = paginator.encode_cursor(NEXT, anchor)
+            return (
+                paginator.page_queryset(None),
+                paginator.page_queryset(cursor),
+            )
+
+        for queryset in pages(Post.objects.feed()):
+            yield 'index', queryset, 'post_pub_date_id_idx'
+        for queryset in pages(Post.objects.feed().filter(group_id=0)):
+            yield 'group_posts', queryset, 'post_group_pub_date_idx'
+        for queryset in pages(Post.objects.feed().filter(author_id=0)):
+            yield 'profile', queryset, 'post_author_pub_date_idx'
+        yield (
+            'profile',
+            Follow.objects.filter(author_id=0).values('user'),
+            'follow_author_user_idx',
+        )
+        # без fan-out лента сортирует посты всех подписок — поэтому
+        # fan-out и листает ее по индексу записей
+        for queryset in pages(timeline.follow_feed(user)):
+            yield 'follow_index', queryset, None
+        paginator = timeline.TimelinePaginator(
+            Post.objects.feed(), settings.PER_PAGE_PAGINATOR, user
+        )
+        for values in (None, paginator._key(anchor)):
+            yield (
+                'follow_index',
+                paginator.entries_queryset(NEXT, values),
+                'timeline_user_pub_date_idx',
+            )
+            yield (
+                'follow_index',
+                paginator.author_queryset(0, NEXT, values),
+                'post_author_pub_date_idx',
+            )
+        yield (
+            'post_detail',
+            Comment.objects.filter(post_id=0).order_by('created'),
+            'comment_post_created_idx',
+        )
+
+    def handle(self, *args, **options):
+        missing = []
+        for view, queryset, index in self.get_queries():
+            plan = queryset.explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(view))
+            self.stdout.write(plan)
+            if index is None:
+                continue
+            if index in plan and SORT not in plan:
+                self.stdout.write(self.style.SUCCESS(f'использует {index}'))
+            elif index in plan:
+                # индекс выбирает строки, но порядок дает сортировка
+                self.stdout.write(self.style.ERROR(f'сортирует, {index}'))
+                missing.append(f'{view}: {index} без сортировки')
+            else:
+                self.stdout.write(self.style.ERROR(f'не использует {index}'))
+                missing.append(f'{view}: {index}')
+        if missing and options['check']:
+            raise CommandError(
+                'Индексы не используются: ' + ', '.join(missing)
+            )
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает пользователей, группы, посты, комментарии и подписки '
+        'в JSON Lines'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='-',
+            help='Файл выгрузки (.gz — со сжатием), по умолчанию stdout',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = 0
+        # stdout может быть занят самой выгрузкой, отчет пишем в stderr
+        with transfer.open_stream(options['path'], 'w') as stream:
+            for model, count in transfer.export_rows(
+                stream, options['batch_size']
+            ):
+                total += count
+                self.stderr.write(f'{model._meta.label_lower}: {count}')
+        seconds = time.monotonic() - started
+        self.stderr.write(
+            self.style.SUCCESS(
+                f'Выгружено {total} строк за {seconds:.1f} с '
+                f'({total / max(seconds, 1e-6):.0f} строк/с)'
+            )
+        )
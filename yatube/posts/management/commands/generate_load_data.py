@@ -0,0 +1,83 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import load_data, transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует пользователей, группы, посты, комментарии и подписки '
+        'для нагрузочного тестирования'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument(
+            '--follows',
+            type=int,
+            default=20,
+            help='Среднее число подписок на пользователя',
+        )
+        parser.add_argument(
+            '--exponent',
+            type=float,
+            default=1.1,
+            help='Показатель степенного распределения активности авторов',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='За сколько последних дней распределить посты',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--password',
+            default=load_data.DEFAULT_PASSWORD,
+            help='Пароль всех созданных пользователей',
+        )
+        parser.add_argument(
+            '--no-refresh',
+            action='store_true',
+            help='Не пересчитывать счетчики, индекс и ленты',
+        )
+
+    def progress(self, model, count, seconds):
+        self.stdout.write(
+            f'{model._meta.label_lower}: {count} за {seconds:.1f} с '
+            f'({count / max(seconds, 1e-6):.0f} строк/с)'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        created = load_data.generate(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            exponent=options['exponent'],
+            days=options['days'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            password=options['password'],
+            progress=self.progress,
+        )
+        if not options['no_refresh']:
+            refresh_started = time.monotonic()
+            transfer.refresh_derived()
+            self.stdout.write(
+                f'Производные данные пересчитаны за '
+                f'{time.monotonic() - refresh_started:.1f} с'
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Создано {sum(created.values())} строк за '
+                f'{time.monotonic() - started:.1f} с'
+            )
+        )
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Генерирует миниатюры для постов, у которых их еще нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Перегенерировать миниатюры всех постов',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(thumbnails='')
+        total = 0
+        for post_id in posts.values_list('pk', flat=True).iterator():
+            thumbnails.generate(post_id)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f'Обработано постов: {total}'))
@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает выгрузку export_yatube пачками через bulk_create '
+        'с отключенными сигналами'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл JSON Lines (.gz — со сжатием), - — stdin'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--transaction-size',
+            type=int,
+            default=10000,
+            help='Сколько строк фиксировать одной транзакцией',
+        )
+        parser.add_argument(
+            '--ignore-conflicts',
+            action='store_true',
+            help='Пропускать строки с уже существующими ключами',
+        )
+        parser.add_argument(
+            '--no-refresh',
+            action='store_true',
+            help='Не пересчитывать счетчики, индекс и ленты после загрузки',
+        )
+
+    def progress(self, total, seconds):
+        if self.verbosity > 1:
+            self.stdout.write(
+                f'{total} строк, {total / max(seconds, 1e-6):.0f} строк/с'
+            )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        started = time.monotonic()
+        with transfer.open_stream(options['path'], 'r') as stream:
+            loaded = transfer.import_rows(
+                stream,
+                batch_size=options['batch_size'],
+                transaction_size=options['transaction_size'],
+                ignore_conflicts=options['ignore_conflicts'],
+                progress=self.progress,
+            )
+        seconds = time.monotonic() - started
+        total = sum(loaded.values())
+        for label, count in loaded.items():
+            self.stdout.write(f'{label}: {count}')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Загружено {total} строк за {seconds:.1f} с '
+                f'({total / max(seconds, 1e-6):.0f} строк/с)'
+            )
+        )
+        if not options['no_refresh']:
+            transfer.refresh_derived()
+            self.stdout.write(
+                f'Производные данные пересчитаны за '
+                f'{time.monotonic() - started - seconds:.1f} с'
+            )
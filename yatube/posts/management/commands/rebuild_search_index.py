@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Строит поисковый индекс постов заново'
+
+    def handle(self, *args, **options):
+        total = search.get_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано: {total}'))
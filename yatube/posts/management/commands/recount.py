@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики постов, комментариев и подписок'
+
+    def handle(self, *args, **options):
+        users = counters.recount_users()
+        posts = counters.recount_posts()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Пересчитано: пользователей {users}, постов {posts}'
+            )
+        )
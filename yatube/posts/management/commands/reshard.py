@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from posts import sharding
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит посты и комментарии в сегменты, назначенные им '
+        'DATABASE_SHARDS: после добавления или удаления сегмента и при '
+        'переходе с одной базы на сегменты. Схему новых сегментов '
+        'создает migrate --database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='sources',
+            action='append',
+            default=[],
+            metavar='ALIAS',
+            help='Выводимый из DATABASE_SHARDS сегмент, его строки переедут',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать, что переедет',
+        )
+
+    def handle(self, *args, **options):
+        moved = sharding.reshard(
+            options['sources'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        for (source, target), (posts, comments) in sorted(moved.items()):
+            self.stdout.write(
+                f'{source} -> {target}: постов {posts}, '
+                f'комментариев {comments}'
+            )
+        total = sum(posts for posts, _ in moved.values())
+        verb = 'Переедет' if options['dry_run'] else 'Перенесено'
+        self.stdout.write(self.style.SUCCESS(f'{verb} постов: {total}'))
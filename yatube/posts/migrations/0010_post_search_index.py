@@ -0,0 +1,40 @@
+from django.db import migrations
+
+CREATE_INDEX = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts USING fts5(
+    text, group_title, group_id UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+'''
+
+FILL_INDEX = '''
+INSERT INTO posts_post_fts(rowid, text, group_title, group_id)
+SELECT p.id, p.text, COALESCE(g.title, ''), p.group_id
+FROM posts_post p LEFT JOIN posts_group g ON g.id = p.group_id
+'''
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 есть только в SQLite; на других базах работает
+    # posts.search.backends.SimpleSearchBackend
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_INDEX)
+    schema_editor.execute(FILL_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS posts_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_post_thumbnails'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,172 @@
+import re
+from itertools import chain
+
+from django.db import migrations
+
+# Стеммер posts.search.russian на момент миграции: код приложения
+# может измениться, а миграция должна строить тот же индекс.
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|'
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+DERIVATIONAL = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+DERIVATIONAL_ENDING = re.compile(r'ость?$')
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+CYRILLIC = re.compile(r'^[а-я]+$')
+
+BATCH_SIZE = 1000
+
+CREATE_STEMS = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_search_stem USING fts5(
+    body, group_title, post_id UNINDEXED, group_id UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+'''
+
+CREATE_TERMS = '''
+CREATE TABLE IF NOT EXISTS posts_search_term (term TEXT PRIMARY KEY)
+'''
+
+CREATE_TRIGRAMS = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_search_trigram USING fts5(
+    term, tokenize = 'trigram'
+)
+'''
+
+INSERT_ROW = '''
+INSERT INTO posts_search_stem(rowid, body, group_title, post_id, group_id)
+VALUES (%s, %s, %s, %s, %s)
+'''
+
+
+def _strip(pattern, word):
+    return pattern.sub('', word, 1)
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC.match(word):
+        return word
+    match = RV.match(word)
+    if match is None:
+        return word
+    prefix, rv = match.groups()
+    stripped = _strip(PERFECTIVE_GERUND, rv)
+    if stripped == rv:
+        rv = _strip(REFLEXIVE, rv)
+        stripped = _strip(ADJECTIVE, rv)
+        if stripped != rv:
+            rv = _strip(PARTICIPLE, stripped)
+        else:
+            stripped = _strip(VERB, rv)
+            rv = _strip(NOUN, rv) if stripped == rv else stripped
+    else:
+        rv = stripped
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    if DERIVATIONAL.match(rv):
+        rv = _strip(DERIVATIONAL_ENDING, rv)
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = _strip(SUPERLATIVE, rv)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def stems(text):
+    return [stem(token) for token in re.findall(r'\w+', text.lower())]
+
+
+def post_rows(Post):
+    for post in Post.objects.select_related('group').iterator(BATCH_SIZE):
+        body = stems(post.text)
+        title = stems(post.group.title) if post.group_id else []
+        yield (
+            2 * post.pk, ' '.join(body), ' '.join(title),
+            post.pk, post.group_id,
+        ), body + title
+
+
+def comment_rows(Comment):
+    for comment in Comment.objects.iterator(BATCH_SIZE):
+        body = stems(comment.text)
+        yield (
+            2 * comment.pk + 1, ' '.join(body), '', comment.post_id, None
+        ), body
+
+
+def insert(cursor, rows, terms, fuzzy):
+    cursor.executemany(INSERT_ROW, rows)
+    if fuzzy:
+        cursor.executemany(
+            'INSERT OR IGNORE INTO posts_search_term(term) VALUES (%s)',
+            [(term,) for term in terms],
+        )
+
+
+def create_search_index(apps, schema_editor):
+    # на других базах работает posts.search.backends.SimpleSearchBackend
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    schema_editor.execute(CREATE_STEMS)
+    # токенизатор trigram появился в SQLite 3.34,
+    # без него поиск не исправляет опечатки
+    fuzzy = connection.Database.sqlite_version_info >= (3, 34)
+    if fuzzy:
+        schema_editor.execute(CREATE_TERMS)
+        schema_editor.execute(CREATE_TRIGRAMS)
+    # строки индекса пишутся пачками: в памяти не больше BATCH_SIZE
+    rows, terms = [], set()
+    with connection.cursor() as cursor:
+        for row, row_terms in chain(post_rows(Post), comment_rows(Comment)):
+            rows.append(row)
+            terms.update(row_terms)
+            if len(rows) >= BATCH_SIZE:
+                insert(cursor, rows, terms, fuzzy)
+                rows, terms = [], set()
+        insert(cursor, rows, terms, fuzzy)
+        if fuzzy:
+            cursor.execute(
+                "INSERT INTO posts_search_trigram(term) "
+                "SELECT ' ' || term || ' ' FROM posts_search_term"
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in (
+        'posts_search_stem', 'posts_search_term', 'posts_search_trigram'
+    ):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_post_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
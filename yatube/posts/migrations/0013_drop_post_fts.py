@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# индекс SQLiteFTS5Backend из 0010: его заменил posts_search_stem (0011)
+CREATE_INDEX = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts USING fts5(
+    text, group_title, group_id UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+'''
+
+FILL_INDEX = '''
+INSERT INTO posts_post_fts(rowid, text, group_title, group_id)
+SELECT p.id, p.text, COALESCE(g.title, ''), p.group_id
+FROM posts_post p LEFT JOIN posts_group g ON g.id = p.group_id
+'''
+
+
+def drop_post_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS posts_post_fts')
+
+
+def create_post_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_INDEX)
+    schema_editor.execute(FILL_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_timeline_pub_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_post_fts, create_post_fts),
+    ]
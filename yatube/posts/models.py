@@ -1,7 +1,10 @@
+import json
 import textwrap as tw
 
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, router, transaction
+
+from .sharding import ShardedModel, ShardedQuerySet
 
 User = get_user_model()
 
@@ -19,7 +22,57 @@ class Group(models.Model):
         return self.title
 
 
-class Post(models.Model):
+class CountedModel(models.Model):
+    """ Модель, по строкам которой сигналы (posts.signals) ведут
+    счетчики UserStats и Post.comments_count.
+
+    Строка и счетчики пишутся в одной транзакции: post_save Django
+    отправляет уже после фиксации строки, и без общей транзакции
+    сбой счетчика оставлял бы строку неучтенной. Строки в сегменте
+    (posts.sharding) и UserStats в default — разные базы, их
+    транзакции вложены, но фиксируются по отдельности.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=router.db_for_write(UserStats)):
+            return super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        # post_delete Django отправляет внутри транзакции удаления,
+        # но только в базе строки
+        with transaction.atomic(using=router.db_for_write(UserStats)):
+            return super().delete(*args, **kwargs)
+
+
+class PostQuerySet(ShardedQuerySet):
+    """ Запросы к постам для лент """
+
+    # Колонки, которые шаблоны лент никогда не читают
+    FEED_DEFERRED_FIELDS = (
+        'author__password',
+        'author__last_login',
+        'author__is_superuser',
+        'author__is_staff',
+        'author__is_active',
+        'author__email',
+        'author__date_joined',
+        'group__description',
+    )
+
+    def feed(self):
+        """ Посты с автором и группой одним запросом, без лишних колонок.
+
+        Число комментариев хранится в самом посте (comments_count).
+        """
+        return self.select_related('author', 'group').defer(
+            *self.FEED_DEFERRED_FIELDS
+        )
+
+
+class Post(CountedModel, ShardedModel):
     """ Модель для хранения постов """
     text = models.TextField('Текст поста')
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
@@ -40,16 +93,45 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
+    # адреса миниатюр картинки (JSON), см. posts.thumbnails
+    thumbnails = models.TextField(
+        'Миниатюры',
+        blank=True,
+        default='',
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Post"
         ordering = ('-pub_date', 'pk')
+        indexes = [
+            models.Index(
+                fields=('-pub_date', 'id'), name='post_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date'), name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('group', '-pub_date'), name='post_group_pub_date_idx'
+            ),
+        ]
 
     def __str__(self) -> str:
         return tw.shorten(str(self.text), 15)
 
+    def get_thumbnails(self) -> dict:
+        """ Готовые миниатюры: {'feed': {'url': ..., 'width': ...}, ...} """
+        return json.loads(self.thumbnails) if self.thumbnails else {}
 
-class Comment(models.Model):
+
+class Comment(CountedModel, ShardedModel):
     """ Модель для хранения комментариев """
     post = models.ForeignKey(
         Post,
@@ -65,14 +147,21 @@ class Comment(models.Model):
         related_name='comments'
     )
 
+    objects = ShardedQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Comment"
+        indexes = [
+            models.Index(
+                fields=('post', 'created'), name='comment_post_created_idx'
+            ),
+        ]
 
     def __str__(self) -> str:
         return tw.shorten(str(self.text), 30)
 
 
-class Follow(models.Model):
+class Follow(CountedModel):
     """ Модель для хранения подписок """
     user = models.ForeignKey(
         User,
@@ -93,3 +182,60 @@ class Follow(models.Model):
                 name='unique_list'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=('author', 'user'), name='follow_author_user_idx'
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """ Счетчики пользователя, чтобы не считать их COUNT(*) на каждой
+    странице. Ведутся сигналами, чинятся командой recount.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    comments_count = models.PositiveIntegerField('Комментариев', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = "UserStats"
+
+    def __str__(self) -> str:
+        return str(self.user_id)
+
+
+class TimelineEntry(models.Model):
+    """ Пост в материализованной ленте подписок пользователя """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    # копия Post.pub_date: лента листается по индексу самих записей
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date', 'post'),
+                name='timeline_user_pub_date_idx'
+            ),
+        ]
@@ -0,0 +1,136 @@
+""" Кэш целых страниц лент для анонимных посетителей.
+
+Запись кэша хранит готовый ответ, его валидаторы (ETag по содержимому
+и Last-Modified по времени последнего изменения ленты) и версии лент
+из feed_cache, под которыми он отрисован. Сигналы моделей на постах
+и комментариях меняют версии, и запись с устаревшими версиями не
+используется. Попадание не делает запросов к базе, а условный запрос
+с совпавшим валидатором получает 304 без тела.
+
+Главный валидатор — ETag. Last-Modified точен до секунды, и правка
+в ту же секунду, что и отрисовка, не изменила бы его: такая запись
+хранится без Last-Modified, и 304 ей дает только ETag.
+"""
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from . import feed_cache
+from .models import Comment, Post
+from .paginators import CURSOR_PARAM, PAGE_PARAM
+
+PAGE_KEY = 'anonymous-page:{}'
+# параметры, от которых зависит страница ленты; прочие ключ не меняют,
+# иначе любой ?utm=... плодил бы записи кэша
+KEY_PARAMS = (PAGE_PARAM, CURSOR_PARAM)
+
+# поле поста, по которому лента выбирает посты: author:1 -> author_id=1
+SCOPE_FIELDS = {'index': None, 'group': 'group_id', 'author': 'author_id'}
+
+
+def last_modified(scopes, versions) -> int:
+    """ Время изменения лент по их версиям; если оно неизвестно —
+    самый новый пост или комментарий этих лент.
+    """
+    modified = feed_cache.modified(versions)
+    if modified is not None:
+        return modified
+    posts = Post.objects.all()
+    for scope in scopes:
+        name, _, value = scope.partition(':')
+        if SCOPE_FIELDS.get(name):
+            posts = posts.filter(**{SCOPE_FIELDS[name]: value})
+    dates = [
+        posts.aggregate(newest=Max('pub_date'))['newest'],
+        Comment.objects.filter(post__in=posts).aggregate(
+            newest=Max('created')
+        )['newest'],
+    ]
+    dates = [date for date in dates if date is not None]
+    # If-Modified-Since приходит с точностью до секунды
+    return int(max(dates).timestamp()) if dates else None
+
+
+def page_key(request: HttpRequest) -> str:
+    params = urlencode([
+        (name, request.GET[name]) for name in KEY_PARAMS
+        if name in request.GET
+    ])
+    raw = f'{request.path}?{params}'
+    return PAGE_KEY.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+def _cacheable(request: HttpRequest) -> bool:
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+    )
+
+
+def _respond(request, entry, response=None) -> HttpResponse:
+    if response is None:
+        response = HttpResponse(
+            entry['content'], content_type=entry['content_type']
+        )
+    response['ETag'] = entry['etag']
+    if entry['last_modified'] is not None:
+        response['Last-Modified'] = http_date(entry['last_modified'])
+    patch_vary_headers(response, ('Cookie',))
+    return get_conditional_response(
+        request,
+        etag=entry['etag'],
+        last_modified=entry['last_modified'],
+        response=response,
+    )
+
+
+def anonymous_page(view):
+    """ Кэширует ответы вью лент для анонимных посетителей.
+
+    Ленты страницы и их версии вью сообщает через feed_cache.fragment().
+    Версии берутся до рендеринга, поэтому изменение во время рендеринга
+    делает запись устаревшей, а не кэширует старую страницу.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _cacheable(request):
+            return view(request, *args, **kwargs)
+        key = page_key(request)
+        entry = cache.get(key)
+        if entry is not None and (
+            feed_cache.versions(*entry['scopes']) == entry['versions']
+        ):
+            return _respond(request, entry)
+        response = view(request, *args, **kwargs)
+        scopes = getattr(request, 'feed_scopes', None)
+        if (
+            scopes is None
+            or request.feed_stale
+            or response.status_code != 200
+            or response.streaming
+        ):
+            return response
+        modified = last_modified(scopes, request.feed_versions)
+        if modified is not None and modified >= int(time.time()):
+            # следующая правка в эту же секунду дала бы тот же
+            # Last-Modified, и If-Modified-Since получил бы 304
+            modified = None
+        entry = {
+            'scopes': scopes,
+            'versions': request.feed_versions,
+            'etag': quote_etag(hashlib.sha1(response.content).hexdigest()),
+            'last_modified': modified,
+            'content': response.content,
+            'content_type': response['Content-Type'],
+        }
+        cache.set(key, entry, settings.ANONYMOUS_PAGE_CACHE_TIMEOUT)
+        return _respond(request, entry, response)
+    return wrapper
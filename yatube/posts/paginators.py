@@ -0,0 +1,174 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.paginator import InvalidPage, Paginator
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import HttpRequest
+
+CURSOR_PARAM = 'cursor'
+PAGE_PARAM = 'page'
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CursorPaginator(Paginator):
+    """ Keyset-пагинатор: страницы адресуются курсором, а не номером.
+
+    Вместо COUNT(*) и OFFSET выбирается per_page + 1 строка после
+    (или до) ключа сортировки крайнего поста, поэтому глубокие страницы
+    ленты стоят столько же, сколько первая. Сортировка берется
+    из Meta.ordering модели и дополняется pk для однозначности ключа.
+    """
+
+    is_cursor = True
+    # поля ключа, которых нет в модели (например, аннотации)
+    key_fields = {}
+
+    def __init__(self, object_list, per_page, ordering=None):
+        super().__init__(object_list, per_page)
+        model = object_list.model
+        ordering = list(
+            ordering or object_list.query.order_by or model._meta.ordering
+        )
+        if not {'pk', '-pk'} & set(ordering):
+            ordering.append('pk')
+        self.ordering = tuple(ordering)
+        self.next_cursor = None
+        self.previous_cursor = None
+        self._num_pages = 1
+
+    @property
+    def num_pages(self):
+        # Без COUNT(*) общее число страниц неизвестно, поэтому описываем
+        # только окно вокруг текущей страницы: этого хватает методам
+        # has_next()/has_previous() стандартного Page.
+        return self._num_pages
+
+    @property
+    def page_range(self):
+        return range(1, self._num_pages + 1)
+
+    def _field(self, name):
+        opts = self.object_list.model._meta
+        name = name.lstrip('-')
+        if name in self.key_fields:
+            return self.key_fields[name]
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    def _key(self, obj):
+        return [getattr(obj, name.lstrip('-')) for name in self.ordering]
+
+    def encode_cursor(self, direction, obj):
+        values = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in self._key(obj)
+        ]
+        raw = json.dumps([direction, values]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(raw.decode())
+            if direction not in (NEXT, PREVIOUS):
+                raise ValueError
+            if len(values) != len(self.ordering):
+                raise ValueError
+            values = [
+                self._field(name).to_python(value)
+                for name, value in zip(self.ordering, values)
+            ]
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            raise InvalidCursor('Некорректный курсор страницы')
+        return direction, values
+
+    def _keyset_filter(self, values, backwards, ordering=None):
+        # (a, b) < (x, y) раскрывается в a < x OR (a = x AND b < y);
+        # ordering — те же поля ключа под другими именами
+        ordering = ordering or self.ordering
+        condition = Q()
+        for index, name in enumerate(ordering):
+            descending = name.startswith('-') != backwards
+            lookup = 'lt' if descending else 'gt'
+            step = Q(**{f'{name.lstrip("-")}__{lookup}': values[index]})
+            for prev_name, prev_value in zip(ordering, values[:index]):
+                step &= Q(**{prev_name.lstrip('-'): prev_value})
+            condition |= step
+        return condition
+
+    def _directed(self, backwards, ordering=None):
+        """ Сортировка для выборки страницы в сторону курсора. """
+        ordering = ordering or self.ordering
+        if not backwards:
+            return list(ordering)
+        return [
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in ordering
+        ]
+
+    def _page_queryset(self, direction, values):
+        backwards = direction == PREVIOUS
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(values, backwards))
+        ordering = self._directed(backwards)
+        return queryset.order_by(*ordering)[:self.per_page + 1]
+
+    def page_queryset(self, cursor):
+        """ Запрос, которым выбирается страница по курсору. """
+        direction, values = NEXT, None
+        if cursor:
+            direction, values = self.decode_cursor(cursor)
+        return self._page_queryset(direction, values)
+
+    def page(self, cursor):
+        """ Возвращает страницу, следующую за курсором (или первую). """
+        direction, values = NEXT, None
+        if cursor:
+            direction, values = self.decode_cursor(cursor)
+        backwards = direction == PREVIOUS
+        rows = list(self._page_queryset(direction, values))
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        self.next_cursor = (
+            self.encode_cursor(NEXT, rows[-1]) if has_next and rows else None
+        )
+        self.previous_cursor = (
+            self.encode_cursor(PREVIOUS, rows[0])
+            if has_previous and rows else None
+        )
+        number = 2 if self.previous_cursor else 1
+        self._num_pages = number + 1 if self.next_cursor else number
+        return self._get_page(rows, number, self)
+
+    def get_page(self, cursor):
+        """ Как page(), но при битом курсоре отдает первую страницу. """
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page(None)
+
+
+def get_page_obj(request: HttpRequest, queryset):
+    """ Страница ленты для шаблона posts/includes/paginator.html.
+
+    По умолчанию лента листается курсором (?cursor=...); нумерованные
+    страницы строятся только при явном ?page=N.
+    """
+    if PAGE_PARAM in request.GET:
+        paginator = Paginator(queryset, settings.PER_PAGE_PAGINATOR)
+        return paginator.get_page(request.GET.get(PAGE_PARAM))
+    paginator = CursorPaginator(queryset, settings.PER_PAGE_PAGINATOR)
+    return paginator.get_page(request.GET.get(CURSOR_PARAM))
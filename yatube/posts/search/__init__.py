@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.db.models import FloatField
+from django.http import HttpRequest
+from django.utils.module_loading import import_string
+
+from ..paginators import CURSOR_PARAM, PREVIOUS, CursorPaginator
+
+_backend = None
+
+
+def get_backend():
+    """ Бэкенд поиска из settings.POSTS_SEARCH_BACKEND. """
+    global _backend
+    path = settings.POSTS_SEARCH_BACKEND
+    if _backend is None or _backend.path != path:
+        _backend = import_string(path)()
+        _backend.path = path
+    return _backend
+
+
+class SearchPaginator(CursorPaginator):
+    """ Курсорная пагинация выдачи поиска по (релевантность, pk).
+
+    Страницу выбирает бэкенд, посты догружаются из object_list
+    одним запросом; каждому посту проставляется search_rank.
+    """
+
+    key_fields = {'search_rank': FloatField()}
+
+    def __init__(self, object_list, per_page, query, backend=None):
+        super().__init__(object_list, per_page, ('search_rank', 'pk'))
+        self.query = query
+        self.backend = backend or get_backend()
+
+    def _page_queryset(self, direction, values):
+        hits = self.backend.search(
+            self.query,
+            after=tuple(values) if values is not None else None,
+            backwards=direction == PREVIOUS,
+            limit=self.per_page + 1,
+        )
+        posts = self.object_list.in_bulk([pk for pk, _ in hits])
+        rows = []
+        for pk, rank in hits:
+            post = posts.get(pk)
+            # индекс мог отстать от таблицы постов
+            if post is not None:
+                post.search_rank = rank
+                rows.append(post)
+        return rows
+
+
+def get_page_obj(request: HttpRequest, queryset, query: str):
+    """ Страница выдачи поиска для posts/includes/paginator.html. """
+    paginator = SearchPaginator(
+        queryset, settings.PER_PAGE_PAGINATOR, query
+    )
+    return paginator.get_page(request.GET.get(CURSOR_PARAM))
@@ -0,0 +1,333 @@
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .. import sharding
+from ..models import Comment, Post
+from .russian import normalize, stem
+
+
+def tokenize(query: str) -> list:
+    return re.findall(r'\w+', query.lower())
+
+
+def trigrams(term: str) -> set:
+    """ Триграммы слова, дополненного пробелами по краям. """
+    padded = f' {term} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(first: str, second: str) -> float:
+    """ Доля общих триграмм двух слов (коэффициент Жаккара). """
+    first, second = trigrams(first), trigrams(second)
+    return len(first & second) / len(first | second)
+
+
+class SearchBackend:
+    """ Интерфейс поискового бэкенда.
+
+    search() возвращает пары (post_id, rank) по возрастанию
+    (rank, post_id): чем меньше rank, тем выше пост в выдаче.
+    after — ключ последнего показанного поста, backwards — листание назад
+    (тогда пары идут в обратном порядке).
+    """
+
+    def update(self, post) -> None:
+        """ Индексирует новый или измененный пост. """
+
+    def remove(self, post_id) -> None:
+        """ Убирает пост из индекса. """
+
+    def update_comment(self, comment) -> None:
+        """ Индексирует новый или измененный комментарий. """
+
+    def remove_comment(self, comment_id) -> None:
+        """ Убирает комментарий из индекса. """
+
+    def update_group(self, group) -> None:
+        """ Переиндексирует посты группы после смены ее названия. """
+
+    def remove_group(self, group_id) -> None:
+        """ Убирает название удаленной группы из индекса. """
+
+    def rebuild(self) -> int:
+        """ Строит индекс заново; возвращает число постов. """
+        return 0
+
+    def filter(self, queryset, query: str):
+        """ Сужает queryset постов до подходящих под запрос. """
+        raise NotImplementedError
+
+    def search(self, query, after=None, backwards=False, limit=10) -> list:
+        raise NotImplementedError
+
+
+class SimpleSearchBackend(SearchBackend):
+    """ Поиск подстрокой без индекса: для баз без FTS5. """
+
+    def filter(self, queryset, query):
+        condition = Q()
+        for token in tokenize(query):
+            condition &= (
+                Q(text__icontains=token) | Q(group__title__icontains=token)
+            )
+        return queryset.filter(condition) if condition else queryset.none()
+
+    def search(self, query, after=None, backwards=False, limit=10):
+        posts = self.filter(Post.objects.all(), query)
+        if after is not None:
+            lookup = 'pk__lt' if backwards else 'pk__gt'
+            posts = posts.filter(**{lookup: after[1]})
+        ordering = '-pk' if backwards else 'pk'
+        ids = posts.order_by(ordering).values_list('pk', flat=True)
+        return [(pk, 0.0) for pk in ids[:limit]]
+
+
+class RussianSearchBackend(SearchBackend):
+    """ Морфологический поиск по постам и комментариям к ним.
+
+    В FTS5 хранятся не слова, а их основы (стеммер Портера для русского
+    языка), поэтому «войной» находит и «война», и «войны». Строка
+    индекса — пост (rowid 2 * id) или комментарий (rowid 2 * id + 1),
+    выдача сворачивается до постов. Словарь основ проиндексирован
+    триграммами: слово запроса с опечаткой дополняется похожими
+    основами из словаря. Ранжирование — bm25 FTS5. Таблицы создаются
+    миграцией.
+    """
+
+    table = 'posts_search_stem'
+    terms_table = 'posts_search_term'
+    trigram_table = 'posts_search_trigram'
+    # веса bm25 для колонок body и group_title
+    weights = (1.0, 0.5)
+    # совпадение в комментарии весит меньше совпадения в самом посте
+    comment_weight = 0.5
+    # минимальная доля общих триграмм и число проверяемых кандидатов
+    min_similarity = 0.4
+    fuzzy_candidates = 50
+    batch_size = 500
+
+    _fuzzy = False
+
+    @property
+    def fuzzy(self) -> bool:
+        """ Есть ли словарь основ с триграммами. Миграция создает его,
+        только если SQLite поддерживает токенизатор trigram (3.34+),
+        поэтому смотрим на таблицы, а не на версию: после обновления
+        SQLite их все равно нет.
+        """
+        if not self._fuzzy:
+            tables = {self.terms_table, self.trigram_table}
+            self._fuzzy = tables <= set(
+                connection.introspection.table_names()
+            )
+        return self._fuzzy
+
+    def _execute(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    @staticmethod
+    def stems(text: str) -> list:
+        return [stem(token) for token in tokenize(text)]
+
+    def similar_terms(self, word: str) -> list:
+        """ Основы из словаря, похожие на word по триграммам. """
+        if len(word) < 3 or not self.fuzzy:
+            return []
+        match = ' OR '.join(f'"{gram}"' for gram in sorted(trigrams(word)))
+        rows = self._execute(
+            f'SELECT term FROM {self.trigram_table} '
+            f'WHERE {self.trigram_table} MATCH %s ORDER BY rank LIMIT %s',
+            [match, self.fuzzy_candidates],
+        )
+        terms = {term.strip() for term, in rows} - {word}
+        return sorted(
+            term for term in terms
+            if similarity(word, term) >= self.min_similarity
+        )
+
+    def match(self, query):
+        groups = []
+        for token in tokenize(query):
+            word = stem(token)
+            variants = [f'"{word}"*'] + [
+                f'"{term}"' for term in self.similar_terms(word)
+            ]
+            groups.append(f'({" OR ".join(variants)})')
+        return ' AND '.join(groups)
+
+    def add_terms(self, terms) -> None:
+        """ Пополняет словарь основ новыми словами. """
+        terms = {normalize(term) for term in terms}
+        if not terms or not self.fuzzy:
+            return
+        terms = list(terms)
+        for start in range(0, len(terms), self.batch_size):
+            batch = terms[start:start + self.batch_size]
+            placeholders = ', '.join(['%s'] * len(batch))
+            known = {
+                term for term, in self._execute(
+                    f'SELECT term FROM {self.terms_table} '
+                    f'WHERE term IN ({placeholders})',
+                    batch,
+                )
+            }
+            new = [(term,) for term in batch if term not in known]
+            if not new:
+                continue
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f'INSERT OR IGNORE INTO {self.terms_table}(term) '
+                    f'VALUES (%s)',
+                    new,
+                )
+                cursor.executemany(
+                    f'INSERT INTO {self.trigram_table}(term) VALUES (%s)',
+                    [(f' {term} ',) for term, in new],
+                )
+
+    def _insert(self, rows) -> None:
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table}'
+                f'(rowid, body, group_title, post_id, group_id) '
+                f'VALUES (%s, %s, %s, %s, %s)',
+                rows,
+            )
+
+    def _post_row(self, post):
+        body = self.stems(post.text)
+        title = self.stems(post.group.title) if post.group_id else []
+        row = (
+            2 * post.pk, ' '.join(body), ' '.join(title),
+            post.pk, post.group_id,
+        )
+        return row, body + title
+
+    def _comment_row(self, comment):
+        body = self.stems(comment.text)
+        row = (2 * comment.pk + 1, ' '.join(body), '', comment.post_id, None)
+        return row, body
+
+    def update(self, post):
+        row, terms = self._post_row(post)
+        self.remove(post.pk)
+        self._insert([row])
+        self.add_terms(terms)
+
+    def remove(self, post_id):
+        # строки комментариев убирают их собственные сигналы удаления
+        self._execute(
+            f'DELETE FROM {self.table} WHERE rowid = %s', [2 * post_id]
+        )
+
+    def update_comment(self, comment):
+        row, terms = self._comment_row(comment)
+        self.remove_comment(comment.pk)
+        self._insert([row])
+        self.add_terms(terms)
+
+    def remove_comment(self, comment_id):
+        self._execute(
+            f'DELETE FROM {self.table} WHERE rowid = %s', [2 * comment_id + 1]
+        )
+
+    def update_group(self, group):
+        title = self.stems(group.title)
+        self._execute(
+            f'UPDATE {self.table} SET group_title = %s WHERE group_id = %s',
+            [' '.join(title), group.pk],
+        )
+        self.add_terms(title)
+
+    def remove_group(self, group_id):
+        self._execute(
+            f'UPDATE {self.table} SET group_title = \'\', group_id = NULL '
+            f'WHERE group_id = %s',
+            [group_id],
+        )
+
+    def _fill(self, objects, make_row) -> int:
+        total = 0
+        rows, terms = [], set()
+        for obj in objects.iterator(chunk_size=self.batch_size):
+            row, obj_terms = make_row(obj)
+            rows.append(row)
+            terms.update(obj_terms)
+            total += 1
+            if len(rows) >= self.batch_size:
+                self._insert(rows)
+                rows = []
+        self._insert(rows)
+        self.add_terms(terms)
+        return total
+
+    @transaction.atomic
+    def rebuild(self):
+        # одна транзакция вместо автокоммита на каждую вставку
+        self._execute(f'DELETE FROM {self.table}')
+        if self.fuzzy:
+            self._execute(f'DELETE FROM {self.terms_table}')
+            self._execute(f'DELETE FROM {self.trigram_table}')
+        total = self._fill(
+            Post.objects.select_related('group'), self._post_row
+        )
+        self._fill(Comment.objects.all(), self._comment_row)
+        return total
+
+    def filter(self, queryset, query):
+        match = self.match(query)
+        if not match:
+            return queryset.none()
+        if sharding.enabled():
+            # индекс лежит в default, а запрос постов идет в каждый
+            # сегмент: там подзапрос к индексу ничего бы не нашел
+            ids = self._execute(
+                f'SELECT DISTINCT post_id FROM {self.table} '
+                f'WHERE {self.table} MATCH %s',
+                [match],
+            )
+            return queryset.filter(pk__in=[row[0] for row in ids])
+        column = f'{queryset.model._meta.db_table}.id'
+        return queryset.extra(
+            where=[
+                f'{column} IN (SELECT post_id FROM {self.table} '
+                f'WHERE {self.table} MATCH %s)'
+            ],
+            params=[match],
+        )
+
+    def search(self, query, after=None, backwards=False, limit=10):
+        match = self.match(query)
+        if not match:
+            return []
+        weights = ', '.join(str(weight) for weight in self.weights)
+        # LIMIT -1 не дает SQLite развернуть подзапрос:
+        # bm25() нельзя вызывать внутри агрегатной функции
+        return self._ranked(
+            f'SELECT post_id AS id, MIN(score) AS score FROM ('
+            f'SELECT post_id, bm25({self.table}, {weights}) * '
+            f'CASE rowid %% 2 WHEN 1 THEN {self.comment_weight} ELSE 1.0 END '
+            f'AS score FROM {self.table} WHERE {self.table} MATCH %s '
+            f'LIMIT -1) GROUP BY post_id',
+            [match], after, backwards, limit,
+        )
+
+    def _ranked(self, source, params, after, backwards, limit):
+        """ Страница пар (id, score) из подзапроса source по ключу
+        (score, id).
+        """
+        sql = f'SELECT id, score FROM ({source})'
+        params = list(params)
+        if after is not None:
+            rank, pk = after
+            op = '<' if backwards else '>'
+            sql += f' WHERE score {op} %s OR (score = %s AND id {op} %s)'
+            params += [rank, rank, pk]
+        direction = 'DESC' if backwards else 'ASC'
+        sql += f' ORDER BY score {direction}, id {direction} LIMIT %s'
+        params.append(limit)
+        return self._execute(sql, params)
@@ -0,0 +1,85 @@
+""" Стеммер Портера (Snowball) для русского языка.
+
+Слово делится на область RV (все после первой гласной) и префикс;
+окончания снимаются только внутри RV, как в алгоритме Snowball.
+"""
+import re
+from functools import lru_cache
+
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|'
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+DERIVATIONAL = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+DERIVATIONAL_ENDING = re.compile(r'ость?$')
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+CYRILLIC = re.compile(r'^[а-я]+$')
+
+
+def _strip(pattern, word):
+    return pattern.sub('', word, 1)
+
+
+# словарь языка распределен по Ципфу: кэш на десятки тысяч слов
+# снимает почти все повторные разборы при индексации
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """ Основа слова: «войной», «войны», «война» -> «войн». """
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC.match(word):
+        return word
+    match = RV.match(word)
+    if match is None:
+        return word
+    prefix, rv = match.groups()
+
+    # шаг 1: деепричастие, иначе возвратность и прилагательное,
+    # глагол или существительное
+    stripped = _strip(PERFECTIVE_GERUND, rv)
+    if stripped == rv:
+        rv = _strip(REFLEXIVE, rv)
+        stripped = _strip(ADJECTIVE, rv)
+        if stripped != rv:
+            rv = _strip(PARTICIPLE, stripped)
+        else:
+            stripped = _strip(VERB, rv)
+            rv = _strip(NOUN, rv) if stripped == rv else stripped
+    else:
+        rv = stripped
+
+    # шаг 2
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    # шаг 3: словообразовательный суффикс в R2
+    if DERIVATIONAL.match(rv):
+        rv = _strip(DERIVATIONAL_ENDING, rv)
+
+    # шаг 4: мягкий знак, превосходная степень и двойное «н»
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = _strip(SUPERLATIVE, rv)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def normalize(text: str) -> str:
+    """ Текст для триграммного индекса: нижний регистр, «ё» -> «е». """
+    return text.lower().replace('ё', 'е')
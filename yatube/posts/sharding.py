@@ -0,0 +1,622 @@
+""" Сегментирование постов и комментариев по автору.
+
+Посты автора и комментарии к ним лежат в одной из баз DATABASE_SHARDS.
+Автор попадает в одну из BUCKETS корзин по хэшу author_id, корзина —
+в сегмент по jump consistent hash: при добавлении сегмента в новый
+переезжает лишь его доля корзин, остальные остаются на месте.
+
+Корзина записана в первичном ключе нового поста или комментария
+(new_id), поэтому post_detail сразу идет в нужный сегмент. Ключи
+старше сегментирования (меньше LEGACY_ID_LIMIT) корзины не содержат,
+такие строки ищутся во всех сегментах.
+
+ShardedQuerySet сам выбирает сегменты: закрепленный using() запрос —
+в одном, запрос от автора (user.posts) или от поста (post.comments) —
+в сегменте владельца, остальные (главная лента, лента группы) —
+во всех, с k-way слиянием строк в порядке сортировки запроса.
+Пользователи, группы и подписки остаются в default: select_related
+на них заменяется prefetch_related, а фильтры с JOIN по ним внутри
+сегмента не работают.
+
+При DATABASE_SHARDS из одной базы все работает как без сегментов.
+"""
+import heapq
+import time
+import zlib
+from functools import cmp_to_key
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db import (
+    IntegrityError, NotSupportedError, models, router, transaction,
+)
+from django.db.models import Count, Max, Min, Sum, prefetch_related_objects
+from django.db.models.query import (
+    FlatValuesListIterable, ModelIterable, ValuesIterable,
+)
+
+from core import routers
+
+SHARDED_MODELS = {'posts.post', 'posts.comment'}
+
+BUCKETS = 1024
+# ключ: миллисекунды от EPOCH_MS | корзина | номер в миллисекунде
+BUCKET_BITS = 10
+SEQUENCE_BITS = 12
+EPOCH_MS = 1577836800000  # 2020-01-01
+LEGACY_ID_LIMIT = 1 << 40
+
+# объединение результатов aggregate() разных сегментов
+AGGREGATES = {Count: sum, Sum: sum, Max: max, Min: min}
+
+
+def enabled() -> bool:
+    return len(settings.DATABASE_SHARDS) > 1
+
+
+def is_sharded(model) -> bool:
+    """ Модель (или ее объект) хранится в сегментах. """
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """ Jump consistent hash (Lamping, Veach): номер в range(buckets). """
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def bucket_for_author(author_id) -> int:
+    return zlib.crc32(str(author_id).encode()) % BUCKETS
+
+
+def shard_for_bucket(bucket: int, shards=None) -> str:
+    shards = settings.DATABASE_SHARDS if shards is None else shards
+    return shards[jump_hash(bucket, len(shards))]
+
+
+def shard_for_author(author_id, shards=None) -> str:
+    return shard_for_bucket(bucket_for_author(author_id), shards)
+
+
+def bucket_of(pk) -> int:
+    """ Корзина из ключа new_id() или None для старого ключа. """
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    if pk < LEGACY_ID_LIMIT:
+        return None
+    return (pk >> SEQUENCE_BITS) & (BUCKETS - 1)
+
+
+def shard_for_id(pk) -> str:
+    """ Сегмент строки с ключом pk или None, если он неизвестен. """
+    bucket = bucket_of(pk)
+    if not enabled() or bucket is None:
+        return None
+    return shard_for_bucket(bucket)
+
+
+def bucket_for(instance) -> int:
+    """ Корзина нового поста (по автору) или комментария (по посту). """
+    if instance._meta.label_lower == 'posts.post':
+        return bucket_for_author(instance.author_id)
+    bucket = bucket_of(instance.post_id)
+    if bucket is None:
+        bucket = bucket_for_author(instance.post.author_id)
+    return bucket
+
+
+def shard_for(model, instance) -> str:
+    """ Сегмент строк model, связанных с instance, или None,
+    если они могут быть в любом сегменте.
+    """
+    if instance is None:
+        return None
+    if is_sharded(instance):
+        same = instance._meta.label_lower == model._meta.label_lower
+        # новой строке _state.db мог назначить автор из default
+        if same and instance._state.adding:
+            if model._meta.label_lower == 'posts.comment' and (
+                bucket_of(instance.post_id) is None
+            ):
+                # пост со старым ключом еще не перенесен reshard
+                return instance.post._state.db
+            return shard_for_bucket(bucket_for(instance))
+        return instance._state.db
+    if model._meta.label_lower == 'posts.post' and (
+        instance._meta.label_lower == settings.AUTH_USER_MODEL.lower()
+    ):
+        return shard_for_author(instance.pk)
+    return None
+
+
+def split_by_shard(model, objects) -> dict:
+    """ {сегмент: объекты} для bulk_create строк model с готовыми
+    ключами: посты — в сегмент автора, комментарии — в сегмент поста,
+    как их разложил бы reshard.
+    """
+    from .models import Post
+
+    if not enabled() or not is_sharded(model):
+        return {router.db_for_write(model): list(objects)}
+    if model._meta.label_lower == 'posts.post':
+        def target(obj):
+            return shard_for_author(obj.author_id)
+    else:
+        legacy = {
+            obj.post_id for obj in objects if bucket_of(obj.post_id) is None
+        }
+        # пост со старым ключом лежит в сегменте своего автора
+        authors = dict(
+            Post.objects.filter(pk__in=legacy).values_list('pk', 'author_id')
+            if legacy else ()
+        )
+
+        def target(obj):
+            bucket = bucket_of(obj.post_id)
+            if bucket is not None:
+                return shard_for_bucket(bucket)
+            if obj.post_id in authors:
+                return shard_for_author(authors[obj.post_id])
+            return settings.DATABASE_SHARDS[0]
+    groups = {}
+    for obj in objects:
+        groups.setdefault(target(obj), []).append(obj)
+    return groups
+
+
+def new_id(model, bucket: int, using: str) -> int:
+    """ Следующий ключ корзины bucket в текущей миллисекунде.
+
+    Номер в миллисекунде — следующий после наибольшего занятого
+    в сегменте. Читать его нужно в транзакции сегмента вместе со
+    вставкой (ShardedModel.save): писатель другого процесса, успевший
+    раньше, приводит к IntegrityError или «database is locked».
+    """
+    millisecond = int(time.time() * 1000) - EPOCH_MS
+    while True:
+        low = (
+            ((millisecond << BUCKET_BITS) | bucket) << SEQUENCE_BITS
+        )
+        high = low + (1 << SEQUENCE_BITS) - 1
+        last = (
+            model._base_manager.using(using)
+            .filter(pk__range=(low, high))
+            .aggregate(last=Max('pk'))['last']
+        )
+        if last is None:
+            return low
+        if last < high:
+            return last + 1
+        millisecond += 1
+
+
+class ShardedModel(models.Model):
+    """ Модель в сегментах: ключ новой строки выделяется и строка
+    вставляется в одной транзакции ее сегмента.
+    """
+
+    ID_ATTEMPTS = 5
+
+    class Meta:
+        abstract = True
+
+    def save(
+        self, force_insert=False, force_update=False, using=None,
+        update_fields=None,
+    ):
+        if not enabled() or self.pk is not None:
+            return super().save(
+                force_insert, force_update, using, update_fields
+            )
+        using = using or router.db_for_write(type(self), instance=self)
+        for attempt in range(self.ID_ATTEMPTS):
+            try:
+                with transaction.atomic(using=using):
+                    self.pk = new_id(type(self), bucket_for(self), using)
+                    # только INSERT: с готовым ключом save() сначала
+                    # пробует UPDATE и перезаписал бы чужую строку
+                    return super().save(True, False, using, update_fields)
+            except IntegrityError:
+                # ключ занял писатель другого процесса
+                self.pk = None
+                if attempt == self.ID_ATTEMPTS - 1:
+                    raise
+
+
+def configure_connection(sender, connection, **kwargs) -> None:
+    """ Обработчик connection_created: в сегментах нет пользователей
+    и групп, на которые ссылаются посты, поэтому внешние ключи там
+    не проверяются.
+    """
+    if (
+        connection.vendor == 'sqlite'
+        and connection.alias != routers.PRIMARY
+        and connection.alias in settings.DATABASE_SHARDS
+    ):
+        connection.connection.execute('PRAGMA foreign_keys = OFF')
+
+
+class ShardRouter:
+    """ DATABASE_ROUTERS: запись поста — в сегмент его автора,
+    связанные с постами пользователи и группы — из default.
+    Стоит перед core.routers.PrimaryReplicaRouter.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not enabled():
+            return None
+        instance = hints.get('instance')
+        if is_sharded(model):
+            return shard_for(model, instance)
+        if instance is not None and is_sharded(instance):
+            return routers.current() or routers.PRIMARY
+        return None
+
+    def db_for_write(self, model, **hints):
+        if not enabled():
+            return None
+        instance = hints.get('instance')
+        if is_sharded(model):
+            return shard_for(model, instance)
+        if instance is not None and is_sharded(instance):
+            return routers.PRIMARY
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {
+            routers.PRIMARY,
+            *settings.DATABASE_REPLICAS,
+            *settings.DATABASE_SHARDS,
+        }
+        if (
+            enabled()
+            and obj1._state.db in aliases
+            and obj2._state.db in aliases
+        ):
+            return True
+        return None
+
+
+def _related_paths(select_related, model, prefix=''):
+    """ Пути select_related для prefetch_related. """
+    if select_related is True:
+        return [
+            field.name for field in model._meta.concrete_fields
+            if field.is_relation and not field.null
+        ]
+    paths = []
+    for name, nested in select_related.items():
+        if nested:
+            paths.extend(_related_paths(nested, model, f'{prefix}{name}__'))
+        else:
+            paths.append(f'{prefix}{name}')
+    return paths
+
+
+def _unique(rows, compare=None):
+    """ Строки без повторов: на время переноса строка может быть
+    в двух сегментах. Копии одной строки при слиянии идут подряд
+    с одинаковым ключом сортировки, поэтому ключи помнятся только
+    в пределах одного ключа сортировки.
+    """
+    seen = set()
+    previous = None
+    for row in rows:
+        if compare is not None and previous is not None and (
+            compare(previous, row)
+        ):
+            seen.clear()
+        previous = row
+        if row.pk not in seen:
+            seen.add(row.pk)
+            yield row
+
+
+def _prefetched(rows, lookups, chunk_size):
+    """ Строки с prefetch_related, выполняемым на каждые chunk_size. """
+    if not lookups:
+        yield from rows
+        return
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        prefetch_related_objects(chunk, *lookups)
+        yield from chunk
+
+
+def _compare(ordering, value):
+    """ Сравнение строк по ordering: value(строка, поле) -> значение. """
+    def compare(left, right):
+        for name in ordering:
+            descending = name.startswith('-')
+            a = value(left, name.lstrip('-'))
+            b = value(right, name.lstrip('-'))
+            if a == b:
+                continue
+            # None раньше любых значений, как NULL в SQLite
+            less = a is None or (b is not None and a < b)
+            return (1 if less else -1) if descending else (-1 if less else 1)
+        return 0
+    return compare
+
+
+class ShardedQuerySet(models.QuerySet):
+    """ QuerySet сегментированной модели: опрашивает нужные сегменты
+    и сливает их ответы (см. описание модуля).
+    """
+
+    def for_pk(self, pk):
+        """ Запрос к сегменту строки pk; для старых ключей —
+        ко всем сегментам.
+        """
+        alias = shard_for_id(pk)
+        return self.using(alias) if alias else self
+
+    def near(self, instance):
+        """ Запрос к сегменту instance: комментарии лежат с постом. """
+        return self.using(instance._state.db) if enabled() else self
+
+    def in_bulk(self, id_list=None, field_name='pk'):
+        """ Ключи с известным сегментом ищутся только в нем,
+        старые — во всех сегментах.
+        """
+        if (
+            not enabled() or self._db is not None
+            or id_list is None or field_name != 'pk'
+        ):
+            return super().in_bulk(id_list, field_name=field_name)
+        groups = {}
+        for pk in id_list:
+            groups.setdefault(shard_for_id(pk), []).append(pk)
+        found = {}
+        for alias, pks in groups.items():
+            queryset = self.using(alias) if alias else self
+            found.update(super(ShardedQuerySet, queryset).in_bulk(pks))
+        return found
+
+    def create(self, **kwargs):
+        if not enabled() or self._db is not None:
+            return super().create(**kwargs)
+        # сегмент выбирается по самой строке, а не по запросу
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True, using=shard_for(self.model, obj))
+        return obj
+
+    def _shards(self) -> list:
+        if self._db is not None:
+            return [self._db]
+        alias = shard_for(self.model, self._hints.get('instance'))
+        return [alias] if alias else list(settings.DATABASE_SHARDS)
+
+    def _ordering(self):
+        ordering = list(
+            self.query.order_by
+            or (self.query.default_ordering and self.model._meta.ordering)
+            or []
+        )
+        if not all(isinstance(name, str) for name in ordering):
+            return None
+        return ordering
+
+    def _row_value(self):
+        """ Функция (строка, поле) -> значение для слияния или None,
+        если поля сортировки в строках нет.
+        """
+        ordering = self._ordering()
+        if ordering is None or any('__' in name for name in ordering):
+            return None
+        names = [name.lstrip('-') for name in ordering]
+        if issubclass(self._iterable_class, ModelIterable):
+            return getattr
+        fields = [*self.query.values_select, *self.query.annotation_select]
+        if not set(names) <= set(fields):
+            return None
+        if issubclass(self._iterable_class, FlatValuesListIterable):
+            return lambda row, name: row
+        if issubclass(self._iterable_class, ValuesIterable):
+            return lambda row, name: row[name]
+        return lambda row, name: row[fields.index(name)]
+
+    def _local(self):
+        """ Копия запроса для одного сегмента: без связей с default
+        и без OFFSET — его применяют после слияния.
+        """
+        local = self._chain()
+        local.query.clear_limits()
+        if self.query.high_mark is not None:
+            local.query.set_limits(high=self.query.high_mark)
+        lookups = list(self._prefetch_related_lookups)
+        if issubclass(self._iterable_class, ModelIterable):
+            if self.query.select_related:
+                lookups[:0] = _related_paths(
+                    self.query.select_related, self.model
+                )
+                local.query.select_related = False
+            names, defer = local.query.deferred_loading
+            related = {name.split('__')[0] for name in names if '__' in name}
+            names = frozenset(name for name in names if '__' not in name)
+            if not defer:
+                # only() по полям связи загружал и ее внешний ключ
+                names |= related
+            local.query.deferred_loading = (
+                (names, defer) if names or defer else (frozenset(), True)
+            )
+        local._prefetch_related_lookups = ()
+        return local, lookups
+
+    def _merge(self, results):
+        """ Слияние ответов сегментов в порядке сортировки запроса,
+        с учетом OFFSET и LIMIT самого запроса.
+        """
+        value = self._row_value()
+        compare = None
+        if value is None:
+            rows = chain.from_iterable(results)
+        else:
+            compare = _compare(self._ordering(), value)
+            rows = heapq.merge(*results, key=cmp_to_key(compare))
+        if issubclass(self._iterable_class, ModelIterable):
+            rows = _unique(rows, compare)
+        return islice(rows, self.query.low_mark, self.query.high_mark)
+
+    def _gather(self) -> list:
+        local, lookups = self._local()
+        rows = list(self._merge(
+            local._iterable_class(local.using(alias))
+            for alias in self._shards()
+        ))
+        if lookups and rows:
+            prefetch_related_objects(rows, *lookups)
+        return rows
+
+    def _fetch_all(self):
+        if self._result_cache is None and enabled():
+            self._result_cache = self._gather()
+            self._prefetch_done = True
+        super()._fetch_all()
+
+    def iterator(self, chunk_size=2000):
+        if not enabled():
+            return super().iterator(chunk_size)
+        # каждый сегмент читается своим курсором, строки сливаются
+        # по мере чтения, связи догружаются пачками по chunk_size
+        local, lookups = self._local()
+        rows = self._merge([
+            models.QuerySet.iterator(local.using(alias), chunk_size)
+            for alias in self._shards()
+        ])
+        return _prefetched(rows, lookups, chunk_size)
+
+    def count(self):
+        if not enabled() or self._result_cache is not None:
+            return super().count()
+        if not self.query.can_filter():
+            # срез: COUNT по сегментам не учтет общий OFFSET
+            return len(self)
+        if self._db is not None:
+            return super().count()
+        return sum(self.using(alias).count() for alias in self._shards())
+
+    def exists(self):
+        if not enabled() or self._db is not None:
+            return super().exists()
+        return any(self.using(alias).exists() for alias in self._shards())
+
+    def aggregate(self, *args, **kwargs):
+        if not enabled() or self._db is not None:
+            return super().aggregate(*args, **kwargs)
+        for arg in args:
+            kwargs[arg.default_alias] = arg
+        combine = {}
+        for name, aggregate in kwargs.items():
+            if type(aggregate) not in AGGREGATES:
+                raise NotSupportedError(
+                    f'{type(aggregate).__name__} по нескольким сегментам'
+                )
+            combine[name] = AGGREGATES[type(aggregate)]
+        results = [
+            self.using(alias).aggregate(**kwargs)
+            for alias in self._shards()
+        ]
+        combined = {}
+        for name, function in combine.items():
+            values = [
+                result[name] for result in results
+                if result[name] is not None
+            ]
+            combined[name] = function(values) if values else None
+        return combined
+
+    def update(self, **kwargs):
+        if not enabled() or self._db is not None:
+            return super().update(**kwargs)
+        return sum(
+            self.using(alias).update(**kwargs) for alias in self._shards()
+        )
+
+    update.alters_data = True
+
+    def delete(self):
+        if not enabled() or self._db is not None:
+            return super().delete()
+        total, counts = 0, {}
+        for alias in self._shards():
+            deleted, by_model = self.using(alias).delete()
+            total += deleted
+            for label, number in by_model.items():
+                counts[label] = counts.get(label, 0) + number
+        return total, counts
+
+    delete.alters_data = True
+
+
+def _move(posts, source: str, target: str) -> int:
+    """ Переносит посты с их комментариями; возвращает число
+    комментариев. Сначала строки появляются в target (чтения отбросят
+    дубликаты по ключу), затем удаляются из source без сигналов:
+    счетчики и поисковый индекс от переезда не меняются.
+    """
+    from .models import Comment, Post
+
+    ids = [post.pk for post in posts]
+    comments = list(
+        Comment._base_manager.using(source).filter(post_id__in=ids)
+    )
+    with transaction.atomic(using=target):
+        Post._base_manager.using(target).bulk_create(
+            posts, ignore_conflicts=True
+        )
+        Comment._base_manager.using(target).bulk_create(
+            comments, ignore_conflicts=True
+        )
+    with transaction.atomic(using=source):
+        Comment._base_manager.using(source).filter(
+            post_id__in=ids
+        )._raw_delete(source)
+        Post._base_manager.using(source).filter(pk__in=ids)._raw_delete(
+            source
+        )
+    return len(comments)
+
+
+def reshard(sources=(), batch_size=500, dry_run=False) -> dict:
+    """ Переносит посты и комментарии из DATABASE_SHARDS и sources
+    в сегменты, которые им назначает DATABASE_SHARDS; возвращает
+    {(откуда, куда): [постов, комментариев]}.
+    """
+    from .models import Comment, Post
+
+    moved = {}
+    for source in dict.fromkeys([*settings.DATABASE_SHARDS, *sources]):
+        last = None
+        while True:
+            batch = Post._base_manager.using(source).order_by('pk')
+            if last is not None:
+                batch = batch.filter(pk__gt=last)
+            batch = list(batch[:batch_size])
+            if not batch:
+                break
+            last = batch[-1].pk
+            targets = {}
+            for post in batch:
+                target = shard_for_author(post.author_id)
+                if target != source:
+                    targets.setdefault(target, []).append(post)
+            for target, posts in targets.items():
+                counts = moved.setdefault((source, target), [0, 0])
+                counts[0] += len(posts)
+                if dry_run:
+                    counts[1] += Comment._base_manager.using(source).filter(
+                        post__in=posts
+                    ).count()
+                else:
+                    counts[1] += _move(posts, source, target)
+    return moved
@@ -0,0 +1,204 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core import prometheus, routers, writes
+
+from . import counters, feed_cache, search, timeline
+from .models import Comment, Follow, Group, Post, User
+
+# поля пользователя, которые ленты показывают у постов автора
+AUTHOR_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out(instance)
+    else:
+        # post_edit обновляет дату публикации
+        timeline.move(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def purge_timeline(sender, instance, **kwargs):
+    timeline.purge(instance.user, instance.author)
+
+
+@receiver(pre_save, sender=Post)
+def invalidate_previous_group(sender, instance, raw, using, **kwargs):
+    # при редактировании пост может уйти из старой группы
+    if raw or instance._state.adding:
+        return
+    group_id = (
+        Post.objects.for_pk(instance.pk).filter(pk=instance.pk)
+        .values_list('group_id', flat=True)
+        .first()
+    )
+    if group_id and group_id != instance.group_id:
+        feed_cache.invalidate(f'group:{group_id}', using=using)
+
+
+@receiver(pre_save, sender=User)
+def invalidate_renamed_author(
+    sender, instance, raw, using, update_fields, **kwargs
+):
+    # вход пользователя сохраняет только last_login
+    if raw or instance._state.adding or (
+        update_fields is not None
+        and not set(update_fields) & set(AUTHOR_NAME_FIELDS)
+    ):
+        return
+    previous = (
+        User.objects.filter(pk=instance.pk)
+        .values_list(*AUTHOR_NAME_FIELDS)
+        .first()
+    )
+    current = tuple(getattr(instance, name) for name in AUTHOR_NAME_FIELDS)
+    if previous is None or previous == current:
+        return
+    groups = (
+        Post.objects.filter(author_id=instance.pk).exclude(group=None)
+        .order_by().values_list('group_id', flat=True).distinct()
+    )
+    feed_cache.invalidate(
+        'index',
+        f'author:{instance.pk}',
+        *(f'group:{group_id}' for group_id in groups),
+        using=using,
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, using, **kwargs):
+    feed_cache.invalidate(*feed_cache.post_scopes(instance), using=using)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_feeds(sender, instance, using, **kwargs):
+    feed_cache.invalidate(*feed_cache.post_scopes(instance.post), using=using)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, using, **kwargs):
+    feed_cache.invalidate('index', f'group:{instance.pk}', using=using)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_feed(sender, instance, using, **kwargs):
+    # на странице автора видна кнопка подписки
+    feed_cache.invalidate(
+        f'follow:{instance.user_id}',
+        f'author:{instance.author_id}',
+        using=using,
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def stick_author(sender, instance, raw, **kwargs):
+    # автор сразу увидит свою запись, даже если реплики отстают
+    if not raw:
+        routers.stick(instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def stick_follower(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        routers.stick(instance.user_id)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.change_user(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.change_post(instance.post_id, 1)
+        counters.change_user(instance.author_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.change_post(instance.post_id, -1)
+    counters.change_user(instance.author_id, comments_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.change_user(instance.author_id, followers_count=1)
+        counters.change_user(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, followers_count=-1)
+    counters.change_user(instance.user_id, following_count=-1)
+    # после счетчиков: автор мог опуститься ниже порога fan-out
+    timeline.unfollowed(instance.author)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw, **kwargs):
+    # при loaddata группа поста может быть еще не загружена,
+    # такие посты индексирует rebuild_search_index
+    if not raw:
+        search.get_backend().update(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.get_backend().remove(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, raw, **kwargs):
+    if not raw:
+        search.get_backend().update_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.get_backend().remove_comment(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def index_group(sender, instance, created, raw, **kwargs):
+    if not created and not raw:
+        search.get_backend().update_group(instance)
+
+
+@receiver(post_delete, sender=Group)
+def unindex_group(sender, instance, **kwargs):
+    search.get_backend().remove_group(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def observe_post(sender, instance, created, raw, using, **kwargs):
+    if created and not raw:
+        writes.after_commit(prometheus.POSTS_CREATED.inc, using=using)
+
+
+@receiver(post_save, sender=Comment)
+def observe_comment(sender, instance, created, raw, using, **kwargs):
+    if created and not raw:
+        writes.after_commit(prometheus.COMMENTS_CREATED.inc, using=using)
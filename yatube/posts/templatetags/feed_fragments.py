@@ -0,0 +1,33 @@
+from django import template
+
+from .. import feed_cache
+
+register = template.Library()
+
+
+class FeedCacheNode(template.Node):
+    def __init__(self, nodelist, fragment):
+        self.nodelist = nodelist
+        self.fragment = fragment
+
+    def render(self, context):
+        return feed_cache.get_or_render(
+            context.request,
+            self.fragment.resolve(context),
+            lambda: self.nodelist.render(context),
+        )
+
+
+@register.tag
+def feedcache(parser, token):
+    """ {% feedcache feed_cache %}...{% endfeedcache %}: фрагмент ленты
+    с отдачей устаревшей копии на время пересчета (feed_cache.fragment).
+    """
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag requires exactly one argument."
+        )
+    nodelist = parser.parse(('endfeedcache',))
+    parser.delete_first_token()
+    return FeedCacheNode(nodelist, parser.compile_filter(bits[1]))
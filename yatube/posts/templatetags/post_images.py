@@ -0,0 +1,74 @@
+from django import template
+from django.conf import settings
+from django.utils.html import format_html, format_html_join
+
+from ..thumbnails import MIME_TYPES
+
+register = template.Library()
+
+
+def _srcset(variants):
+    return ', '.join(
+        f'{variant["url"]} {variant["width"]}w' for variant in variants
+    )
+
+
+def _retina_image(thumbnails, thumbnail):
+    """ <img> по миниатюрам sorl: обычной и двойной плотности. """
+    return format_html(
+        '<img class="card-img my-2" src="{}" srcset="{} 2x" '
+        'width="{}" height="{}">',
+        thumbnail['url'],
+        thumbnails.get('retina', thumbnail)['url'],
+        thumbnail['width'],
+        thumbnail['height'],
+    )
+
+
+@register.simple_tag
+def post_image(post, rendition='feed'):
+    """ Картинка поста по готовым адресам миниатюр, без обращения к sorl.
+
+    Если есть адаптивный набор, выводится <picture> с <source> на каждый
+    формат (AVIF, WebP) и srcset по ширинам, иначе — <img>.
+    """
+    if not post.image:
+        return ''
+    thumbnails = post.get_thumbnails()
+    thumbnail = thumbnails.get(rendition)
+    if thumbnail is None:
+        # миниатюры еще в очереди
+        return format_html(
+            '<img class="card-img my-2" src="{}">', post.image.url
+        )
+    sources = thumbnails.get('sources')
+    if not sources:
+        return _retina_image(thumbnails, thumbnail)
+    sizes = settings.THUMBNAIL_RESPONSIVE_SIZES
+    fallback = sources.get('JPEG')
+    if fallback:
+        image = format_html(
+            '<img class="card-img my-2" src="{}" srcset="{}" sizes="{}" '
+            'width="{}" height="{}">',
+            thumbnail['url'],
+            _srcset(fallback),
+            sizes,
+            thumbnail['width'],
+            thumbnail['height'],
+        )
+    else:
+        # набор, построенный без JPEG: запасной <img> — миниатюры sorl
+        image = _retina_image(thumbnails, thumbnail)
+    return format_html(
+        '<picture>{}{}</picture>',
+        format_html_join(
+            '',
+            '<source type="{}" srcset="{}" sizes="{}">',
+            (
+                (MIME_TYPES[format_], _srcset(variants), sizes)
+                for format_, variants in sources.items()
+                if format_ != 'JPEG'
+            ),
+        ),
+        image,
+    )
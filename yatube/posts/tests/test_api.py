@@ -0,0 +1,186 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import timeline
+from ..models import Comment, Follow, Group, Post, User
+from .utils import QueryBudgetMixin, run_on_commit
+
+INDEX_URL = reverse('posts:api_index')
+BATCH_URL = reverse('posts:api_batch')
+GROUP_URL = reverse('posts:api_group_list', kwargs={'slug': 'test-slug'})
+PROFILE_URL = reverse('posts:api_profile', kwargs={'username': 'HasNoName'})
+FOLLOW_URL = reverse('posts:api_follow_index')
+
+
+@override_settings(API_PER_PAGE=4)
+class ApiTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Тестовый пост {i}', group=cls.group)
+            for i in range(10)
+        )
+        cls.posts = list(Post.objects.all())
+        cls.post = cls.posts[0]
+        for i in range(6):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Ответ {i}'
+            )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def walk(self, client, url, data=None):
+        """ Все страницы ленты по курсорам next. """
+        seen = []
+        data = dict(data or {})
+        while True:
+            body = client.get(url, data).json()
+            seen.extend(body['results'])
+            if not body['next']:
+                return seen
+            data['cursor'] = body['next']
+
+    def test_feeds_walk_by_cursor(self):
+        """Ленты API листаются курсором без пропусков и повторов."""
+        expected = [str(post.pk) for post in self.posts]
+        for client, url in (
+            (self.guest_client, INDEX_URL),
+            (self.guest_client, GROUP_URL),
+            (self.guest_client, PROFILE_URL),
+            (self.authorized_client, FOLLOW_URL),
+        ):
+            with self.subTest(url=url):
+                ids = [post['id'] for post in self.walk(client, url)]
+                self.assertEqual(ids, expected)
+
+    @override_settings(FOLLOW_TIMELINE_FANOUT=True)
+    def test_fan_out_follow_feed(self):
+        """Лента подписок с fan-out листается по записям ленты."""
+        timeline.rebuild(self.reader)
+        posts = self.walk(
+            self.authorized_client, FOLLOW_URL, {'fields': 'id'}
+        )
+        self.assertEqual(
+            [post['id'] for post in posts],
+            [str(post.pk) for post in self.posts],
+        )
+
+    def test_post_serialized(self):
+        post = self.guest_client.get(INDEX_URL).json()['results'][0]
+        self.assertEqual(post['text'], self.post.text)
+        self.assertEqual(post['author'], 'HasNoName')
+        self.assertEqual(post['group'], 'test-slug')
+        self.assertEqual(post['comments_count'], 6)
+        self.assertIsNone(post['image'])
+
+    def test_fields_limit_columns(self):
+        """fields= выбирает поля ответа и колонки запроса."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.guest_client.get(INDEX_URL, {'fields': 'id,text'})
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'text'})
+        sql = context.captured_queries[-1]['sql']
+        self.assertNotIn('auth_user', sql)
+        self.assertNotIn('"thumbnails"', sql)
+        response = self.guest_client.get(INDEX_URL, {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_budget(self):
+        """Страница ленты и пакет постов — без N+1."""
+        for url, data in (
+            (INDEX_URL, None),
+            (GROUP_URL, None),
+            (BATCH_URL, {'ids': ','.join(str(p.pk) for p in self.posts)}),
+        ):
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.guest_client, url, 2, data)
+
+    def test_sparse_fields_query_budget(self):
+        """Выборка полей не дочитывает отложенные колонки по строкам."""
+        for url in (INDEX_URL, GROUP_URL, PROFILE_URL):
+            with self.subTest(url=url):
+                self.assertQueryBudget(
+                    self.guest_client, url, 2, {'fields': 'text'}
+                )
+
+    def test_feed_etag_skips_queries(self):
+        """Совпавший ETag ленты дает 304 без запросов постов."""
+        response = self.guest_client.get(INDEX_URL)
+        etag = response['ETag']
+        with CaptureQueriesContext(connection) as context:
+            response = self.guest_client.get(
+                INDEX_URL, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(context), 0)
+        with run_on_commit():
+            Post.objects.create(author=self.user, text='Новый пост')
+        response = self.guest_client.get(INDEX_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['text'], 'Новый пост')
+
+    def test_post_and_comments(self):
+        url = reverse('posts:api_post_detail', args=[self.post.pk])
+        response = self.guest_client.get(url, {'fields': 'text'})
+        self.assertEqual(response.json(), {'text': self.post.text})
+        response = self.guest_client.get(
+            url, {'fields': 'text'}, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+        comments = self.walk(
+            self.guest_client,
+            reverse('posts:api_comments', args=[self.post.pk]),
+        )
+        self.assertEqual(
+            [comment['text'] for comment in comments],
+            [f'Ответ {i}' for i in range(6)],
+        )
+        self.assertEqual(comments[0]['author'], 'Reader')
+
+    def test_batch(self):
+        """Пакет отдает посты в порядке ids, ненайденные — в missing."""
+        ids = [self.posts[3].pk, 0, self.posts[1].pk]
+        response = self.guest_client.get(
+            BATCH_URL, {'ids': ','.join(map(str, ids)), 'fields': 'id'}
+        )
+        self.assertEqual(response.json(), {
+            'results': [{'id': str(ids[0])}, {'id': str(ids[2])}],
+            'missing': ['0'],
+        })
+        for ids in ('', 'a,b', ','.join(map(str, range(101)))):
+            with self.subTest(ids=ids):
+                response = self.guest_client.get(BATCH_URL, {'ids': ids})
+                self.assertEqual(response.status_code, 400)
+
+    def test_errors(self):
+        for client, url, data, status in (
+            (self.guest_client, FOLLOW_URL, None, 401),
+            (self.guest_client, INDEX_URL, {'cursor': 'bad'}, 400),
+            (
+                self.guest_client,
+                reverse('posts:api_post_detail', args=[0]),
+                None,
+                404,
+            ),
+        ):
+            with self.subTest(url=url):
+                response = client.get(url, data)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('error', response.json())
+        self.assertEqual(self.guest_client.post(INDEX_URL).status_code, 405)
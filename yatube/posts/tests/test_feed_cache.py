@@ -0,0 +1,118 @@
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core import routers
+
+from .. import feed_cache
+from ..models import Post, User
+from .utils import run_on_commit
+
+INDEX_URL = reverse('posts:index')
+
+
+class StaleWhileRevalidateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.request = RequestFactory().get(INDEX_URL)
+        self.request.resolver_match = mock.Mock(view_name='posts:index')
+        self.renders = 0
+
+    def render(self):
+        self.renders += 1
+        return f'render {self.renders}'
+
+    def get(self):
+        fragment = feed_cache.fragment(self.request, 'index')
+        return feed_cache.get_or_render(self.request, fragment, self.render)
+
+    def lease(self):
+        key = feed_cache.fragment(self.request, 'index')['key']
+        cache.add(feed_cache.LEASE_KEY.format(key), True)
+
+    def test_fresh_fragment_cached(self):
+        self.assertEqual(self.get(), 'render 1')
+        self.assertEqual(self.get(), 'render 1')
+        self.assertFalse(self.request.feed_stale)
+
+    def test_stale_served_while_leased(self):
+        """Пока другой процесс пересчитывает, отдается старый фрагмент."""
+        self.get()
+        feed_cache.bump('index')
+        self.lease()
+        self.assertEqual(self.get(), 'render 1')
+        self.assertTrue(self.request.feed_stale)
+        cache.clear()
+        self.assertEqual(self.get(), 'render 2')
+
+    def test_single_recompute(self):
+        """Устаревший фрагмент пересчитывается один раз, аренда снимается."""
+        self.get()
+        feed_cache.bump('index')
+        self.assertEqual(self.get(), 'render 2')
+        self.assertEqual(self.get(), 'render 2')
+        key = feed_cache.fragment(self.request, 'index')['key']
+        self.assertIsNone(cache.get(feed_cache.LEASE_KEY.format(key)))
+
+    def test_cold_key_rendered_despite_lease(self):
+        self.lease()
+        self.assertEqual(self.get(), 'render 1')
+
+    @override_settings(FEED_CACHE_EARLY_BETA=1.0)
+    def test_probabilistic_early_expiration(self):
+        """Долго рендерящаяся запись может пересчитаться до срока."""
+        self.get()
+        key = feed_cache.FRAGMENT_KEY.format(
+            feed_cache.fragment(self.request, 'index')['key']
+        )
+        entry = cache.get(key)
+        # рендеринг дольше, чем осталось до срока
+        entry['delta'] = settings.FEED_CACHE_TIMEOUT
+        cache.set(key, entry)
+        with mock.patch('posts.feed_cache.random.random', return_value=0):
+            self.assertEqual(self.get(), 'render 1')
+        with mock.patch('posts.feed_cache.random.random', return_value=0.99):
+            self.assertEqual(self.get(), 'render 2')
+
+    @override_settings(DATABASE_REPLICAS=['replica_1'])
+    def test_lagging_replica_not_cached(self):
+        """Страница с отстающей реплики не кэшируется под новой версией."""
+        feed_cache.bump('index')
+        view = routers.use_replica(lambda request: self.get())
+        with mock.patch.object(routers, 'synced_at', return_value=0):
+            self.assertEqual(view(self.request), 'render 1')
+            self.assertTrue(self.request.feed_stale)
+            self.assertEqual(view(self.request), 'render 2')
+        self.assertEqual(self.get(), 'render 3')
+        self.assertEqual(self.get(), 'render 3')
+
+
+class StalePageNotCachedTests(TestCase):
+    def test_stale_page_not_cached(self):
+        """Кэш страниц не сохраняет страницу с устаревшим фрагментом."""
+        cache.clear()
+        user = User.objects.create_user(username='HasNoName')
+        Post.objects.create(author=user, text='Старый пост')
+        self.client.get(INDEX_URL)
+        with run_on_commit():
+            Post.objects.create(author=user, text='Новый пост')
+        with mock.patch.object(feed_cache.cache, 'add', return_value=False):
+            response = self.client.get(INDEX_URL)
+        self.assertNotContains(response, 'Новый пост')
+        self.assertContains(self.client.get(INDEX_URL), 'Новый пост')
+
+
+class InvalidateTests(TestCase):
+    def test_bumped_inside_transaction(self):
+        """Запись меняет версии лент сразу и еще раз после фиксации."""
+        cache.clear()
+        user = User.objects.create_user(username='HasNoName')
+        before = feed_cache.versions('index')
+        with run_on_commit():
+            Post.objects.create(author=user, text='Новый пост')
+            during = feed_cache.versions('index')
+            self.assertNotEqual(during, before)
+        self.assertNotEqual(feed_cache.versions('index'), during)
@@ -1,11 +1,16 @@
+import json
 import shutil
 import tempfile
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client, override_settings
+from django.test import (
+    TestCase, TransactionTestCase, Client, override_settings
+)
 from django.urls import reverse
 
+from .. import thumbnails
+from ..templatetags.post_images import post_image
 from ..models import Group, Post, User, Comment
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -144,3 +149,95 @@ class PostCreateFormTests(TestCase):
             Comment.objects.filter(
                 post_id=self.post.id
             ).exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_ASYNC=True)
+class ThumbnailTests(TransactionTestCase):
+    """ Миниатюры в пуле, как в бою: пул видит только
+    зафиксированные посты, поэтому здесь TransactionTestCase.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='HasNoName')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def tearDown(self):
+        # пул не должен читать базу во время ее очистки
+        thumbnails.drain()
+        super().tearDown()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_create_post_generates_thumbnails(self):
+        """Миниатюры генерируются при сохранении формы и выводятся
+        в ленте без обращения к sorl."""
+        uploaded = SimpleUploadedFile(
+            name='thumb.gif',
+            content=SMALL_GIF,
+            content_type='image/gif'
+        )
+        self.authorized_client.post(
+            CREATE_URL,
+            data={'text': 'Пост с миниатюрами', 'image': uploaded},
+        )
+        thumbnails.drain()
+        post = Post.objects.get(text='Пост с миниатюрами')
+        rendered = post.get_thumbnails()
+        for rendition in settings.THUMBNAIL_RENDITIONS:
+            self.assertIn(rendition, rendered)
+        self.assertEqual(rendered['feed']['width'], 960)
+        response = self.authorized_client.get(PROFILE_URL)
+        self.assertContains(response, rendered['feed']['url'])
+
+    def test_create_post_responsive_renditions(self):
+        """Для картинки строится набор WebP/JPEG по ширинам и <picture>."""
+        uploaded = SimpleUploadedFile(
+            name='wide.gif',
+            content=SMALL_GIF,
+            content_type='image/gif'
+        )
+        with override_settings(THUMBNAIL_RESPONSIVE_WIDTHS=(1, 2, 480)):
+            self.authorized_client.post(
+                CREATE_URL,
+                data={'text': 'Адаптивный пост', 'image': uploaded},
+            )
+            thumbnails.drain()
+        post = Post.objects.get(text='Адаптивный пост')
+        sources = post.get_thumbnails()['sources']
+        self.assertEqual(
+            [variant['width'] for variant in sources['WEBP']], [1, 2]
+        )
+        response = self.authorized_client.get(PROFILE_URL)
+        self.assertContains(response, '<picture>')
+        self.assertContains(
+            response,
+            f'<source type="image/webp" srcset="{sources["WEBP"][0]["url"]}'
+            f' 1w, {sources["WEBP"][1]["url"]} 2w"',
+        )
+
+    def test_jpeg_fallback_always_rendered(self):
+        """Без JPEG в форматах набора у <img> остается запасной srcset."""
+        uploaded = SimpleUploadedFile(
+            name='webp.gif',
+            content=SMALL_GIF,
+            content_type='image/gif'
+        )
+        with override_settings(THUMBNAIL_RESPONSIVE_FORMATS=('WEBP',)):
+            self.authorized_client.post(
+                CREATE_URL,
+                data={'text': 'Пост без JPEG', 'image': uploaded},
+            )
+            thumbnails.drain()
+        post = Post.objects.get(text='Пост без JPEG')
+        rendered = post.get_thumbnails()
+        self.assertEqual(list(rendered['sources']), ['WEBP', 'JPEG'])
+        # набор, построенный до исправления, — без JPEG
+        del rendered['sources']['JPEG']
+        post.thumbnails = json.dumps(rendered)
+        html = post_image(post)
+        self.assertNotIn('srcset=""', html)
+        self.assertIn(f'srcset="{rendered["retina"]["url"]} 2x"', html)
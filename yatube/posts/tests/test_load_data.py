@@ -0,0 +1,53 @@
+import io
+
+from django.core.management import call_command
+from django.db.models import Count, F, Sum
+from django.test import TestCase
+
+from ..load_data import generate
+from ..models import Comment, Follow, Group, Post, User, UserStats
+
+OPTIONS = {
+    'users': 30, 'groups': 3, 'posts': 300, 'comments': 100, 'follows': 5,
+}
+
+
+class LoadDataTests(TestCase):
+    def test_command(self):
+        """Команда создает заданное число строк и пересчитывает счетчики."""
+        call_command(
+            'generate_load_data',
+            *[f'--{name}={value}' for name, value in OPTIONS.items()],
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        stats = UserStats.objects.aggregate(posts=Sum('posts_count'))
+        self.assertEqual(stats['posts'], 300)
+
+    def test_seed(self):
+        """Одно и то же зерно дает одни и те же данные."""
+        generate(seed=7, **OPTIONS)
+        first = list(Post.objects.values_list('author', 'group', 'text'))
+        for model in (Post, User, Group):
+            model.objects.all().delete()
+        generate(seed=7, **OPTIONS)
+        second = list(Post.objects.values_list('author', 'group', 'text'))
+        self.assertEqual(first, second)
+
+    def test_power_law(self):
+        """Немногие авторы пишут большую часть постов."""
+        generate(**OPTIONS)
+        counts = sorted(
+            Post.objects.order_by().values('author')
+            .annotate(total=Count('pk'))
+            .values_list('total', flat=True),
+            reverse=True,
+        )
+        self.assertGreater(sum(counts[:3]), 300 / 3)
+        self.assertEqual(
+            Post.objects.order_by('pk').first().pub_date,
+            Post.objects.order_by('pub_date').first().pub_date,
+        )
@@ -1,6 +1,12 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError
 from django.test import TestCase
 
-from ..models import Group, Post, User, Comment
+from .. import counters
+from ..models import Group, Post, User, Comment, Follow, UserStats
 
 
 class PostModelTest(TestCase):
@@ -36,3 +42,72 @@ class PostModelTest(TestCase):
         self.assertEqual(string_post, 'Тестовый пост')
         self.assertEqual(string_group, 'Тестовая группа')
         self.assertEqual(string_comment, 'Тестовый коммент')
+
+
+class FeedIndexesTest(TestCase):
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент используют составные индексы."""
+        out = StringIO()
+        call_command('explain_feeds', '--check', stdout=out)
+        self.assertNotIn('не использует', out.getvalue())
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_counters_follow_changes(self):
+        """Счетчики меняются при создании и удалении записей."""
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Тестовый коммент'
+        )
+        Follow.objects.create(user=self.reader, author=self.user)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 1)
+        stats = UserStats.objects.get(user=self.reader)
+        self.assertEqual(stats.comments_count, 1)
+        self.assertEqual(stats.following_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.reader.stats.comments_count, 0)
+
+    def test_counters_in_row_transaction(self):
+        """Сбой счетчика откатывает и саму запись."""
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        with mock.patch.object(
+            counters, 'change_user', side_effect=DatabaseError
+        ):
+            with self.assertRaises(DatabaseError):
+                Comment.objects.create(
+                    post=post, author=self.reader, text='Коммент'
+                )
+            with self.assertRaises(DatabaseError):
+                follow.delete()
+        self.assertFalse(Comment.objects.exists())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertTrue(Follow.objects.filter(pk=follow.pk).exists())
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).followers_count, 1
+        )
+
+    def test_recount_repairs_counters(self):
+        """Команда recount восстанавливает счетчики."""
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        Comment.objects.create(post=post, author=self.user, text='Коммент')
+        UserStats.objects.update(posts_count=42, comments_count=42)
+        Post.objects.update(comments_count=42)
+        call_command('recount', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual((stats.posts_count, stats.comments_count), (1, 1))
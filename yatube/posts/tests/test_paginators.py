@@ -0,0 +1,90 @@
+from django.core.paginator import Page
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from ..models import Group, Post, User
+from ..paginators import CursorPaginator
+
+INDEX_URL = reverse('posts:index')
+GROUP_URL = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Тестовый пост {i}', group=cls.group)
+            for i in range(25)
+        )
+        cls.ordered = list(Post.objects.all())
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_walk_forward_and_back(self):
+        """Курсоры next/prev обходят ленту без пропусков и повторов."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        page = paginator.get_page(None)
+        seen = list(page)
+        while page.has_next():
+            cursor = paginator.next_cursor
+            paginator = CursorPaginator(Post.objects.all(), 10)
+            page = paginator.get_page(cursor)
+            seen.extend(page)
+        self.assertEqual(seen, self.ordered)
+        self.assertEqual(len(page), 5)
+        cursor = paginator.previous_cursor
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        page = paginator.get_page(cursor)
+        self.assertEqual(list(page), self.ordered[10:20])
+        self.assertTrue(page.has_previous())
+        cursor = paginator.previous_cursor
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        page = paginator.get_page(cursor)
+        self.assertEqual(list(page), self.ordered[:10])
+        self.assertFalse(page.has_previous())
+
+    def test_page_is_standard_page(self):
+        """Курсорная страница совместима с django.core.paginator.Page."""
+        response = self.guest_client.get(INDEX_URL)
+        page_obj = response.context['page_obj']
+        self.assertIs(type(page_obj), Page)
+        self.assertTrue(page_obj.has_next())
+        self.assertFalse(page_obj.has_previous())
+
+    def test_view_cursor_navigation(self):
+        """Лента листается курсорами, полученными из предыдущей страницы."""
+        response = self.guest_client.get(GROUP_URL)
+        collected = list(response.context['page_obj'])
+        while response.context['page_obj'].has_next():
+            cursor = response.context['page_obj'].paginator.next_cursor
+            response = self.guest_client.get(GROUP_URL, {'cursor': cursor})
+            collected.extend(response.context['page_obj'])
+        self.assertEqual(collected, self.ordered)
+        cursor = response.context['page_obj'].paginator.previous_cursor
+        response = self.guest_client.get(GROUP_URL, {'cursor': cursor})
+        self.assertEqual(
+            list(response.context['page_obj']), self.ordered[10:20]
+        )
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Битый курсор отдает первую страницу."""
+        response = self.guest_client.get(INDEX_URL, {'cursor': 'broken!'})
+        self.assertEqual(
+            list(response.context['page_obj']), self.ordered[:10]
+        )
+
+    def test_numbered_pages_on_explicit_request(self):
+        """Нумерованная пагинация включается только явным ?page=N."""
+        response = self.guest_client.get(INDEX_URL, {'page': 3})
+        page_obj = response.context['page_obj']
+        self.assertFalse(getattr(page_obj.paginator, 'is_cursor', False))
+        self.assertEqual(page_obj.number, 3)
+        self.assertEqual(list(page_obj), self.ordered[20:])
@@ -0,0 +1,164 @@
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.db import connection
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Group, Post, User
+from ..search import get_backend
+from ..search.backends import RussianSearchBackend
+from ..search.russian import stem
+
+SEARCH_URL = reverse('posts:search')
+
+
+class PostSearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.group = Group.objects.create(
+            title='Классика',
+            slug='classic',
+            description='Тестовое описание',
+        )
+        cls.war = Post.objects.create(
+            author=cls.user, text='Война и мир, война и снова война'
+        )
+        cls.peace = Post.objects.create(
+            author=cls.user, text='Мир после войны', group=cls.group
+        )
+        cls.other = Post.objects.create(
+            author=cls.user, text='Совсем другой текст'
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, query, **params):
+        response = self.guest_client.get(SEARCH_URL, {'q': query, **params})
+        return response, list(response.context['page_obj'])
+
+    def test_search_ranked(self):
+        """Выдача ранжирована: чаще встречающееся слово выше."""
+        _, posts = self.search('войн')
+        self.assertEqual(posts, [self.war, self.peace])
+
+    def test_search_group_title(self):
+        """Ищется и по названию группы."""
+        _, posts = self.search('классика')
+        self.assertEqual(posts, [self.peace])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при правке и удалении поста."""
+        self.other.text = 'Теперь и тут война'
+        self.other.save()
+        _, posts = self.search('теперь')
+        self.assertEqual(posts, [self.other])
+        self.other.delete()
+        _, posts = self.search('теперь')
+        self.assertEqual(posts, [])
+        self.group.title = 'Современность'
+        self.group.save()
+        _, posts = self.search('современность')
+        self.assertEqual(posts, [self.peace])
+
+    def test_search_cursor_pagination(self):
+        """Выдача листается курсором без повторов."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Роман номер {i}') for i in range(3)
+        )
+        get_backend().rebuild()
+        with override_settings(PER_PAGE_PAGINATOR=2):
+            response, first = self.search('роман')
+            cursor = response.context['page_obj'].paginator.next_cursor
+            self.assertContains(response, 'q=%D1%80%D0%BE%D0%BC%D0%B0%D0%BD')
+            response, second = self.search('роман', cursor=cursor)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse(set(first) & set(second))
+
+    def test_unsafe_query(self):
+        """Синтаксис FTS5 в запросе не ломает поиск."""
+        response, posts = self.search('"мир" (*')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.peace, posts)
+
+    def test_admin_uses_search_index(self):
+        """Поиск в админке идет через индекс."""
+        model_admin = site._registry[Post]
+        request = RequestFactory().get('/admin/posts/post/')
+        queryset, _ = model_admin.get_search_results(
+            request, Post.objects.all(), 'войн'
+        )
+        self.assertEqual(set(queryset), {self.war, self.peace})
+
+
+class RussianSearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.novel = Post.objects.create(
+            author=cls.user, text='Сочинение графа Толстого о войне'
+        )
+        cls.other = Post.objects.create(
+            author=cls.user, text='Заметки о путешествиях'
+        )
+
+    def search(self, query):
+        response = Client().get(SEARCH_URL, {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_stem(self):
+        """Словоформы сводятся к одной основе."""
+        for words in (
+            ('война', 'войны', 'войной'),
+            ('читала', 'читать'),
+            ('красивая', 'красивый', 'Красивейший'),
+        ):
+            with self.subTest(words=words):
+                self.assertEqual(len({stem(word) for word in words}), 1)
+
+    def test_inflected_forms(self):
+        """Находятся другие падежи и формы слова."""
+        self.assertEqual(self.search('войны'), [self.novel])
+        self.assertEqual(self.search('путешествие'), [self.other])
+
+    def test_typo(self):
+        """Опечатка исправляется по триграммам словаря."""
+        self.assertEqual(self.search('Толстово'), [self.novel])
+        self.assertEqual(self.search('совсем незнакомое'), [])
+
+    def test_comments(self):
+        """Ищется по комментариям; совпадение в посте ранжируется выше."""
+        comment = Comment.objects.create(
+            post=self.other, author=self.user, text='Граф был на войне'
+        )
+        self.assertEqual(self.search('войной'), [self.novel, self.other])
+        comment.delete()
+        self.assertEqual(self.search('войной'), [self.novel])
+
+    def test_rebuild(self):
+        """Индекс строится заново с комментариями."""
+        Comment.objects.create(
+            post=self.other, author=self.user, text='Очень понравилось'
+        )
+        self.assertEqual(get_backend().rebuild(), 2)
+        self.assertEqual(self.search('понравится'), [self.other])
+
+    def test_without_trigram_tables(self):
+        """Без словаря триграмм поиск работает, но опечаток не правит."""
+        backend = RussianSearchBackend()
+        with mock.patch.object(
+            connection.introspection, 'table_names',
+            return_value=['posts_search_stem'],
+        ):
+            self.assertFalse(backend.fuzzy)
+            post = Post.objects.create(author=self.user, text='Новое слово')
+            backend.update(post)
+            self.assertEqual(backend.similar_terms('толстово'), [])
+            self.assertEqual(
+                [pk for pk, _ in backend.search('войны')], [self.novel.pk]
+            )
@@ -0,0 +1,230 @@
+import io
+import itertools
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import counters, sharding, transfer
+from ..models import Comment, Group, Post, User, UserStats
+from .utils import run_on_commit
+
+SHARDS = ['default', 'shard_1']
+
+
+def author_on(alias):
+    """ Новый пользователь, чьи посты попадают в сегмент alias. """
+    for number in itertools.count():
+        user = User.objects.create_user(username=f'{alias}_{number}')
+        if sharding.shard_for_author(user.pk, SHARDS) == alias:
+            return user
+
+
+class JumpHashTests(TestCase):
+    def test_new_shard_takes_share(self):
+        """С новым сегментом корзины переезжают только в него."""
+        moved = 0
+        for bucket in range(sharding.BUCKETS):
+            before = sharding.jump_hash(bucket, 2)
+            after = sharding.jump_hash(bucket, 3)
+            self.assertIn(after, (before, 2))
+            moved += after != before
+        self.assertAlmostEqual(moved / sharding.BUCKETS, 1 / 3, delta=0.05)
+
+
+@override_settings(DATABASE_SHARDS=SHARDS)
+class ShardingTests(TestCase):
+    databases = {'default', 'shard_1'}
+
+    def _should_check_constraints(self, connection):
+        # в сегменте нет пользователей, на которых ссылаются посты
+        return connection.alias == 'default' and (
+            super()._should_check_constraints(connection)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='Описание'
+        )
+        self.first = author_on('default')
+        self.second = author_on('shard_1')
+
+    def create_posts(self, count):
+        """ Посты авторов по очереди, каждый следующий старше. """
+        now = timezone.now()
+        posts = []
+        for number in range(count):
+            post = Post.objects.create(
+                author=(self.first, self.second)[number % 2],
+                group=self.group,
+                text=f'Пост {number}',
+            )
+            post.pub_date = now - timedelta(minutes=number)
+            post.save()
+            posts.append(post)
+        return posts
+
+    def test_post_and_comments_on_author_shard(self):
+        post = Post.objects.create(author=self.second, text='Тестовый пост')
+        comment = Comment.objects.create(
+            post=post, author=self.first, text='Комментарий'
+        )
+        self.assertEqual(sharding.shard_for_id(post.pk), 'shard_1')
+        self.assertEqual(sharding.shard_for_id(comment.pk), 'shard_1')
+        self.assertTrue(
+            Comment.objects.using('shard_1').filter(pk=comment.pk).exists()
+        )
+        self.assertFalse(
+            Post.objects.using('default').filter(pk=post.pk).exists()
+        )
+
+    def test_feeds_merge_shards(self):
+        """Главная лента и лента группы сливают сегменты по дате."""
+        posts = self.create_posts(13)
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+        ):
+            with self.subTest(url=url):
+                first = self.client.get(url).context['page_obj']
+                second = self.client.get(
+                    url, {'cursor': first.paginator.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(
+                    [*first.object_list, *second.object_list], posts
+                )
+        self.assertEqual(Post.objects.count(), 13)
+
+    def test_author_pages_use_one_shard(self):
+        """Профиль и пост читаются из сегмента автора."""
+        # версии лент известны: Last-Modified не ищется по базе
+        with run_on_commit(*SHARDS):
+            post = self.create_posts(2)[1]
+            Comment.objects.create(post=post, author=self.first, text='Ответ')
+        with CaptureQueriesContext(connections['default']) as queries:
+            self.client.get(
+                reverse('posts:profile', args=[self.second.username])
+            )
+            response = self.client.get(
+                reverse('posts:post_detail', args=[post.pk])
+            )
+        self.assertContains(response, 'Ответ')
+        self.assertFalse([q for q in queries if 'posts_post' in q['sql']])
+
+    def test_batch_reads_owning_shards(self):
+        """Пакет API ищет каждый ключ только в его сегменте."""
+        posts = self.create_posts(4)
+        ids = ','.join(str(post.pk) for post in reversed(posts))
+        with CaptureQueriesContext(connections['default']) as default:
+            with CaptureQueriesContext(connections['shard_1']) as shard:
+                response = self.client.get(
+                    reverse('posts:api_batch'), {'ids': ids, 'fields': 'id'}
+                )
+        self.assertEqual(
+            [post['id'] for post in response.json()['results']],
+            ids.split(','),
+        )
+        self.assertEqual((len(default), len(shard)), (1, 1))
+        with CaptureQueriesContext(connections['shard_1']) as shard:
+            response = self.client.get(
+                reverse('posts:api_index'), {'fields': 'id,author,group'}
+            )
+        self.assertEqual(response.json()['results'][0]['author'], (
+            self.first.username
+        ))
+        self.assertEqual(len(shard), 1)
+
+    def test_iterator_streams_shards(self):
+        """iterator() сливает потоки сегментов, не собирая их в память."""
+        posts = self.create_posts(7)
+        with mock.patch.object(
+            sharding.ShardedQuerySet, '_gather', side_effect=AssertionError
+        ):
+            streamed = list(Post.objects.iterator(chunk_size=2))
+            ordered = list(Post.objects.order_by('pk').iterator(chunk_size=2))
+        self.assertEqual(streamed, posts)
+        self.assertEqual(ordered, sorted(posts, key=lambda post: post.pk))
+
+    def test_id_collision_retried(self):
+        """Занятый другим писателем ключ выделяется заново."""
+        taken = Post.objects.create(author=self.second, text='Первый')
+        new_id = sharding.new_id
+        fresh = new_id(Post, sharding.bucket_of(taken.pk), 'shard_1')
+        with mock.patch.object(
+            sharding, 'new_id', side_effect=[taken.pk, fresh]
+        ):
+            post = Post(author=self.second, text='Второй')
+            post.save()
+        self.assertEqual(post.pk, fresh)
+        self.assertEqual(Post.objects.get(pk=taken.pk).text, 'Первый')
+        self.assertEqual(Post.objects.get(pk=post.pk).text, 'Второй')
+
+    def test_counters_sum_shards(self):
+        """Счетчики пользователя учитывают строки всех сегментов."""
+        post = Post.objects.create(author=self.second, text='Пост')
+        Comment.objects.create(post=post, author=self.second, text='Ответ')
+        Comment.objects.create(post=post, author=self.first, text='Ответ')
+        other = Post.objects.create(author=self.first, text='Пост')
+        Comment.objects.create(post=other, author=self.second, text='Ответ')
+        expected = {'posts_count': 1, 'comments_count': 2}
+        for recount in (False, True):
+            with self.subTest(recount=recount):
+                if recount:
+                    counters.recount_users()
+                stats = UserStats.objects.filter(user=self.second).values(
+                    *expected
+                ).get()
+                self.assertEqual(stats, expected)
+
+    def test_admin_search_finds_shard_posts(self):
+        """Поиск в админке находит посты всех сегментов."""
+        posts = self.create_posts(2)
+        request = RequestFactory().get('/admin/posts/post/')
+        queryset, _ = site._registry[Post].get_search_results(
+            request, Post.objects.all(), 'Пост'
+        )
+        self.assertEqual(set(queryset), set(posts))
+
+    def test_import_routes_shards(self):
+        """Загрузка выгрузки раскладывает строки по сегментам."""
+        with override_settings(DATABASE_SHARDS=['default']):
+            posts = self.create_posts(4)
+            Comment.objects.create(
+                post=posts[1], author=self.first, text='Ответ'
+            )
+        sharded = Post.objects.create(author=self.second, text='Новый')
+        Comment.objects.create(post=sharded, author=self.first, text='Ответ')
+        stream = io.StringIO()
+        list(transfer.export_rows(stream))
+        Post.objects.all().delete()
+        stream.seek(0)
+        transfer.import_rows(stream, ignore_conflicts=True)
+        self.assertEqual(Post.objects.using('shard_1').count(), 3)
+        self.assertEqual(Comment.objects.using('shard_1').count(), 2)
+        self.assertEqual(Post.objects.using('default').count(), 2)
+        self.assertEqual(Comment.objects.using('default').count(), 0)
+
+    def test_reshard(self):
+        """Строки из одной базы переезжают в назначенные сегменты."""
+        with override_settings(DATABASE_SHARDS=['default']):
+            posts = self.create_posts(4)
+            Comment.objects.create(
+                post=posts[1], author=self.first, text='Ответ'
+            )
+        call_command('reshard', stdout=io.StringIO())
+        self.assertEqual(Post.objects.using('shard_1').count(), 2)
+        self.assertEqual(Comment.objects.using('shard_1').count(), 1)
+        self.assertEqual(Post.objects.using('default').count(), 2)
+        # старые ключи без корзины ищутся во всех сегментах
+        response = self.client.get(
+            reverse('posts:post_detail', args=[posts[1].pk])
+        )
+        self.assertContains(response, 'Ответ')
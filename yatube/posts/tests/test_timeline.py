@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import timeline
+from ..models import Follow, Post, TimelineEntry, User
+
+FOLLOW_URL = reverse('posts:follow_index')
+
+
+@override_settings(FOLLOW_TIMELINE_FANOUT=True, FOLLOW_TIMELINE_FANOUT_LIMIT=2)
+class FollowTimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.other = User.objects.create_user(username='other')
+        cls.author = User.objects.create_user(username='author')
+        cls.star = User.objects.create_user(username='star')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.user, author=self.star)
+        Follow.objects.create(user=self.other, author=self.star)
+
+    def feed(self):
+        response = self.authorized_client.get(FOLLOW_URL)
+        return list(response.context['page_obj'])
+
+    def test_new_post_fanned_out_to_followers(self):
+        """Новый пост записывается в ленты подписчиков."""
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists()
+        )
+        self.assertEqual(self.feed(), [post])
+
+    def test_heavy_author_merged_on_read(self):
+        """Посты популярного автора не копируются, но попадают в ленту."""
+        light = Post.objects.create(author=self.author, text='Пост 1')
+        heavy = Post.objects.create(author=self.star, text='Пост 2')
+        self.assertFalse(heavy.timeline_entries.exists())
+        self.assertEqual(self.feed(), [heavy, light])
+
+    def test_follow_backfills_and_unfollow_purges(self):
+        """Подписка переносит посты автора в ленту, отписка убирает."""
+        newcomer = User.objects.create_user(username='newcomer')
+        post = Post.objects.create(author=newcomer, text='Старый пост')
+        Follow.objects.create(user=self.user, author=newcomer)
+        self.assertIn(post, self.feed())
+        Follow.objects.get(user=self.user, author=newcomer).delete()
+        self.assertNotIn(post, self.feed())
+
+    @override_settings(PER_PAGE_PAGINATOR=2)
+    def test_pages_merge_entries_and_heavy_authors(self):
+        """Курсор листает записи ленты вперемешку с популярными авторами."""
+        now = timezone.now()
+        posts = []
+        for number in range(5):
+            post = Post.objects.create(
+                author=(self.author, self.star)[number % 2],
+                text=f'Пост {number}',
+            )
+            post.pub_date = now - timedelta(minutes=number)
+            post.save()
+            posts.append(post)
+        pages = []
+        response = self.authorized_client.get(FOLLOW_URL)
+        while True:
+            pages.append(list(response.context['page_obj']))
+            cursor = response.context['page_obj'].paginator.next_cursor
+            if cursor is None:
+                break
+            response = self.authorized_client.get(
+                FOLLOW_URL, {'cursor': cursor}
+            )
+        self.assertEqual(sum(pages, []), posts)
+        previous = response.context['page_obj'].paginator.previous_cursor
+        response = self.authorized_client.get(
+            FOLLOW_URL, {'cursor': previous}
+        )
+        self.assertEqual(list(response.context['page_obj']), pages[-2])
+
+    def test_edited_post_moves_in_feed(self):
+        old = Post.objects.create(author=self.author, text='Старый пост')
+        Post.objects.create(author=self.author, text='Новый пост')
+        old.pub_date = timezone.now() + timedelta(minutes=1)
+        old.save()
+        self.assertEqual(self.feed()[0], old)
+
+    def test_author_below_limit_backfilled(self):
+        """Посты, написанные популярным автором, возвращаются в ленты."""
+        post = Post.objects.create(author=self.star, text='Пост звезды')
+        Follow.objects.get(user=self.other, author=self.star).delete()
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists()
+        )
+        self.assertEqual(self.feed(), [post])
+
+    @override_settings(DATABASE_SHARDS=['default', 'shard_1'])
+    def test_sharding_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            timeline.is_enabled()
@@ -0,0 +1,78 @@
+import datetime as dt
+import io
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import Comment, Follow, Group, Post, User
+from ..search import get_backend
+
+PUB_DATE = timezone.make_aware(dt.datetime(1854, 3, 14))
+
+
+class TransferTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'yatube.jsonl.gz')
+        self.author = User.objects.create_user(username='leo')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Дневники', slug='diaries', description='Тестовое описание'
+        )
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Война и мир'
+        )
+        Post.objects.filter(pk=self.post.pk).update(pub_date=PUB_DATE)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Прочитал'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def reload(self, *args):
+        call_command('export_yatube', self.path, stderr=io.StringIO())
+        for model in (User, Group):
+            model.objects.all().delete()
+        call_command(
+            'import_yatube', self.path, *args, stdout=io.StringIO()
+        )
+
+    def test_round_trip(self):
+        """Выгрузка загружается обратно с теми же ключами и датами."""
+        self.reload('--batch-size', '1', '--transaction-size', '2')
+        post = Post.objects.select_related('author__stats').get()
+        self.assertEqual(post.pk, self.post.pk)
+        self.assertEqual(post.pub_date, PUB_DATE)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(Comment.objects.get().post, post)
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.author)
+            .exists()
+        )
+
+    def test_derived_data_refreshed(self):
+        """После загрузки пересчитаны счетчики и поисковый индекс."""
+        self.reload()
+        post = Post.objects.select_related('author__stats').get()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.author.stats.posts_count, 1)
+        self.assertEqual(post.author.stats.followers_count, 1)
+        hits = get_backend().search('войны')
+        self.assertEqual([pk for pk, _ in hits], [post.pk])
+
+    def test_ignore_conflicts(self):
+        """Повторная загрузка пропускает уже существующие строки."""
+        call_command('export_yatube', self.path, stderr=io.StringIO())
+        call_command(
+            'import_yatube', self.path, '--ignore-conflicts',
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 1)
+        new = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertGreater(new.pk, self.post.pk)
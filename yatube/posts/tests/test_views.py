@@ -1,9 +1,22 @@
+import time
+from unittest import mock
+
 from django import forms
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client
+from django.db import connection
+from django.test import (
+    TestCase, TransactionTestCase, Client, override_settings
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import http_date
+
+from core import prometheus
 
-from ..models import Group, Post, User, Follow
+from .. import page_cache
+from ..models import Group, Post, User, Follow, Comment
+from .utils import QueryBudgetMixin, run_on_commit
 
 INDEX_URL = reverse('posts:index')
 CREATE_URL = reverse('posts:post_create')
@@ -61,6 +74,7 @@ class PostPagesTests(TestCase):
     def setUp(self):
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
+        cache.clear()
 
     def test_pages_uses_correct_template(self):
         """URL-адрес использует соответствующий шаблон."""
@@ -175,6 +189,32 @@ class PostPagesTests(TestCase):
         Post.objects.all().delete()
         self.assertTrue(response.content)
 
+    def test_feed_cache_varies_on_page(self):
+        '''Кэш ленты не отдает первую страницу вместо второй'''
+        first = self.client.get(INDEX_URL)
+        second = self.client.get(INDEX_URL + '?page=2')
+        self.assertContains(first, 'Тестовый пост 13')
+        self.assertNotContains(second, 'Тестовый пост 13')
+        self.assertContains(second, 'Тестовый пост 0')
+
+    def test_feed_cache_invalidated_by_signals(self):
+        '''Кэш ленты сбрасывается при изменении постов'''
+        self.client.get(GROUP_2_URL)
+        Post.objects.filter(group=self.group_2).update(text='Без сигналов')
+        response = self.client.get(GROUP_2_URL)
+        self.assertContains(response, 'Тестовый пост 13')
+        with run_on_commit():
+            post = Post.objects.create(
+                author=self.user, text='Новый пост', group=self.group_2
+            )
+        response = self.client.get(GROUP_2_URL)
+        self.assertContains(response, 'Новый пост')
+        post.group = self.group_1
+        with run_on_commit():
+            post.save()
+        response = self.client.get(GROUP_2_URL)
+        self.assertNotContains(response, 'Новый пост')
+
     def test_follow_auth(self):
         ''' Авторизированный пользователь может подписываться и отписываться
         '''
@@ -222,3 +262,243 @@ class PostPagesTests(TestCase):
             FOLLOW_URL,
             follow=True)
         self.assertNotIn(post, response_2.context['page_obj'].object_list)
+
+
+class FeedQueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        # версии лент нужны запросам страниц: без них Last-Modified
+        # ищется по базе
+        with run_on_commit():
+            cls.group = Group.objects.create(
+                title='Тестовая группа 1',
+                slug='test-slug-1',
+                description='Тестовое описание 1',
+            )
+            Post.objects.create(author=cls.user, text='Пост для профиля')
+        authors = [
+            User.objects.create_user(username=f'author_{i}')
+            for i in range(10)
+        ]
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Тестовый пост {i}', group=cls.group)
+            for i, author in enumerate(authors)
+        )
+        Follow.objects.bulk_create(
+            Follow(user=cls.user, author=author) for author in authors
+        )
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_feeds_query_budget(self):
+        """Ленты не делают отдельных запросов на каждый пост."""
+        feeds = {
+            INDEX_URL: 1,
+            GROUP_1_URL: 2,
+            PROFILE_URL: 3,
+        }
+        for url, budget in feeds.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.client, url, budget)
+        # сессия и пользователь + лента
+        self.assertQueryBudget(self.authorized_client, FOLLOW_URL, 3)
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        # страницы отрисовываются позже последней правки лент
+        later = time.time() + 2
+        patcher = mock.patch.object(page_cache, 'time')
+        patcher.start().time.return_value = later
+        self.addCleanup(patcher.stop)
+
+    def test_cached_with_validators(self):
+        """Повторный анонимный запрос отдается из кэша без запросов."""
+        for url in (INDEX_URL, PROFILE_URL):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(second.content, first.content)
+                self.assertEqual(second['ETag'], first['ETag'])
+                self.assertTrue(second.has_header('Last-Modified'))
+
+    def test_not_modified(self):
+        """Совпавший валидатор получает 304 без рендеринга."""
+        response = self.client.get(INDEX_URL)
+        with self.assertNumQueries(0):
+            by_etag = self.client.get(
+                INDEX_URL, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+            by_date = self.client.get(
+                INDEX_URL, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+            )
+        for conditional in (by_etag, by_date):
+            self.assertEqual(conditional.status_code, 304)
+            self.assertEqual(conditional.content, b'')
+
+    def test_key_ignores_other_params(self):
+        """Посторонние параметры не плодят записи кэша."""
+        first = self.client.get(INDEX_URL, {'page': 1})
+        with self.assertNumQueries(0):
+            second = self.client.get(INDEX_URL, {'page': 1, 'utm': 'x'})
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_same_second_change_without_last_modified(self):
+        """Страница, отрисованная в секунду правки, 304 по дате не дает."""
+        page_cache.time.time.return_value = time.time() - 2
+        response = self.client.get(INDEX_URL)
+        self.assertFalse(response.has_header('Last-Modified'))
+        response = self.client.get(
+            INDEX_URL, HTTP_IF_MODIFIED_SINCE=http_date(time.time())
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalidated_by_rename(self):
+        """Смена имени автора сбрасывает страницы с его постами."""
+        self.client.get(INDEX_URL)
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Лев'
+        user.last_name = 'Толстой'
+        with run_on_commit():
+            user.save()
+        self.assertContains(self.client.get(INDEX_URL), 'Лев Толстой')
+
+    def test_invalidated_by_signals(self):
+        """Новые комментарии и подписки сбрасывают закэшированные страницы."""
+        etag = self.client.get(INDEX_URL)['ETag']
+        with run_on_commit():
+            Comment.objects.create(
+                post=self.post, author=self.user, text='Комментарий'
+            )
+        # страница рендерится заново, но совпадает побайтно с прежней
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(INDEX_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertTrue(queries)
+        self.assertEqual(response.status_code, 304)
+        with run_on_commit():
+            Post.objects.create(author=self.user, text='Новый пост')
+        response = self.client.get(INDEX_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        follower = User.objects.create_user(username='follower')
+        response = self.client.get(PROFILE_URL)
+        self.assertContains(response, 'Подписаться')
+        with run_on_commit():
+            Follow.objects.create(user=follower, author=self.user)
+        self.assertContains(self.client.get(PROFILE_URL), 'Отписаться')
+
+    def test_authorized_not_cached(self):
+        client = Client()
+        client.force_login(self.user)
+        client.get(INDEX_URL)
+        response = client.get(INDEX_URL)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIsNotNone(response.context)
+
+
+class PostDetailQueryTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.group = Group.objects.create(
+            title='Тестовая группа 1',
+            slug='test-slug-1',
+            description='Тестовое описание 1',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тестовый пост', group=cls.group
+        )
+        for i in range(5):
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'reader_{i}'),
+                text=f'Комментарий {i}',
+            )
+        cls.url = reverse('posts:post_detail', kwargs={'post_id': cls.post.pk})
+
+    def test_post_detail_query_budget(self):
+        """Пост, автор, группа и комментарии грузятся двумя запросами."""
+        response = self.assertQueryBudget(self.client, self.url, 2)
+        self.assertEqual(len(response.context['comments']), 5)
+
+    @override_settings(COMMENTS_PER_PAGE=3)
+    def test_post_detail_comments_paginated(self):
+        """Длинные обсуждения листаются курсором."""
+        response = self.assertQueryBudget(self.client, self.url, 2)
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            ['Комментарий 0', 'Комментарий 1', 'Комментарий 2'],
+        )
+        response = self.client.get(
+            self.url, {'cursor': comments.paginator.next_cursor}
+        )
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Комментарий 3', 'Комментарий 4'],
+        )
+
+
+@override_settings(WRITE_QUEUE_ASYNC=True)
+class WriteQueueViewsTests(TransactionTestCase):
+    """ Вью записи через поток-писатель, как в бою: в dev записи
+    выполняются в потоке запроса (WRITE_QUEUE_ASYNC = False).
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='HasNoName')
+        self.author = User.objects.create_user(username='following')
+        self.client.force_login(self.user)
+
+    def batches(self):
+        return prometheus.collect().get(
+            (prometheus.WRITE_BATCH_SIZE.name, ()), [0]
+        )[-1]
+
+    def test_writes_go_through_writer(self):
+        """Создание, правка, комментарий и подписки — пачками писателя."""
+        before = self.batches()
+        self.client.post(CREATE_URL, {'text': 'Новый пост'})
+        post = Post.objects.get(text='Новый пост')
+        self.client.post(
+            reverse('posts:post_edit', args=[post.pk]),
+            {'text': 'Исправленный пост'},
+        )
+        self.client.post(
+            reverse('posts:add_comment', args=[post.pk]),
+            {'text': 'Комментарий'},
+        )
+        self.client.post(reverse('posts:profile_follow', args=['following']))
+        self.assertTrue(
+            Follow.objects.filter(user=self.user, author=self.author).exists()
+        )
+        self.client.post(
+            reverse('posts:profile_unfollow', args=['following'])
+        )
+        self.assertEqual(self.batches() - before, 5)
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Исправленный пост')
+        self.assertEqual(post.comments_count, 1)
+        self.assertFalse(Follow.objects.exists())
+        self.user.stats.refresh_from_db()
+        self.assertEqual(
+            (self.user.stats.posts_count, self.user.stats.following_count),
+            (1, 0),
+        )
+        # кэш лент сброшен после фиксации транзакций писателя
+        self.assertContains(self.client.get(INDEX_URL), 'Исправленный пост')
@@ -0,0 +1,45 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test.utils import CaptureQueriesContext
+
+
+@contextmanager
+def run_on_commit(*aliases):
+    """ Выполняет transaction.on_commit(), зарегистрированные в блоке.
+
+    Транзакцию TestCase никто не фиксирует, и без этого кэш лент
+    и метрики не видели бы записей теста.
+    """
+    aliases = aliases or (DEFAULT_DB_ALIAS,)
+    starts = {
+        alias: len(connections[alias].run_on_commit) for alias in aliases
+    }
+    try:
+        yield
+    finally:
+        for alias, start in starts.items():
+            callbacks = connections[alias].run_on_commit
+            # обработчики могут регистрировать новые
+            while len(callbacks) > start:
+                _, function = callbacks.pop(start)
+                function()
+
+
+class QueryBudgetMixin:
+    """ Проверка бюджета SQL-запросов на одну страницу ленты """
+
+    def assertQueryBudget(self, client, url, budget, data=None):
+        """ GET-запрос к url должен уложиться в budget SQL-запросов.
+
+        Бюджет не зависит от числа постов на странице: любой запрос
+        внутри цикла по page_obj (N+1) сразу выводит за его пределы.
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url, data)
+        queries = '\n'.join(query['sql'] for query in context.captured_queries)
+        self.assertLessEqual(
+            len(context), budget,
+            f'{url}: {len(context)} запросов вместо {budget}:\n{queries}'
+        )
+        return response
@@ -0,0 +1,187 @@
+import io
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import Image, ImageOps
+from sorl.thumbnail import get_thumbnail
+
+from core import prometheus, writes
+
+from . import feed_cache
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+}
+EXTENSIONS = {
+    'AVIF': 'avif',
+    'WEBP': 'webp',
+    'JPEG': 'jpg',
+}
+
+_executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """ Пул фоновых воркеров; его очередь заменяет внешний брокер. """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def drain() -> None:
+    """ Дожидается поставленных генераций и останавливает пул;
+    следующая генерация создаст новый.
+    """
+    global _executor
+    executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def render(post: Post) -> dict:
+    """ Генерирует все миниатюры из THUMBNAIL_RENDITIONS. """
+    result = {}
+    for name, (geometry, options) in settings.THUMBNAIL_RENDITIONS.items():
+        image = get_thumbnail(post.image, geometry, **options)
+        result[name] = {
+            'url': image.url,
+            'width': image.width,
+            'height': image.height,
+        }
+    return result
+
+
+def available_formats() -> list:
+    """ Форматы адаптивного набора, которые умеет сохранять Pillow.
+
+    AVIF появляется, только если он поддержан сборкой Pillow
+    (или подключен pillow-avif-plugin). JPEG есть всегда: это srcset
+    запасного <img> для браузеров без остальных форматов.
+    """
+    Image.init()
+    formats = [
+        format_ for format_ in settings.THUMBNAIL_RESPONSIVE_FORMATS
+        if format_ in Image.SAVE
+    ]
+    if 'JPEG' not in formats:
+        formats.append('JPEG')
+    return formats
+
+
+def _widths(source_width: int) -> list:
+    widths = settings.THUMBNAIL_RESPONSIVE_WIDTHS
+    # не растягиваем картинку сверх исходной ширины,
+    # но хотя бы одну, самую узкую, миниатюру делаем всегда
+    return [width for width in widths if width <= source_width] or [
+        min(widths)
+    ]
+
+
+def render_responsive(post: Post) -> dict:
+    """ Адаптивный набор: {формат: [{'url': ..., 'width': ...}, ...]}. """
+    ratio_width, ratio_height = settings.THUMBNAIL_RESPONSIVE_RATIO
+    stem = os.path.splitext(os.path.basename(post.image.name))[0]
+    post.image.open('rb')
+    try:
+        source = Image.open(post.image)
+        source.load()
+    finally:
+        post.image.close()
+    source = source.convert('RGB')
+    result = {}
+    for format_ in available_formats():
+        variants = []
+        for width in _widths(source.width):
+            height = max(1, round(width * ratio_height / ratio_width))
+            image = ImageOps.fit(source, (width, height), Image.LANCZOS)
+            data = io.BytesIO()
+            image.save(
+                data, format_, quality=settings.THUMBNAIL_RESPONSIVE_QUALITY
+            )
+            name = default_storage.save(
+                f'posts/renditions/{post.pk}/{stem}-{width}.'
+                f'{EXTENSIONS[format_]}',
+                ContentFile(data.getvalue()),
+            )
+            variants.append({
+                'url': default_storage.url(name),
+                'name': name,
+                'width': width,
+                'height': height,
+            })
+        result[format_] = variants
+    return result
+
+
+def delete_responsive(thumbnails: dict) -> None:
+    for variants in thumbnails.get('sources', {}).values():
+        for variant in variants:
+            default_storage.delete(variant['name'])
+
+
+def generate(post_id: int) -> None:
+    """ Генерирует миниатюры поста и сохраняет их адреса в Post. """
+    post = Post.objects.for_pk(post_id).filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    with prometheus.THUMBNAIL_SECONDS.time():
+        thumbnails = render(post)
+        thumbnails['sources'] = render_responsive(post)
+    # update() вместо save(): не трогаем pub_date и сигналы поста
+    Post.objects.for_pk(post_id).filter(pk=post_id).update(
+        thumbnails=json.dumps(thumbnails)
+    )
+    using = post._state.db
+    writes.after_commit(delete_responsive, post.get_thumbnails(), using=using)
+    feed_cache.invalidate(*feed_cache.post_scopes(post), using=using)
+
+
+def _run(post_id: int) -> None:
+    try:
+        generate(post_id)
+    except Exception:
+        logger.exception('Ошибка генерации миниатюр поста %s', post_id)
+    finally:
+        connections.close_all()
+
+
+def schedule(post: Post) -> None:
+    """ Ставит генерацию миниатюр в очередь после смены картинки.
+
+    Старые адреса сбрасываются сразу, до готовности новых шаблоны
+    показывают исходную картинку; их файлы удаляются после фиксации
+    транзакции. При THUMBNAIL_ASYNC = False миниатюры генерируются
+    синхронно.
+    """
+    posts = Post.objects.for_pk(post.pk).filter(pk=post.pk)
+    # адреса из базы, а не из post: повтор транзакции писателя
+    # застал бы post уже без них
+    previous = posts.values_list('thumbnails', flat=True).first()
+    post.thumbnails = ''
+    posts.update(thumbnails='')
+    using = post._state.db
+    if previous:
+        writes.after_commit(
+            delete_responsive, json.loads(previous), using=using
+        )
+    if not post.image:
+        return
+    if not settings.THUMBNAIL_ASYNC:
+        generate(post.pk)
+        return
+    writes.after_commit(get_executor().submit, _run, post.pk, using=using)
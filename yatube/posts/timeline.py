@@ -0,0 +1,197 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
+from django.http import HttpRequest
+
+from . import paginators, sharding
+from .models import Post, TimelineEntry, User, UserStats
+from .paginators import CURSOR_PARAM, PAGE_PARAM, PREVIOUS, CursorPaginator
+
+
+def is_enabled() -> bool:
+    if settings.FOLLOW_TIMELINE_FANOUT and sharding.enabled():
+        # записи лент в default ссылаются на посты во всех сегментах
+        raise ImproperlyConfigured(
+            'FOLLOW_TIMELINE_FANOUT не работает с DATABASE_SHARDS'
+        )
+    return settings.FOLLOW_TIMELINE_FANOUT
+
+
+def _heavy(users):
+    return UserStats.objects.filter(
+        user__in=users,
+        followers_count__gte=settings.FOLLOW_TIMELINE_FANOUT_LIMIT,
+    )
+
+
+def _is_heavy(author) -> bool:
+    return _heavy([author]).exists()
+
+
+def heavy_authors(user):
+    """ Авторы из подписок user, чьи посты не раскладываются по лентам """
+    return _heavy(user.follower.values('author')).values('user')
+
+
+def fan_out(post: Post) -> None:
+    """ Раскладывает новый пост по лентам подписчиков автора. """
+    if not is_enabled() or _is_heavy(post.author):
+        return
+    followers = post.author.following.values_list('user', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def move(post: Post) -> None:
+    """ Переносит отредактированный пост на его новое место в лентах. """
+    if is_enabled():
+        TimelineEntry.objects.filter(post=post).update(pub_date=post.pub_date)
+
+
+def _backfill(users, author) -> None:
+    posts = list(
+        author.posts.values_list('pk', 'pub_date')
+        [:settings.FOLLOW_TIMELINE_BACKFILL]
+    )
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=date)
+            for user_id in users
+            for post_id, date in posts
+        ),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user, author) -> None:
+    """ После подписки переносит в ленту последние посты автора. """
+    if not is_enabled() or _is_heavy(author):
+        return
+    _backfill([user.pk], author)
+
+
+def unfollowed(author) -> None:
+    """ Автор опустился ниже порога: посты, написанные им популярным,
+    не раскладывались и теперь переносятся в ленты подписчиков.
+    """
+    if not is_enabled():
+        return
+    followers = UserStats.objects.filter(user=author).values_list(
+        'followers_count', flat=True
+    ).first()
+    if followers != settings.FOLLOW_TIMELINE_FANOUT_LIMIT - 1:
+        return
+    _backfill(author.following.values_list('user', flat=True), author)
+
+
+def purge(user, author) -> None:
+    """ После отписки убирает посты автора из ленты. """
+    TimelineEntry.objects.filter(user=user, post__author=author).delete()
+
+
+def rebuild(user) -> None:
+    """ Пересобирает ленту пользователя с нуля. """
+    TimelineEntry.objects.filter(user=user).delete()
+    for author in User.objects.filter(following__user=user):
+        backfill(user, author)
+
+
+def follow_feed(user):
+    """ Посты для /follow/.
+
+    С fan-out это чтение готовой ленты по индексу (user, post), к которому
+    подмешиваются посты популярных авторов; без него лента собирается
+    по подпискам при чтении.
+    """
+    posts = Post.objects.feed()
+    if not is_enabled():
+        authors = user.follower.values_list('author', flat=True)
+        if sharding.enabled():
+            # подписки в default, подзапрос к ним в сегменте невозможен
+            authors = list(authors)
+        return posts.filter(author__id__in=authors)
+    entries = TimelineEntry.objects.filter(user=user).values('post')
+    return posts.filter(
+        Q(pk__in=entries) | Q(author__in=heavy_authors(user))
+    )
+
+
+class TimelinePaginator(CursorPaginator):
+    """ Курсорная пагинация материализованной ленты подписок.
+
+    Ключи страницы (pub_date, post) читаются диапазоном индекса
+    timeline_user_pub_date_idx и сливаются с такими же страницами
+    популярных авторов (по индексу post_author_pub_date_idx на автора);
+    сами посты догружаются из object_list одним запросом, как в поиске.
+    """
+
+    # post_id, а не post: иначе сортировка пошла бы по Post.Meta.ordering
+    ENTRY_ORDERING = ('-pub_date', 'post_id')
+
+    def __init__(self, object_list, per_page, user):
+        super().__init__(object_list, per_page, ('-pub_date', 'pk'))
+        self.user = user
+
+    def entries_queryset(self, direction, values):
+        """ Записи ленты для страницы в сторону direction от values. """
+        backwards = direction == PREVIOUS
+        entries = TimelineEntry.objects.filter(user=self.user)
+        if values is not None:
+            entries = entries.filter(
+                self._keyset_filter(values, backwards, self.ENTRY_ORDERING)
+            )
+        ordering = self._directed(backwards, self.ENTRY_ORDERING)
+        return entries.order_by(*ordering)[:self.per_page + 1]
+
+    def author_queryset(self, author_id, direction, values):
+        """ Посты популярного автора для той же страницы. """
+        backwards = direction == PREVIOUS
+        posts = Post.objects.filter(author_id=author_id)
+        if values is not None:
+            posts = posts.filter(self._keyset_filter(values, backwards))
+        ordering = self._directed(backwards)
+        return posts.order_by(*ordering)[:self.per_page + 1]
+
+    def _page_queryset(self, direction, values):
+        keys = dict(
+            self.entries_queryset(direction, values)
+            .values_list('post_id', 'pub_date')
+        )
+        # запрос на автора: author IN (...) сортировал бы все их посты
+        for author_id in heavy_authors(self.user).values_list(
+            'user', flat=True
+        ):
+            keys.update(
+                self.author_queryset(author_id, direction, values)
+                .values_list('pk', 'pub_date')
+            )
+        # по убыванию даты и возрастанию pk, назад — наоборот
+        ids = sorted(
+            keys,
+            key=lambda pk: (keys[pk], -pk),
+            reverse=direction != PREVIOUS,
+        )[:self.per_page + 1]
+        posts = self.object_list.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def get_paginator(user, posts, per_page) -> CursorPaginator:
+    """ Пагинатор ленты подписок user по постам posts (follow_feed). """
+    if is_enabled():
+        return TimelinePaginator(posts, per_page, user)
+    return CursorPaginator(posts, per_page)
+
+
+def get_page_obj(request: HttpRequest, user):
+    """ Страница /follow/; с fan-out курсор листает записи ленты. """
+    posts = follow_feed(user)
+    if PAGE_PARAM in request.GET:
+        return paginators.get_page_obj(request, posts)
+    paginator = get_paginator(user, posts, settings.PER_PAGE_PAGINATOR)
+    return paginator.get_page(request.GET.get(CURSOR_PARAM))
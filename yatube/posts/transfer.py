@@ -0,0 +1,247 @@
+""" Потоковые выгрузка и загрузка данных в формате JSON Lines.
+
+Каждая строка — объект в формате сериализатора Django
+({"model": ..., "pk": ..., "fields": {...}}). Файл читается построчно,
+в памяти держится только текущая пачка объектов, поэтому так можно
+переносить миллионы постов. Производные данные (счетчики, поисковый
+индекс, ленты подписок, миниатюры) не выгружаются и после загрузки
+пересчитываются.
+"""
+import gzip
+import json
+import sys
+import time
+from contextlib import ExitStack, contextmanager, nullcontext
+
+from django.apps import apps
+from django.conf import settings
+from django.core import serializers
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.db.models import signals
+
+from . import counters, search, sharding, timeline
+from .models import User
+
+# порядок важен: при загрузке связанные объекты идут раньше ссылающихся
+MODELS = (
+    settings.AUTH_USER_MODEL,
+    'posts.group',
+    'posts.post',
+    'posts.comment',
+    'posts.follow',
+)
+
+# производные поля: пересчитываются после загрузки
+DERIVED_FIELDS = {
+    'posts.post': ('comments_count', 'thumbnails'),
+}
+
+MODEL_SIGNALS = (
+    signals.pre_save,
+    signals.post_save,
+    signals.pre_delete,
+    signals.post_delete,
+    signals.m2m_changed,
+)
+
+
+def open_stream(path: str, mode: str):
+    """ Файл JSON Lines; '-' — stdin/stdout, '.gz' — сжатый файл. """
+    if path == '-':
+        stream = sys.stdin if mode == 'r' else sys.stdout
+        return nullcontext(stream)
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def get_models() -> list:
+    return [apps.get_model(label) for label in MODELS]
+
+
+def _fields(model) -> list:
+    opts = model._meta
+    derived = DERIVED_FIELDS.get(opts.label_lower, ())
+    return [
+        field.name for field in [*opts.local_fields, *opts.many_to_many]
+        if not field.primary_key and field.name not in derived
+    ]
+
+
+def export_rows(stream, batch_size=1000):
+    """ Пишет все объекты MODELS в stream; отдает число строк
+    по каждой модели по мере выгрузки.
+    """
+    for model in get_models():
+        fields = _fields(model)
+        total = 0
+        batch = []
+        for obj in model._default_manager.order_by('pk').iterator(
+            chunk_size=batch_size
+        ):
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                total += _write(stream, batch, fields)
+                batch = []
+        total += _write(stream, batch, fields)
+        yield model, total
+
+
+def _write(stream, objects, fields) -> int:
+    for row in serializers.serialize('python', objects, fields=fields):
+        stream.write(
+            json.dumps(row, ensure_ascii=False, cls=DjangoJSONEncoder)
+        )
+        stream.write('\n')
+    return len(objects)
+
+
+@contextmanager
+def muted_signals():
+    """ Отключает обработчики сигналов моделей на время загрузки.
+
+    bulk_create сам сигналов не шлет, но сохранение связей many-to-many
+    и обработчики других приложений их бы вызвали.
+    """
+    saved = [(signal, signal.receivers) for signal in MODEL_SIGNALS]
+    for signal in MODEL_SIGNALS:
+        signal.receivers = []
+        signal.sender_receivers_cache.clear()
+    try:
+        yield
+    finally:
+        for signal, receivers in saved:
+            signal.receivers = receivers
+            signal.sender_receivers_cache.clear()
+
+
+@contextmanager
+def kept_dates():
+    """ Не дает auto_now и auto_now_add затереть даты из файла:
+    bulk_create, в отличие от loaddata, их не пропускает.
+    """
+    fields = [
+        field for model in get_models()
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _read(stream):
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            raise ValueError(f'Строка {number}: {error}') from error
+
+
+def _batches(stream, batch_size):
+    """ Пачки строк одной модели не длиннее batch_size. """
+    rows = []
+    for row in _read(stream):
+        if rows and (
+            row['model'] != rows[0]['model'] or len(rows) >= batch_size
+        ):
+            yield rows
+            rows = []
+        rows.append(row)
+    if rows:
+        yield rows
+
+
+@contextmanager
+def atomic_all():
+    """ Одна транзакция в default и в каждом сегменте. """
+    with ExitStack() as stack:
+        for alias in dict.fromkeys(
+            [DEFAULT_DB_ALIAS, *settings.DATABASE_SHARDS]
+        ):
+            stack.enter_context(transaction.atomic(using=alias))
+        yield
+
+
+def _flush(rows, ignore_conflicts) -> int:
+    objects = list(serializers.deserialize('python', rows))
+    model = type(objects[0].object)
+    # bulk_create не выбирает сегмент по строкам: пачка делится сама
+    shards = sharding.split_by_shard(
+        model, [item.object for item in objects]
+    )
+    for alias, shard_objects in shards.items():
+        model._default_manager.using(alias).bulk_create(
+            shard_objects, ignore_conflicts=ignore_conflicts
+        )
+    # связи many-to-many (группы и права пользователей) редки,
+    # их сохраняем поштучно
+    for item in objects:
+        for name, values in (item.m2m_data or {}).items():
+            if values:
+                getattr(item.object, name).set(values)
+    return len(objects)
+
+
+def import_rows(stream, batch_size=1000, transaction_size=10000,
+                ignore_conflicts=False, progress=None) -> dict:
+    """ Загружает объекты из stream пачками через bulk_create.
+
+    Транзакция фиксируется каждые transaction_size строк, после нее
+    вызывается progress(загружено строк, секунд с начала).
+    Возвращает число загруженных строк по каждой модели.
+    """
+    loaded = {}
+    started = time.monotonic()
+    batches = _batches(stream, batch_size)
+    with muted_signals(), kept_dates():
+        while True:
+            count = 0
+            with atomic_all():
+                for rows in batches:
+                    label = rows[0]['model']
+                    added = _flush(rows, ignore_conflicts)
+                    loaded[label] = loaded.get(label, 0) + added
+                    count += added
+                    if count >= transaction_size:
+                        break
+            if not count:
+                break
+            if progress is not None:
+                progress(sum(loaded.values()), time.monotonic() - started)
+    reset_sequences()
+    return loaded
+
+
+def reset_sequences() -> None:
+    """ Сдвигает счетчики первичных ключей после вставки явных pk. """
+    statements = connection.ops.sequence_reset_sql(no_style(), get_models())
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def refresh_derived() -> None:
+    """ Пересчитывает то, что при загрузке делали бы сигналы. """
+    counters.recount_users()
+    counters.recount_posts()
+    search.get_backend().rebuild()
+    if timeline.is_enabled():
+        users = User.objects.filter(follower__isnull=False).distinct()
+        for user in users.iterator():
+            timeline.rebuild(user)
+    # версии лент и страницы в кэше не знают о новых объектах
+    cache.clear()
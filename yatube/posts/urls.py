@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = 'posts'
 
@@ -13,6 +13,7 @@ urlpatterns = [
     path('posts/<post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment', views.add_comment, name='add_comment'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.post_search, name='search'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -23,4 +24,27 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path('api/v1/posts/', api.index, name='api_index'),
+    path('api/v1/posts/batch/', api.batch, name='api_batch'),
+    path(
+        'api/v1/posts/<int:post_id>/',
+        api.post_detail,
+        name='api_post_detail'
+    ),
+    path(
+        'api/v1/posts/<int:post_id>/comments/',
+        api.comments,
+        name='api_comments'
+    ),
+    path(
+        'api/v1/groups/<str:slug>/posts/',
+        api.group_posts,
+        name='api_group_list'
+    ),
+    path(
+        'api/v1/profiles/<str:username>/posts/',
+        api.profile,
+        name='api_profile'
+    ),
+    path('api/v1/follow/', api.follow_index, name='api_follow_index'),
 ]
@@ -1,11 +1,15 @@
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.db.models import Prefetch, prefetch_related_objects
 from django.http import HttpResponse, HttpRequest
 from django.shortcuts import render, get_object_or_404, redirect
 from django.utils import timezone
 
+from core import routers, writes
+
+from . import feed_cache, page_cache, search, thumbnails, timeline
 from .forms import PostForm, CommentForm
 from .models import Post, Group, User, Comment, Follow
+from .paginators import CURSOR_PARAM, CursorPaginator, get_page_obj
 
 
 def authorized_only(func):
@@ -18,58 +22,78 @@ def authorized_only(func):
     return check_user
 
 
+@page_cache.anonymous_page
+@routers.use_replica
 def index(request: HttpRequest) -> HttpResponse:
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, settings.PER_PAGE_PAGINATOR)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.feed()
+    page_obj = get_page_obj(request, post_list)
     title = 'Последние обновления на сайте'
     context = {
         'page_obj': page_obj,
         'title': title,
+        'feed_cache': feed_cache.fragment(request, 'index'),
     }
     template_name = 'posts/index.html'
     return render(request, template_name, context)
 
 
+@page_cache.anonymous_page
+@routers.use_replica
 def group_posts(request: HttpRequest, slug: str) -> HttpResponse:
     group = get_object_or_404(Group, slug=slug)
-    posts = group.groups_posts.all()
-    paginator = Paginator(posts, settings.PER_PAGE_PAGINATOR)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = group.groups_posts.feed()
+    page_obj = get_page_obj(request, posts)
     context = {
         'slug': slug,
         'group': group,
-        'posts': posts,
         'page_obj': page_obj,
+        'feed_cache': feed_cache.fragment(request, f'group:{group.pk}'),
     }
     template_name = 'posts/group_list.html'
     return render(request, template_name, context=context)
 
 
+@page_cache.anonymous_page
+@routers.use_replica
 def profile(request: HttpRequest, username: str) -> HttpResponse:
-    username = get_object_or_404(User, username=username)
-    post_list = username.posts.all()
+    username = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    post_list = username.posts.feed()
     following = username.following.exists()
-    paginator = Paginator(post_list, settings.PER_PAGE_PAGINATOR)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = get_page_obj(request, post_list)
 
     context = {
         'username': username,
         'post_list': post_list,
         'page_obj': page_obj,
         'following': following,
+        'feed_cache': feed_cache.fragment(request, f'author:{username.pk}'),
     }
     template_name = 'posts/profile.html'
     return render(request, template_name, context=context)
 
 
 def post_detail(request: HttpRequest, post_id: int) -> HttpResponse:
-    post = get_object_or_404(Post, pk=post_id)
-    post_text = get_object_or_404(Post, id=post_id).text[:30]
-    comments = Comment.objects.filter(post_id=post_id)
+    post = get_object_or_404(
+        Post.objects.for_pk(post_id).select_related('author__stats', 'group'),
+        pk=post_id,
+    )
+    post_text = post.text[:30]
+    comments = Comment.objects.near(post).select_related('author').order_by(
+        'created', 'pk'
+    )
+    if post.comments_count > settings.COMMENTS_PER_PAGE:
+        # длинные обсуждения листаются курсором, а не грузятся целиком
+        paginator = CursorPaginator(
+            comments.filter(post=post), settings.COMMENTS_PER_PAGE
+        )
+        comments = paginator.get_page(request.GET.get(CURSOR_PARAM))
+    else:
+        prefetch_related_objects(
+            [post], Prefetch('comments', queryset=comments)
+        )
+        comments = post.comments.all()
     form = CommentForm()
     context = {
         'post': post,
@@ -81,6 +105,19 @@ def post_detail(request: HttpRequest, post_id: int) -> HttpResponse:
     return render(request, template_name, context)
 
 
+def post_search(request: HttpRequest) -> HttpResponse:
+    query = request.GET.get('q', '').strip()
+    page_obj = search.get_page_obj(request, Post.objects.feed(), query)
+    title = 'Поиск по записям'
+    context = {
+        'page_obj': page_obj,
+        'title': title,
+        'search_query': query,
+    }
+    template_name = 'posts/search.html'
+    return render(request, template_name, context)
+
+
 @authorized_only
 def post_create(request: HttpRequest) -> HttpResponse:
     is_edit = False
@@ -91,7 +128,9 @@ def post_create(request: HttpRequest) -> HttpResponse:
         post = form.save(commit=False)
         post.author = request.user
         post.pub_date = timezone.now()
-        post.save()
+        writes.submit(post.save)
+        if post.image:
+            writes.submit(thumbnails.schedule, post)
         return redirect('posts:profile', username=post.author.username)
     context = {
         'form': form,
@@ -104,7 +143,7 @@ def post_create(request: HttpRequest) -> HttpResponse:
 
 @authorized_only
 def post_edit(request: HttpRequest, post_id: int) -> HttpResponse:
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.objects.for_pk(post_id), id=post_id)
     author = post.author.username
     group = post.group
     is_edit = True
@@ -118,7 +157,9 @@ def post_edit(request: HttpRequest, post_id: int) -> HttpResponse:
                 post = form.save(commit=False)
                 post.author = request.user
                 post.pub_date = timezone.now()
-                post.save()
+                writes.submit(post.save)
+                if 'image' in form.changed_data:
+                    writes.submit(thumbnails.schedule, post)
                 return redirect('posts:post_detail', post_id=post.pk)
         else:
             form = PostForm(instance=post)
@@ -137,28 +178,27 @@ def post_edit(request: HttpRequest, post_id: int) -> HttpResponse:
 
 @authorized_only
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.objects.for_pk(post_id), id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        writes.submit(comment.save)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @authorized_only
+@routers.use_replica
 def follow_index(request: HttpRequest) -> HttpResponse:
-    user = request.user
-    authors = user.follower.values_list('author', flat=True)
-    post_list = Post.objects.filter(author__id__in=authors)
-    paginator = Paginator(post_list, settings.PER_PAGE_PAGINATOR)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = timeline.get_page_obj(request, request.user)
     title = 'Посты авторов, на которых вы подписаны'
     context = {
         'page_obj': page_obj,
         'title': title,
+        'feed_cache': feed_cache.fragment(
+            request, 'index', f'follow:{request.user.pk}'
+        ),
     }
     template_name = 'posts/follow.html'
     return render(request, template_name, context)
@@ -168,13 +208,14 @@ def follow_index(request: HttpRequest) -> HttpResponse:
 def profile_follow(request, username):
     author = User.objects.get(username=username)
     user = request.user
-    if author != user and (author.following.count() == 0):
-        Follow.objects.create(user=user, author=author)
+    if author != user:
+        writes.submit(Follow.objects.get_or_create, user=user, author=author)
     return redirect('posts:profile', username=username)
 
 
 @authorized_only
 def profile_unfollow(request, username):
     user = request.user
-    Follow.objects.get(user=user, author__username=username).delete()
+    follow = Follow.objects.get(user=user, author__username=username)
+    writes.submit(follow.delete)
     return redirect('posts:profile', username=username)
@@ -0,0 +1,10 @@
+""" Профиль настроек выбирается переменной окружения YATUBE_ENV:
+dev (по умолчанию) — для разработки и тестов, prod — для боевого
+сервера; значения prod берутся из окружения (см. prod.py).
+"""
+import os
+
+if os.environ.get('YATUBE_ENV', 'dev') == 'prod':
+    from .prod import *  # noqa: F401,F403
+else:
+    from .dev import *  # noqa: F401,F403
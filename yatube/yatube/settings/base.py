@@ -0,0 +1,235 @@
+""" Общие настройки; профили dev и prod переопределяют часть из них. """
+import os
+
+BASE_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+SECRET_KEY = 'nqc%)w_%e^s*bne7xsxcemn$#&3w05y-6teyce%td&@t571aq1'
+
+DEBUG = False
+
+EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+
+ALLOWED_HOSTS = []
+
+INSTALLED_APPS = [
+    'about.apps.AboutConfig',
+    'core.apps.CoreConfig',
+    'users.apps.UsersConfig',
+    'posts.apps.PostsConfig',
+    'benchmarks.apps.BenchmarksConfig',
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'sorl.thumbnail',
+]
+
+LOGIN_URL = 'users:login'
+
+LOGIN_REDIRECT_URL = 'posts:index'
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+MIDDLEWARE = [
+    'core.middleware.InstrumentationMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'yatube.urls'
+
+TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [TEMPLATES_DIR],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+                'core.context_processors.year.year',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'yatube.wsgi.application'
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+    }
+}
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+LANGUAGE_CODE = 'ru'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_L10N = True
+
+USE_TZ = True
+
+STATIC_URL = '/static/'
+
+STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+
+PER_PAGE_PAGINATOR = 10
+
+# JSON API (/api/v1/, posts.api): постов или комментариев на странице
+# и наибольшее число ключей в одном запросе /api/v1/posts/batch/.
+API_PER_PAGE = 20
+API_BATCH_LIMIT = 100
+
+# Ленты читаются с реплик — алиасов из DATABASES (core.routers), запись
+# идет в default. Автор поста, комментария или подписки еще
+# REPLICA_STICKY_SECONDS читает из default, чтобы увидеть свою запись.
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter',
+    'core.routers.PrimaryReplicaRouter',
+]
+DATABASE_REPLICAS = []
+REPLICA_STICKY_SECONDS = 10
+
+# Посты и комментарии хранятся в сегментах — алиасах из DATABASES
+# (posts.sharding): автор по хэшу author_id попадает в один из них.
+# Пользователи, группы и подписки остаются в default, который обычно
+# сам первый сегмент. После изменения списка строки переносит команда
+# reshard. Материализованная лента подписок (FOLLOW_TIMELINE_FANOUT)
+# с сегментами не работает: такие настройки — ImproperlyConfigured.
+DATABASE_SHARDS = ['default']
+
+# PRAGMA каждого нового соединения SQLite (core.db). WAL позволяет
+# читать ленты, пока идет запись комментариев и постов.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    # отрицательное значение — размер в КиБ
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'memory',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Лента подписок: при включенном fan-out новые посты раскладываются
+# по лентам подписчиков при записи. Посты авторов, у которых подписчиков
+# не меньше порога, в ленты не копируются и подмешиваются при чтении.
+# Когда автор опускается ниже порога, его последние
+# FOLLOW_TIMELINE_BACKFILL постов раскладываются по лентам подписчиков.
+FOLLOW_TIMELINE_FANOUT = False
+FOLLOW_TIMELINE_FANOUT_LIMIT = 1000
+FOLLOW_TIMELINE_BACKFILL = 100
+
+# Кэш списков постов в лентах сбрасывается сигналами моделей,
+# поэтому таймаут может быть долгим.
+FEED_CACHE_TIMEOUT = 60 * 60
+
+# Устаревший фрагмент ленты отдается, пока один процесс пересчитывает
+# его под арендой FEED_CACHE_LEASE секунд, и хранится еще
+# FEED_CACHE_STALE_TIMEOUT после срока. FEED_CACHE_EARLY_BETA > 1
+# сдвигает досрочный пересчет раньше, 0 — отключает его.
+FEED_CACHE_LEASE = 10
+FEED_CACHE_STALE_TIMEOUT = 10 * 60
+FEED_CACHE_EARLY_BETA = 1.0
+
+# Целые страницы лент для анонимных посетителей (posts.page_cache);
+# устаревшие записи отбрасываются по версиям лент, как и фрагменты.
+ANONYMOUS_PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Сколько комментариев post_detail загружает сразу; более длинные
+# обсуждения листаются курсором.
+COMMENTS_PER_PAGE = 50
+
+# Миниатюры картинок постов генерируются заранее, в фоновом пуле,
+# и шаблоны берут готовые адреса из Post.thumbnails.
+THUMBNAIL_RENDITIONS = {
+    'feed': ('960x339', {'crop': 'center', 'upscale': True}),
+    'detail': ('960x339', {'crop': 'center', 'upscale': True}),
+    'retina': ('1920x678', {'crop': 'center', 'upscale': True}),
+}
+THUMBNAIL_ASYNC = True
+THUMBNAIL_WORKERS = 2
+
+# Адаптивный набор миниатюр для <picture>/srcset: ширины, пропорции
+# кадра и форматы в порядке предпочтения (AVIF — если его умеет Pillow).
+THUMBNAIL_RESPONSIVE_WIDTHS = (480, 720, 960, 1440, 1920)
+THUMBNAIL_RESPONSIVE_RATIO = (960, 339)
+THUMBNAIL_RESPONSIVE_FORMATS = ('AVIF', 'WEBP', 'JPEG')
+THUMBNAIL_RESPONSIVE_QUALITY = 80
+THUMBNAIL_RESPONSIVE_SIZES = '(max-width: 960px) 100vw, 960px'
+
+# Запись из add_comment, post_create и profile_follow идет через один
+# поток-писатель процесса (core.writes): накопившиеся операции пишутся
+# одной транзакцией, не больше WRITE_QUEUE_BATCH_SIZE, ожидая попутчиков
+# до WRITE_QUEUE_LINGER секунд. Если базу держит другой процесс,
+# транзакция повторяется до WRITE_RETRY_ATTEMPTS раз с паузой от
+# WRITE_RETRY_BACKOFF секунд, удваивающейся с каждой попыткой.
+WRITE_QUEUE_ASYNC = True
+WRITE_QUEUE_BATCH_SIZE = 100
+WRITE_QUEUE_LINGER = 0
+WRITE_QUEUE_TIMEOUT = 30
+WRITE_RETRY_ATTEMPTS = 5
+WRITE_RETRY_BACKOFF = 0.05
+
+# Метрики запросов (core.middleware.InstrumentationMiddleware): отдавать
+# ли их в заголовке Server-Timing и сколько одинаковых SQL-запросов
+# за один HTTP-запрос записывать в лог как возможный N+1.
+# Гистограммы по вью: /debug/requests/ (только для персонала).
+INSTRUMENTATION_SERVER_TIMING = False
+INSTRUMENTATION_N_PLUS_ONE_THRESHOLD = 5
+
+# Метрики Prometheus (/metrics). Под WSGI-сервером с несколькими
+# процессами укажите общий каталог: процессы раз в METRICS_FLUSH_INTERVAL
+# секунд пишут туда свои значения, а /metrics их складывает.
+# Метрики видны персоналу и адресам из METRICS_ALLOWED_IPS (адреса
+# и сети вида 10.0.0.0/8), остальным — 403.
+METRICS_MULTIPROCESS_DIR = None
+METRICS_FLUSH_INTERVAL = 1
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# Полнотекстовый поиск по постам (/search/ и админка): основы русских
+# слов и исправление опечаток по триграммам. После смены бэкенда
+# индекс строится командой rebuild_search_index.
+POSTS_SEARCH_BACKEND = 'posts.search.backends.RussianSearchBackend'
+
+# Разбирать ли все шаблоны из TEMPLATES_DIR при старте WSGI-процесса,
+# чтобы первые запросы не платили за разбор (core.warmup).
+TEMPLATE_WARMUP = False
@@ -0,0 +1,47 @@
+import os
+
+from .base import *  # noqa: F401,F403
+from .base import BASE_DIR, DATABASES
+
+DEBUG = True
+
+# Память процесса: файловый кэш переживал бы пересоздание базы
+# и отдавал чужие фрагменты.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+INSTRUMENTATION_SERVER_TIMING = True
+
+# записи выполняются в потоке запроса: так их видят транзакции тестов
+WRITE_QUEUE_ASYNC = False
+
+# Сегменты для локальной проверки: файлы db.shard_N.sqlite3, которые
+# включаются списком алиасов в DATABASE_SHARDS, например
+# default,shard_1,shard_2. Тесты сегментирования включают их сами.
+DATABASES.update({
+    f'shard_{number}': {
+        **DATABASES['default'],
+        'NAME': os.path.join(BASE_DIR, f'db.shard_{number}.sqlite3'),
+    }
+    for number in (1, 2)
+})
+DATABASE_SHARDS = os.environ.get('DATABASE_SHARDS', 'default').split(',')
+
+# Реплики для локальной проверки чтения лент: пути к файлам SQLite
+# через запятую; команда replicate копирует в них основную базу.
+# Тесты запускаются без реплик: данные TestCase не зафиксированы
+# и не видны другим соединениям.
+REPLICA_PATHS = [
+    path for path in os.environ.get('DATABASE_REPLICA_PATHS', '').split(',')
+    if path
+]
+DATABASE_REPLICAS = [
+    f'replica_{number}' for number in range(1, len(REPLICA_PATHS) + 1)
+]
+DATABASES.update({
+    alias: {**DATABASES['default'], 'NAME': path, 'TEST': {'MIRROR': 'default'}}
+    for alias, path in zip(DATABASE_REPLICAS, REPLICA_PATHS)
+})
@@ -0,0 +1,101 @@
+import copy
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import *  # noqa: F401,F403
+from .base import BASE_DIR, TEMPLATES
+
+
+def env(name, default=None):
+    value = os.environ.get(name, default)
+    if value is None:
+        raise ImproperlyConfigured(f'Не задана переменная окружения {name}')
+    return value
+
+
+DEBUG = False
+
+SECRET_KEY = env('SECRET_KEY')
+
+ALLOWED_HOSTS = env('ALLOWED_HOSTS').split(',')
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': env('DATABASE_PATH', os.path.join(BASE_DIR, 'db.sqlite3')),
+        # соединение живет между запросами: не переоткрывать файл
+        # и не терять кэш страниц SQLite на каждом запросе
+        'CONN_MAX_AGE': int(env('DATABASE_CONN_MAX_AGE', '60')),
+    }
+}
+
+# Реплики для чтения лент и сегменты постов: пути к файлам SQLite
+# через запятую. Содержимое реплик поддерживает внешняя репликация
+# или команда replicate, сегменты заполняет команда reshard.
+REPLICA_PATHS = [
+    path for path in env('DATABASE_REPLICA_PATHS', '').split(',') if path
+]
+SHARD_PATHS = [
+    path for path in env('DATABASE_SHARD_PATHS', '').split(',') if path
+]
+DATABASE_REPLICAS = [
+    f'replica_{number}' for number in range(1, len(REPLICA_PATHS) + 1)
+]
+DATABASE_SHARDS = [
+    'default',
+    *(f'shard_{number}' for number in range(1, len(SHARD_PATHS) + 1)),
+]
+DATABASES.update({
+    alias: {**DATABASES['default'], 'NAME': path}
+    for alias, path in zip(
+        [*DATABASE_REPLICAS, *DATABASE_SHARDS[1:]],
+        [*REPLICA_PATHS, *SHARD_PATHS],
+    )
+})
+
+MEDIA_ROOT = env('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
+STATIC_ROOT = env('STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+
+# Кэш общий для всех процессов WSGI-сервера: иначе каждый воркер
+# заново рендерит фрагменты, а сброс версий лент не доходит до других
+# процессов. Без внешних сервисов — файл SQLite (core.cache.SQLiteCache);
+# если задан REDIS_URL — Redis через пакет django-redis (в Django 2.2
+# своего бэкенда Redis нет).
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {'CLIENT_CLASS': 'django_redis.client.DefaultClient'},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': env(
+                'CACHE_PATH', os.path.join(BASE_DIR, 'cache.sqlite3')
+            ),
+            'OPTIONS': {'MAX_ENTRIES': 10000, 'CULL_FREQUENCY': 4},
+        }
+    }
+
+# Шаблоны разбираются один раз на процесс и хранятся в памяти
+# (cached.Loader); при старте они разбираются заранее.
+TEMPLATES = copy.deepcopy(TEMPLATES)
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+TEMPLATE_WARMUP = True
+
+METRICS_MULTIPROCESS_DIR = os.environ.get('METRICS_MULTIPROCESS_DIR')
+# адрес Prometheus; за обратным прокси это адрес самого прокси,
+# поэтому /metrics на нем не должен быть доступен снаружи
+METRICS_ALLOWED_IPS = env('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')